@@ -0,0 +1,268 @@
+# all_in_one.py - SENSORS, GATEWAY AND CLOUD LOGIC IN ONE PROCESS
+
+"""
+All-in-one runtime for small edge boxes
+
+One Python process instead of one interpreter per component:
+- the sensor engine, the gateway (event mode) and the cloud logic run as
+  asyncio tasks on one event loop
+- they talk over the in-memory bus (bus.py): same topics and wildcard
+  rules as with the broker, but messages are handed over as the dicts
+  themselves (no encoding, no copies, no sockets)
+- --bus mqtt runs the very same stages over the MQTT broker instead
+- --mirror copies summaries and decisions from the in-memory bus to the
+  MQTT broker, so the dashboard can still be run (as its own process)
+
+    python all_in_one.py
+    python all_in_one.py --intersections 200 --quiet
+    python all_in_one.py --mirror          # then: python dashboard.py
+    python all_in_one.py --bus mqtt
+
+The gateway stage wakes on every message delivered to it (an asyncio.Event
+set from its on_message) and publishes what check_due() reports: at once on
+emergencies, after GATEWAY_COALESCE_WINDOW otherwise, every row on the
+heartbeat.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+import paho.mqtt.client as mqtt
+
+from config import (BROKER, CONTROLLER_TICK, GATEWAY_COALESCE_WINDOW, GATEWAY_HEARTBEAT_INTERVAL, PORT,
+                    PUBLISH_INTERVAL, SUMMARY_DELTA_MODE, TOPIC_DECISION, TOPIC_DECISION_PREFIX, TOPIC_SUMMARY,
+                    TOPIC_SUMMARY_PREFIX)
+from bus import InMemoryBus
+from intersection import N_LANES
+from metrics import histogram, start_metrics
+from structured_log import flush as flush_log
+from topics import intersection_id
+from wire_format import encode_for
+
+from cloud import traffic_logic as cloud
+from gateway import gateway_publisher as gateway
+from sensors import sensor_engine
+
+DECISION_TOPICS = [(TOPIC_DECISION, 0), (f"{TOPIC_DECISION_PREFIX}/+", 0)]
+SUMMARY_TOPICS = [(TOPIC_SUMMARY, 0), (f"{TOPIC_SUMMARY_PREFIX}/+", 0)]
+
+metric = {
+    "latency": histogram("all_in_one_sensor_to_decision_seconds", "Sensor reading -> cloud decision")
+}
+
+
+async def wait_for(event, timeout):
+    """Wait (without blocking the loop) for a threading.Event set by a stage"""
+    deadline = time.monotonic() + timeout
+    while not event.is_set() and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+
+# =====================================================================
+# STAGES
+# =====================================================================
+
+async def run_sensors(engine):
+    while True:
+        await asyncio.sleep(max(0.0, engine.poll() - time.monotonic()))
+
+
+async def run_gateway(delivered, window):
+    """Gateway event mode: woken by `delivered` (set on every message it receives)"""
+    iteration = 0
+    heartbeat_at = time.monotonic() + GATEWAY_HEARTBEAT_INTERVAL
+    while True:
+        delivered.clear()
+        try:
+            due, wait = gateway.check_due(window, heartbeat_at)
+            if due is not None:
+                iteration += 1
+                heartbeat_at = time.monotonic() + GATEWAY_HEARTBEAT_INTERVAL
+                gateway.publish_due(due)
+                continue
+        except Exception as e:
+            gateway.log.error("iteration_failed", f"❌ Error in summary {iteration}: {e}", error=str(e))
+            wait = window
+        try:
+            await asyncio.wait_for(delivered.wait(), wait)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_cloud(client):
+    """Phase changes every CONTROLLER_TICK, every intersection every PUBLISH_INTERVAL"""
+    iteration = 0
+    next_report = time.monotonic()
+    while True:
+        try:
+            if cloud.report_due(next_report):
+                iteration += 1
+                next_report = time.monotonic() + PUBLISH_INTERVAL
+                cloud.decide_and_publish(client, iteration)
+            else:
+                cloud.tick(client)
+        except Exception as e:
+            cloud.log.error("iteration_failed", f"❌ Error in cloud iteration {iteration}: {e}", error=str(e))
+        await asyncio.sleep(CONTROLLER_TICK)
+
+
+def measure_decision(client, userdata, msg):
+    """Sensor reading -> decision latency, once per sensor timestamp and topic"""
+    sensor_ts = msg.payload.get("sensor_ts") if isinstance(msg.payload, dict) else None
+    seen = userdata.setdefault("seen", {})
+    if sensor_ts is not None and seen.get(msg.topic) != sensor_ts:
+        seen[msg.topic] = sensor_ts
+        metric["latency"].record(max(0.0, time.time() - sensor_ts))
+
+
+def wake_on_message(on_message, event, loop):
+    """on_message that also sets an asyncio.Event (from any thread: the bus or paho's)"""
+    def handle(client, userdata, msg):
+        on_message(client, userdata, msg)
+        loop.call_soon_threadsafe(event.set)
+    return handle
+
+
+def mirror_to(uplink):
+    """on_message that copies bus messages to the MQTT broker, encoded as usual"""
+    def forward(client, userdata, msg):
+        uplink.publish(msg.topic, encode_for(msg.topic, msg.payload))
+    return forward
+
+
+# =====================================================================
+# SET-UP
+# =====================================================================
+
+def connect_stages(args, bus, delivered):
+    """One client per stage, on the in-memory bus or to the MQTT broker"""
+    loop = asyncio.get_running_loop()
+    if bus is not None:
+        sensors_client = bus.client("sensors")
+        sensors_client.on_connect = sensor_engine.on_connect
+        sensors_client.connect()
+        gateway.attach(bus.client("smart_traffic_gateway"))
+        gateway.client.on_message = wake_on_message(gateway.on_message, delivered, loop)
+        gateway.client.connect()
+        cloud_client = bus.client("cloud")
+    else:
+        sensors_client = sensor_engine.connect_client()
+        gateway.attach(gateway.client)
+        gateway.client.on_message = wake_on_message(gateway.on_message, delivered, loop)
+        gateway.client.connect(BROKER, PORT, 60)
+        gateway.client.loop_start()
+        cloud_client = mqtt.Client()
+
+    cloud_client.on_connect = cloud.on_connect
+    cloud_client.on_subscribe = cloud.on_subscribe
+    cloud_client.on_message = cloud.on_message
+    cloud_client.connect(BROKER, PORT, 60)
+    cloud_client.loop_start()
+
+    # Decision latency, measured on the bus itself (zero copy: dict payloads)
+    if bus is not None:
+        tap = bus.client("latency", userdata={})
+        tap.on_message = measure_decision
+        tap.connect()
+        tap.subscribe(DECISION_TOPICS)
+
+        if args.mirror:
+            uplink = mqtt.Client()
+            uplink.connect(BROKER, PORT, 60)
+            uplink.loop_start()
+            mirror = bus.client("mirror")
+            mirror.on_message = mirror_to(uplink)
+            mirror.connect()
+            mirror.subscribe(SUMMARY_TOPICS + DECISION_TOPICS)
+    return sensors_client, cloud_client
+
+
+async def run(args, state):
+    bus = InMemoryBus(asyncio.get_running_loop()) if args.bus == "memory" else None
+    state["bus"] = bus
+
+    gateway.setup(argparse.Namespace(intersections=args.intersections, delta=args.delta))
+    delivered = asyncio.Event()
+    sensors_client, cloud_client = connect_stages(args, bus, delivered)
+
+    # Sensors start once the gateway listens (its first readings are not lost)
+    await wait_for(gateway.startup["ready"], 2)
+
+    sensors = list(sensor_engine.DEFAULT_SENSORS)
+    for number in range(args.intersections):
+        sensors += sensor_engine.intersection_sensors(intersection_id(number))
+    state["engine"] = sensor_engine.SensorEngine(sensors_client, sensors, verbose=not args.quiet)
+
+    await asyncio.gather(run_sensors(state["engine"]), run_gateway(delivered, args.window), run_cloud(cloud_client))
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process (None where unavailable)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sensors, gateway and cloud logic in one process")
+    parser.add_argument("--bus", choices=["memory", "mqtt"], default="memory",
+                        help="in-memory bus (default) or the MQTT broker from config.py")
+    parser.add_argument("--mirror", action="store_true",
+                        help="in-memory bus: copy summaries and decisions to MQTT (for the dashboard)")
+    parser.add_argument("--intersections", type=int, default=0,
+                        help="also simulate intersections I0000..")
+    parser.add_argument("--delta", action=argparse.BooleanOptionalAction, default=SUMMARY_DELTA_MODE,
+                        help="delta-encoded summaries")
+    parser.add_argument("--window", type=float, default=GATEWAY_COALESCE_WINDOW,
+                        help="gateway coalescing window in seconds")
+    parser.add_argument("--quiet", action="store_true", help="do not log every sensor reading")
+    args = parser.parse_args()
+
+    start_metrics("all_in_one")
+
+    print("\n" + "=" * 70)
+    print("🚦 SMART TRAFFIC CONTROL SYSTEM - ALL IN ONE")
+    print("=" * 70)
+    sensors = len(sensor_engine.DEFAULT_SENSORS) + (2 * N_LANES + 1) * args.intersections
+    print(f"  ✅ Sensors: {sensors} on one engine")
+    print(f"  ✅ Gateway (event-driven, window {args.window * 1000:.0f} ms) + cloud logic in the same process")
+    print(f"  ✅ Bus: {'in-memory (zero copy)' if args.bus == 'memory' else f'MQTT {BROKER}:{PORT}'}")
+    if args.mirror and args.bus == "memory":
+        print(f"  ✅ Mirroring summaries / decisions to MQTT {BROKER}:{PORT}")
+    print("=" * 70 + "\n")
+
+    state = {}
+    try:
+        asyncio.run(run(args, state))
+    except KeyboardInterrupt:
+        pass
+
+    flush_log()
+    latency = metric["latency"]
+    print("\n" + "=" * 70)
+    print("📊 ALL-IN-ONE STATISTICS")
+    print("=" * 70)
+    if "engine" in state:
+        print(f"Sensor readings published: {state['engine'].published}")
+    print(f"Gateway messages processed: {gateway.stats['messages_received']}")
+    print(f"Summaries published: {gateway.stats['summaries_published']}")
+    print(f"Decisions published: {cloud.metric['published'].value}")
+    print(f"Latency (sensor → summary): {gateway.latency_report()}")
+    if latency.count:
+        print(f"Latency (sensor → decision): avg {latency.mean() * 1000:.1f} ms, "
+              f"p95 {latency.percentile(0.95) * 1000:.1f} ms ({latency.count} decisions)")
+    if state.get("bus") is not None:
+        print(f"Bus: {state['bus'].stats['published']} published, {state['bus'].stats['delivered']} delivered")
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"Peak memory: {rss:.1f} MB")
+    print("=" * 70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# decision_engine_bench.py - SCALAR VS VECTORIZED CLOUD DECISIONS
+
+"""
+Checks that the batch decision engine (cloud/decision_engine.py) gives
+bit-identical results to the scalar rules in cloud/traffic_logic.py, and
+times both on random intersections:
+
+- green group       decide_green_light()       vs green_lanes()
+- green duration    calculate_green_duration() vs green_durations()
+- next lane         next_green()                vs next_lanes()
+
+Inputs cover the edge cases on purpose: empty lanes, ties, IR without
+count, emergencies with and without a lane. The batch forms get the
+phase-group columns of the configured intersection (intersection.py), as
+the cloud logic passes them.
+
+    python benchmarks/decision_engine_bench.py [--intersections 100 1000 10000] [--seed 1]
+
+Exits with status 1 if any result differs.
+"""
+
+import argparse
+import time
+import sys
+import os
+
+import numpy as np
+
+# The scalar rules log every IR adjustment: keep the run quiet
+os.environ.setdefault("TRAFFIC_LOG_LEVEL", "ERROR")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import MAX_VEHICLES
+from intersection import N_GROUPS, group_index
+from lane_store import NO_LANE
+from cloud import decision_engine
+from cloud import traffic_logic as logic
+
+
+def fill_store(n, rng):
+    """n random intersections in the cloud logic's store; returns their rows"""
+    store = logic.store
+    rows = np.array([store.row(f"B{number:05d}") for number in range(n)])
+    lanes = store.n_lanes
+
+    counts = rng.integers(0, MAX_VEHICLES + 1, (n, lanes))
+    counts[rng.random((n, lanes)) < 0.3] = 0                   # empty lanes
+    ties = rng.random(n) < 0.1
+    counts[ties, 1] = counts[ties, 0]                           # equal counts
+    store.vehicle_count[rows] = counts
+    store.ir[rows] = rng.integers(0, 2, (n, lanes))
+    store.emergency[rows] = rng.random(n) < 0.1
+    store.emergency_lane[rows] = np.where(store.emergency[rows] == 1,
+                                          rng.integers(NO_LANE, lanes, n), NO_LANE)
+    store.green_group[rows] = rng.integers(0, N_GROUPS, n)
+    return rows
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def compare(name, rows, scalar, batch):
+    """Time both forms; returns (matches, scalar seconds, batch seconds)"""
+    expected, scalar_seconds = timed(lambda: np.array([scalar(row) for row in rows]))
+    got, batch_seconds = timed(batch)
+    matches = np.array_equal(expected, got)
+    mismatches = np.nonzero(expected != got)[0]
+    if len(mismatches):
+        row = rows[mismatches[0]]
+        print(f"  ❌ {name}: {len(mismatches)} differ, e.g. row {row}: "
+              f"scalar {expected[mismatches[0]]} vs batch {got[mismatches[0]]}")
+    return matches, scalar_seconds, batch_seconds
+
+
+def run(n, rng):
+    store = logic.store
+    rows = fill_store(n, rng)
+    counts, ir, emergency, emergency_group = logic.group_columns(rows)
+    current = np.where(rng.random(n) < 0.05, NO_LANE, store.green_group[rows]).astype(np.intp)
+
+    checks = {
+        "green group": compare(
+            "green group", rows,
+            lambda row: group_index(logic.decide_green_light(row)),
+            lambda: decision_engine.green_lanes(counts, emergency, emergency_group)),
+        "green duration": compare(
+            "green duration", rows,
+            logic.calculate_green_duration,
+            lambda: decision_engine.green_durations(store.green_group[rows], counts, ir, emergency, emergency_group)),
+        "next lane": compare(
+            "next lane", rows,
+            lambda row: logic.next_green(row, int(current[row - rows[0]])),
+            lambda: decision_engine.next_lanes(current, counts, ir, emergency, emergency_group)),
+    }
+
+    for name, (matches, scalar_seconds, batch_seconds) in checks.items():
+        print(f"{n:>8} {name:<16} {scalar_seconds / n * 1e6:>10.2f} {batch_seconds / n * 1e6:>10.3f} "
+              f"{scalar_seconds / max(batch_seconds, 1e-9):>8.0f}x  {'✅' if matches else '❌'}")
+    return all(matches for matches, _, _ in checks.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scalar vs vectorized decision benchmark")
+    parser.add_argument("--intersections", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'N':>8} {'rule':<16} {'scalar µs':>10} {'batch µs':>10} {'speedup':>9}  identical")
+    print("─" * 66)
+    identical = True
+    for n in args.intersections:
+        identical &= run(n, rng)
+
+    print("\n✅ Batch results bit-identical to the scalar rules" if identical
+          else "\n❌ Batch results differ from the scalar rules")
+    sys.exit(0 if identical else 1)
+
+
+if __name__ == "__main__":
+    main()
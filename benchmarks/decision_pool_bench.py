@@ -0,0 +1,154 @@
+# decision_pool_bench.py - CLOUD DECISIONS/S AT 1, 2, 4, 8 WORKERS
+
+"""
+Throughput of the cloud decision stage when intersections are partitioned
+across worker processes (cloud/traffic_logic.py --workers), without a broker
+in the way:
+
+- every worker is its own process with its own store and controller and
+  owns the intersections the hash ring gives it
+- each iteration feeds one JSON summary per owned intersection through the
+  real intake path (on_message -> queue -> ingest()), then runs a full cloud
+  iteration (advance the phase controllers, build, encode and publish every
+  decision) into a client that drops what it is given
+- decisions/s = decisions published by all workers / wall time
+
+    python benchmarks/decision_pool_bench.py [--intersections 5000] [--workers 1 2 4 8]
+                                             [--duration 5] [--output pool.json]
+
+Scaling is only near-linear up to the number of CPU cores this process may
+use (printed first); runs with more workers than cores are marked and only
+show the cost of the extra processes.
+"""
+
+import argparse
+import json
+import multiprocessing
+import random
+import time
+import sys
+import os
+
+# Every iteration logs a line per worker: keep the run quiet
+os.environ.setdefault("TRAFFIC_LOG_LEVEL", "WARNING")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import MAX_VEHICLES
+from intersection import GROUPS, LANES
+from topics import summary_topic
+from wire_format import encode
+
+VARIANTS = 4    # pre-encoded summaries per intersection, fed in turn
+
+
+class NullClient:
+    """Publishing end of a worker: takes encoded payloads and drops them"""
+
+    carries_objects = False
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        return None
+
+
+class Message:
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+def summaries(intersection, rng):
+    """A few encoded gateway summaries of one intersection"""
+    payloads = []
+    for _ in range(VARIANTS):
+        counts = [rng.randint(0, MAX_VEHICLES) for _ in LANES]
+        emergency = 1 if rng.random() < 0.02 else 0
+        payloads.append(encode({
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "intersection": intersection,
+            "ir": [int(count > 0) for count in counts], "vehicles": counts,
+            "confidence": [100] * len(LANES), "average_confidence": 100.0,
+            "emergency": emergency, "emergency_lane": LANES[-1] if emergency else None,
+            "green_light": GROUPS[0], "sensor_ts": time.time(),
+            "messages_processed": 0, "sensor_mismatches_detected": 0
+        }))
+    return payloads
+
+
+def worker(index, count, intersections, duration, start, results):
+    """One worker process: its own cloud logic module, store and controller"""
+    from cloud import traffic_logic as logic
+
+    logic.setup(argparse.Namespace(intersections=intersections), index, count)
+    rng = random.Random(index)
+    owned = logic.shard.owned()
+    feed = [(summary_topic(intersection), summaries(intersection, rng)) for intersection in owned]
+    client = NullClient()
+
+    start.wait()
+    started = time.perf_counter()
+    iterations = decisions = 0
+    while time.perf_counter() - started < duration:
+        for topic, payloads in feed:
+            logic.on_message(client, None, Message(topic, payloads[iterations % VARIANTS]))
+        iterations += 1
+        decisions += logic.decide_and_publish(client, iterations)
+    elapsed = time.perf_counter() - started
+    results.put({"worker": index, "intersections": len(owned), "iterations": iterations,
+                 "decisions": decisions, "seconds": elapsed})
+
+
+def run(workers, intersections, duration):
+    start = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(k, workers, intersections, duration, start, results))
+                 for k in range(workers)]
+    for process in processes:
+        process.start()
+    # Let every worker build its partition before the clock starts
+    time.sleep(1.0 + 0.002 * intersections / workers)
+    start.set()
+
+    per_worker = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    decisions = sum(result["decisions"] for result in per_worker)
+    seconds = max(result["seconds"] for result in per_worker)
+    return {"workers": workers, "intersections": intersections, "decisions": decisions,
+            "seconds": round(seconds, 3), "decisions_per_s": round(decisions / seconds),
+            "per_worker": sorted(per_worker, key=lambda result: result["worker"])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cloud decision throughput vs worker count")
+    parser.add_argument("--intersections", type=int, default=5000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    print(f"CPU cores: {cores} | intersections: {args.intersections} | {args.duration:.0f} s per run\n")
+    print(f"{'workers':>8} {'decisions/s':>12} {'speedup':>8} {'efficiency':>11}")
+    print("─" * 42)
+
+    runs = []
+    for workers in args.workers:
+        result = run(workers, args.intersections, args.duration)
+        runs.append(result)
+        speedup = result["decisions_per_s"] / runs[0]["decisions_per_s"] * runs[0]["workers"]
+        oversubscribed = " *" if workers > cores else ""
+        print(f"{workers:>8} {result['decisions_per_s']:>12,} {speedup:>7.2f}x {speedup / workers * 100:>10.0f}%"
+              f"{oversubscribed}")
+    if any(workers > cores for workers in args.workers):
+        print(f"\n* more workers than the {cores} CPU cores: not a scaling measurement")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cpu_count": cores, "runs": runs}, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# green_optimizer_bench.py - HEURISTIC VS PREDICTIVE GREEN TIMES
+
+"""
+Simulated queues at many intersections, run through the real signal-phase
+controller (cloud/signal_controller.py) once per green time strategy:
+
+- heuristic           decision_engine.green_durations (congestion ratio x confidence)
+- predictive ewma     green_optimizer.py, EWMA arrival rates
+- predictive kalman   green_optimizer.py, Kalman arrival rates
+
+Every intersection gets its own Poisson arrival rate per lane (busy / quiet
+lanes, some close to saturation); a lane with green discharges
+SATURATION_FLOW vehicles/s. The sensors report the queue (capped at
+MAX_VEHICLES) every --interval seconds. Same seed, same arrivals for every
+strategy.
+
+Reported per strategy: mean delay per vehicle (queue-seconds / arrivals),
+vehicles still queued at the end, and µs per rate update / per green decision.
+
+    python benchmarks/green_optimizer_bench.py [--intersections 500] [--minutes 60]
+                                               [--interval 2] [--seed 1]
+"""
+
+import argparse
+import time
+import sys
+import os
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import MAX_VEHICLES, SATURATION_FLOW
+from lane_store import LaneStore, NO_LANE
+from cloud import decision_engine
+from cloud.green_optimizer import GreenOptimizer
+from cloud.signal_controller import SignalController, MIN_GREEN, GREEN
+
+STEP = 1.0      # seconds of simulated time per step
+
+
+def arrival_rates(n, rng):
+    """(n, 2) vehicles/s: a busy and a quiet lane, total load 30-90% of the saturation flow"""
+    load = rng.uniform(0.3, 0.9, n) * SATURATION_FLOW
+    share = rng.uniform(0.5, 0.85, n)
+    rates = np.stack([load * share, load * (1 - share)], axis=1)
+    flip = rng.random(n) < 0.5
+    rates[flip] = rates[flip][:, ::-1]
+    return rates
+
+
+def simulate(strategy, rates, minutes, interval, seed):
+    n = len(rates)
+    rng = np.random.default_rng(seed)
+    store = LaneStore(n_lanes=2, capacity=n)     # two lanes, one phase group each
+    rows = np.array([store.row(f"S{number:05d}") for number in range(n)])
+    clock = [0.0]
+
+    optimizer = None if strategy == "heuristic" else GreenOptimizer(store.n_lanes, estimator=strategy.split()[1])
+    decide_seconds = [0.0, 0]
+
+    def green_times(rows):
+        started = time.perf_counter()
+        if optimizer is None:
+            durations = decision_engine.green_durations(store.green_group[rows], store.vehicle_count[rows],
+                                                        store.ir[rows], store.emergency[rows],
+                                                        store.emergency_lane[rows])
+        else:
+            durations = optimizer.green_times(rows, store.green_group[rows], store.vehicle_count[rows], store.ir[rows],
+                                              store.emergency[rows], store.emergency_lane[rows])
+        decide_seconds[0] += time.perf_counter() - started
+        decide_seconds[1] += len(rows)
+        return durations
+
+    def next_lanes(rows, current):
+        return decision_engine.next_lanes(current, store.vehicle_count[rows], store.ir[rows],
+                                          store.emergency[rows], store.emergency_lane[rows])
+
+    controller = SignalController(store, next_lanes, green_times, clock=lambda: clock[0])
+    controller.advance()    # every intersection starts all-red
+
+    queue = np.zeros((n, 2))
+    waited = arrived = 0.0
+    observe_seconds = observed = 0
+    next_reading = 0.0
+    lanes = np.arange(2)
+
+    for _ in range(int(minutes * 60 / STEP)):
+        clock[0] += STEP
+        arrivals = rng.poisson(rates * STEP)
+        queue += arrivals
+        arrived += arrivals.sum()
+
+        phase = np.array(controller.phase)
+        green = np.where(np.isin(phase, (MIN_GREEN, GREEN)), store.green_group[rows], NO_LANE)
+        served = (green[:, None] == lanes) * (rng.random((n, 2)) < SATURATION_FLOW * STEP)
+        queue = np.maximum(queue - served, 0)
+        waited += queue.sum() * STEP
+
+        if clock[0] >= next_reading:
+            next_reading += interval
+            counts = np.minimum(queue, MAX_VEHICLES)
+            store.vehicle_count[rows] = counts
+            store.ir[rows] = counts > 0
+            if optimizer is not None:
+                count_lists = counts.tolist()
+                started = time.perf_counter()
+                for row in rows.tolist():
+                    optimizer.observe(row, clock[0], count_lists[row], controller.serving(row))
+                observe_seconds += time.perf_counter() - started
+                observed += n
+        controller.advance()
+
+    return {"delay": waited / max(arrived, 1), "queued": queue.sum() / n,
+            "observe_us": observe_seconds / observed * 1e6 if observed else None,
+            "decide_us": decide_seconds[0] / max(decide_seconds[1], 1) * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Heuristic vs predictive green times on simulated queues")
+    parser.add_argument("--intersections", type=int, default=500)
+    parser.add_argument("--minutes", type=float, default=60, help="simulated minutes")
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between sensor readings")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rates = arrival_rates(args.intersections, np.random.default_rng(args.seed))
+    print(f"{args.intersections} intersections, {args.minutes:.0f} simulated minutes, "
+          f"saturation flow {SATURATION_FLOW} veh/s\n")
+    print(f"{'strategy':<20} {'delay s/veh':>12} {'left queued':>12} {'µs/update':>10} {'µs/decision':>12}")
+    print("─" * 70)
+    for strategy in ("heuristic", "predictive ewma", "predictive kalman"):
+        result = simulate(strategy, rates, args.minutes, args.interval, args.seed)
+        observe = "-" if result["observe_us"] is None else f"{result['observe_us']:.1f}"
+        print(f"{strategy:<20} {result['delay']:>12.1f} {result['queued']:>12.1f} "
+              f"{observe:>10} {result['decide_us']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
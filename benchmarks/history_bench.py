@@ -0,0 +1,89 @@
+# history_bench.py - RING-BUFFER HISTORY AND INCREMENTAL SPARKLINES
+
+"""
+Cost of the dashboard's trend history (history.py) and charts (render.py):
+
+- µs per History.append() with the raw ring and the downsampled tiers
+- memory of the history: fixed at creation, the same after 1 hour or 1 week
+- Tk calls per frame of a Sparkline drawing only the new points, against
+  deleting and redrawing the whole line every frame
+
+Samples arrive every --interval seconds of simulated time; a frame is drawn
+every --frame seconds. Canvases are stand-ins that count calls.
+
+    python benchmarks/history_bench.py [--lanes 2] [--hours 24] [--interval 1] [--frame 0.5]
+"""
+
+import argparse
+import time
+import sys
+import os
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from history import History
+from render import Sparkline
+
+
+class CountingCanvas:
+    """Canvas stand-in: counts the calls a sparkline makes"""
+
+    def __init__(self):
+        self.calls = 0
+        self.next_item = 0
+
+    def create_line(self, *coords, **options):
+        self.calls += 1
+        self.next_item += 1
+        return self.next_item
+
+    def move(self, *args):
+        self.calls += 1
+
+    def delete(self, *items):
+        self.calls += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="History ring buffers and sparklines")
+    parser.add_argument("--lanes", type=int, default=2)
+    parser.add_argument("--hours", type=float, default=24, help="simulated hours of samples")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between samples")
+    parser.add_argument("--frame", type=float, default=0.5, help="seconds between frames")
+    args = parser.parse_args()
+
+    history = History([f"lane{lane + 1}" for lane in range(args.lanes)])
+    start_bytes = history.nbytes()
+    rng = np.random.default_rng(1)
+    samples = int(args.hours * 3600 / args.interval)
+    values = rng.integers(0, 50, (samples, args.lanes)).tolist()
+
+    incremental, full = CountingCanvas(), CountingCanvas()
+    spark = Sparkline(incremental, 0, 0, 334, 90, 0, 50, "#00ff00")
+    redrawn = Sparkline(full, 0, 0, 334, 90, 0, 50, "#00ff00")
+    frames = 0
+    append_seconds = 0.0
+    per_frame = max(1, round(args.frame / args.interval))
+
+    for sample in range(samples):
+        started = time.perf_counter()
+        history.append(sample * args.interval, values[sample])
+        append_seconds += time.perf_counter() - started
+        if sample % per_frame == 0:
+            frames += 1
+            spark.update(history.level(0), 0)
+            redrawn.redraw(history.level(0), 0)
+
+    print(f"{samples:,} samples of {args.lanes} lanes ({args.hours:g} h at {args.interval:g} s)\n")
+    print(f"append                 {append_seconds / samples * 1e6:8.2f} µs/sample")
+    print(f"history memory         {start_bytes / 1024:8.1f} KB at start, {history.nbytes() / 1024:.1f} KB at end")
+    for level, ring in enumerate([history.raw] + [tier.ring for tier in history.tiers]):
+        name = "raw" if level == 0 else f"{history.tiers[level - 1].seconds // 60}-min"
+        print(f"  {name:<8} {len(ring):>6} / {ring.capacity} rows")
+    print(f"sparkline incremental  {incremental.calls / frames:8.1f} Tk calls/frame")
+    print(f"sparkline full redraw  {full.calls / frames:8.1f} Tk calls/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+# pipeline_bench.py - END-TO-END SENSOR -> GATEWAY -> CLOUD BENCHMARK
+
+"""
+Drives synthetic sensor load through the real gateway and cloud logic
+against the local broker (broker/local_broker.py), all on this machine:
+
+    load generator ──► local broker ──► gateway_publisher.py ──► traffic_logic.py
+         (this process)                                               │
+                 ◄──────────── traffic/decision/<id> ─────────────────┘
+
+Reports, for every (intersections, interval) combination:
+- throughput: sensor messages/s sent, summaries/s and decisions/s received
+- sensor -> decision latency p50 / p95 / p99 / max (sensor_ts is carried
+  from the sensor reading through the summary into the decision)
+- CPU % and RSS of every component (psutil if installed, else /proc)
+- dropped sensor messages (sent - received by the gateway) and late
+  decisions (latency above --late-ms)
+
+--feed direct skips the load generator and the sensor messages: the gateway
+loads traffic_generator.py ticks straight into its store (--generate), so
+the run measures the gateway aggregation and the cloud alone.
+
+Results are written as JSON so runs can be compared across commits:
+
+    python benchmarks/pipeline_bench.py --intersections 10 100 1000 --interval 1.0
+    python benchmarks/pipeline_bench.py --intersections 1000 --feed direct
+"""
+
+import argparse
+import json
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import paho.mqtt.client as mqtt
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "sensors"))
+from intersection import LANE_CHANNELS
+from lane_store import lane_name
+from topics import CHANNEL_EMERGENCY, intersection_id, parse_decision_topic, sensor_topic
+from traffic_generator import TrafficGenerator
+from wire_format import decode, encode_for
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+BROKER_SCRIPT = os.path.join(ROOT, "broker", "local_broker.py")
+GATEWAY_SCRIPT = os.path.join(ROOT, "gateway", "gateway_publisher.py")
+CLOUD_SCRIPT = os.path.join(ROOT, "cloud", "traffic_logic.py")
+
+
+# =====================================================================
+# PROCESS STATS (CPU seconds, RSS)
+# =====================================================================
+
+def _children(pid):
+    """Direct and indirect child pids (e.g. gateway shard workers)"""
+    if psutil is not None:
+        try:
+            return [child.pid for child in psutil.Process(pid).children(recursive=True)]
+        except psutil.Error:
+            return []
+
+    if not os.path.isdir("/proc"):
+        return []
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                parents.setdefault(int(fields[1]), []).append(int(entry))
+            except OSError:
+                continue
+    found = []
+    stack = [pid]
+    while stack:
+        for child in parents.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def _cpu_and_rss(pid):
+    """(CPU seconds used, RSS in KB) of one process"""
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            times = process.cpu_times()
+            return times.user + times.system, process.memory_info().rss // 1024
+        except psutil.Error:
+            return 0.0, 0
+
+    # No psutil: /proc (Linux); elsewhere (Windows) the stats stay at 0
+    try:
+        clock_ticks = os.sysconf("SC_CLK_TCK")
+        page_kb = os.sysconf("SC_PAGE_SIZE") // 1024
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        # utime, stime and rss are fields 14, 15 and 24 of /proc/<pid>/stat
+        return (int(fields[11]) + int(fields[12])) / clock_ticks, int(fields[21]) * page_kb
+    except (AttributeError, OSError, ValueError):
+        return 0.0, 0
+
+
+def sample_process(pid):
+    """(CPU seconds, RSS KB) of a process and all its children"""
+    cpu, rss = 0.0, 0
+    for member in [pid] + _children(pid):
+        member_cpu, member_rss = _cpu_and_rss(member)
+        cpu += member_cpu
+        rss += member_rss
+    return cpu, rss
+
+
+class ResourceMonitor:
+    """Samples CPU and RSS of named processes over the measurement window"""
+
+    def __init__(self, pids, period=0.5):
+        self.pids = pids
+        self.period = period
+        self.start_cpu = {}
+        self.peak_rss = {name: 0 for name in pids}
+        self.started_at = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.started_at = time.monotonic()
+        for name, pid in self.pids.items():
+            self.start_cpu[name] = sample_process(pid)[0]
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.period):
+            for name, pid in self.pids.items():
+                self.peak_rss[name] = max(self.peak_rss[name], sample_process(pid)[1])
+
+    def stop(self):
+        """{name: {"cpu_percent", "cpu_seconds", "rss_mb", "peak_rss_mb"}}"""
+        self._stop.set()
+        self._thread.join()
+        elapsed = time.monotonic() - self.started_at
+        report = {}
+        for name, pid in self.pids.items():
+            cpu, rss = sample_process(pid)
+            cpu_seconds = cpu - self.start_cpu[name]
+            report[name] = {
+                "cpu_seconds": round(cpu_seconds, 3),
+                "cpu_percent": round(100 * cpu_seconds / elapsed, 1),
+                "rss_mb": round(rss / 1024, 1),
+                "peak_rss_mb": round(max(rss, self.peak_rss[name]) / 1024, 1)
+            }
+        return report
+
+
+# =====================================================================
+# COMPONENTS
+# =====================================================================
+
+def wait_for_port(host, port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"broker did not start on {host}:{port}")
+
+
+def launch(script, args, env, log):
+    """Start a component with unbuffered output into `log`"""
+    return subprocess.Popen([sys.executable, "-u", script] + args, cwd=ROOT, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+
+
+def stop(process, timeout=10):
+    """Ctrl+C (so components print their final statistics), then kill"""
+    if process.poll() is not None:
+        return
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def gateway_messages_received(output):
+    """Messages the gateway processed, from its final statistics (None if not printed)"""
+    counts = re.findall(r"Total messages processed: (\d+)", output)
+    return sum(int(count) for count in counts) if counts else None
+
+
+# =====================================================================
+# LOAD GENERATOR AND DECISION OBSERVER
+# =====================================================================
+
+class DecisionObserver:
+    """Subscribes to decisions and summaries; records sensor -> decision latency"""
+
+    def __init__(self, late_ms):
+        self.late_ms = late_ms
+        self.measure_from = float("inf")    # sensor_ts before this belong to the warm-up
+        self.last_sensor_ts = {}
+        self.latencies = []
+        self.summaries = 0
+        self.decisions = 0
+        self.lock = threading.Lock()
+
+    def on_connect(self, client, userdata, flags, rc):
+        client.subscribe([("traffic/decision/#", 0), ("traffic/summary/#", 0)])
+
+    def on_message(self, client, userdata, msg):
+        received_at = time.time()
+        intersection = parse_decision_topic(msg.topic)
+        if intersection is None:
+            self.summaries += 1
+            return
+
+        self.decisions += 1
+        sensor_ts = decode(msg.payload).get("sensor_ts")
+        if sensor_ts is None or sensor_ts < self.measure_from:
+            return
+
+        # The cloud re-publishes every interval: count each sensor reading once
+        with self.lock:
+            if self.last_sensor_ts.get(intersection) == sensor_ts:
+                return
+            self.last_sensor_ts[intersection] = sensor_ts
+            self.latencies.append((received_at - sensor_ts) * 1000)
+
+    def reset_counters(self):
+        self.summaries = 0
+        self.decisions = 0
+
+    def latency_report(self):
+        with self.lock:
+            samples = np.array(self.latencies)
+        if len(samples) == 0:
+            return {"samples": 0, "late": 0}
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        return {
+            "samples": int(len(samples)),
+            "mean": round(float(samples.mean()), 2),
+            "p50": round(float(p50), 2),
+            "p95": round(float(p95), 2),
+            "p99": round(float(p99), 2),
+            "max": round(float(samples.max()), 2),
+            "late": int((samples > self.late_ms).sum())
+        }
+
+
+def publish_tick(client, tick, topics, interval, started):
+    """Publish one tick, spreading the intersections evenly over the interval"""
+    n_intersections = len(topics)
+    sent = 0
+    for i, (lane_topics, emergency) in enumerate(topics):
+        due = started + interval * i / n_intersections
+        delay = due - time.monotonic()
+        if delay > 0.001:
+            time.sleep(delay)
+
+        for lane, topic in enumerate(lane_topics):
+            reading = {"lane": lane_name(lane), "sensor": "IR",
+                       "vehicle_detected": int(tick.ir[i, lane]), "sent_at": time.time()}
+            client.publish(topic, encode_for(topic, reading))
+            reading = {"lane": lane_name(lane), "sensor": "Ultrasonic",
+                       "vehicle_count": int(tick.vehicle_count[i, lane]), "sent_at": time.time()}
+            client.publish(topic, encode_for(topic, reading))
+
+        reading = {"sensor": "RFID", "emergency": int(tick.emergency[i]),
+                   "emergency_lane": lane_name(int(tick.emergency_lane[i])), "sent_at": time.time()}
+        client.publish(emergency, encode_for(emergency, reading), qos=1)
+        sent += 2 * len(lane_topics) + 1
+    return sent
+
+
+# =====================================================================
+# ONE RUN
+# =====================================================================
+
+def run_once(args, n_intersections, interval):
+    env = dict(os.environ, TRAFFIC_BROKER="local", TRAFFIC_BROKER_HOST=args.host,
+               TRAFFIC_BROKER_PORT=str(args.port))
+    logs = {name: tempfile.TemporaryFile(mode="w+", encoding="utf-8", errors="replace")
+            for name in ("broker", "gateway", "cloud")}
+
+    broker = launch(BROKER_SCRIPT, ["--quiet", "--host", args.host, "--port", str(args.port)],
+                    env, logs["broker"])
+    processes = {"broker": broker}
+    observer = DecisionObserver(args.late_ms)
+    observer_client = mqtt.Client(client_id="pipeline-bench-observer")
+    load_client = mqtt.Client(client_id="pipeline-bench-load")
+
+    try:
+        wait_for_port(args.host, args.port)
+        direct = ["--generate", str(interval)] if args.feed == "direct" else []
+        processes["gateway"] = launch(GATEWAY_SCRIPT, ["--mode", args.gateway_mode,
+                                                       "--intersections", str(n_intersections),
+                                                       "--workers", str(args.gateway_workers)] + direct,
+                                      env, logs["gateway"])
+        processes["cloud"] = launch(CLOUD_SCRIPT, ["--intersections", str(n_intersections),
+                                                   "--workers", str(args.cloud_workers)],
+                                    env, logs["cloud"])
+
+        observer_client.on_connect = observer.on_connect
+        observer_client.on_message = observer.on_message
+        observer_client.connect(args.host, args.port, 60)
+        observer_client.loop_start()
+        load_client.connect(args.host, args.port, 60)
+        load_client.loop_start()
+
+        generator = TrafficGenerator(n_intersections, seed=args.seed, profile=args.profile, interval=interval)
+        topics = [([sensor_topic(intersection_id(i), channel) for channel in LANE_CHANNELS],
+                   sensor_topic(intersection_id(i), CHANNEL_EMERGENCY))
+                  for i in range(n_intersections)]
+
+        # Components connect and subscribe
+        time.sleep(args.startup)
+
+        sent_total = 0
+        started = time.monotonic()
+        warmup_end = started + args.warmup
+        end = warmup_end + args.duration
+        monitor = None
+        sent_measured = 0
+
+        while True:
+            tick_start = time.monotonic()
+            if monitor is None and tick_start >= warmup_end:
+                observer.measure_from = time.time()
+                observer.reset_counters()
+                monitor = ResourceMonitor({"broker": broker.pid, "gateway": processes["gateway"].pid,
+                                           "cloud": processes["cloud"].pid, "load_generator": os.getpid()})
+                monitor.start()
+                measured_from = tick_start
+            if tick_start >= end:
+                break
+
+            sent = 0
+            if args.feed == "mqtt":
+                sent = publish_tick(load_client, generator.tick(), topics, interval, tick_start)
+            sent_total += sent
+            if monitor is not None:
+                sent_measured += sent
+
+            delay = tick_start + interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        measured = time.monotonic() - measured_from
+        components = monitor.stop()
+        summaries, decisions = observer.summaries, observer.decisions
+
+        # Let the last readings reach a decision
+        time.sleep(args.drain)
+
+    finally:
+        for client in (load_client, observer_client):
+            client.loop_stop()
+            client.disconnect()
+        for name in ("cloud", "gateway", "broker"):
+            if name in processes:
+                stop(processes[name])
+
+    logs["gateway"].seek(0)
+    received = gateway_messages_received(logs["gateway"].read())
+    for log in logs.values():
+        log.close()
+
+    latency = observer.latency_report()
+    return {
+        "intersections": n_intersections,
+        "interval": interval,
+        "gateway_mode": args.gateway_mode,
+        "feed": args.feed,
+        "gateway_workers": args.gateway_workers,
+        "cloud_workers": args.cloud_workers,
+        "duration": round(measured, 2),
+        "throughput": {
+            "sensor_msgs_per_s": round(sent_measured / measured, 1),
+            "summaries_per_s": round(summaries / measured, 1),
+            "decisions_per_s": round(decisions / measured, 1)
+        },
+        "latency_ms": latency,
+        "messages": {
+            "sent": sent_total,
+            "gateway_received": received,
+            "dropped": None if received is None or args.feed == "direct" else max(0, sent_total - received),
+            "late": latency["late"],
+            "late_threshold_ms": args.late_ms
+        },
+        "components": components
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark")
+    parser.add_argument("--intersections", type=int, nargs="+", default=[100])
+    parser.add_argument("--interval", type=float, nargs="+", default=[1.0],
+                        help="seconds between two readings of the same intersection")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds per run")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds of load first")
+    parser.add_argument("--startup", type=float, default=3, help="seconds for components to connect")
+    parser.add_argument("--drain", type=float, default=3, help="seconds to wait for the last decisions")
+    parser.add_argument("--gateway-mode", choices=["polling", "event"], default="event")
+    parser.add_argument("--feed", choices=["mqtt", "direct"], default="mqtt",
+                        help="sensor messages over MQTT, or generator ticks loaded by the gateway itself")
+    parser.add_argument("--gateway-workers", type=int, default=1)
+    parser.add_argument("--cloud-workers", type=int, default=1)
+    parser.add_argument("--profile", default="rush_hour", help="traffic_generator.py demand profile")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--late-ms", type=float, default=1000.0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18830)
+    parser.add_argument("--output", default="pipeline_bench.json")
+    args = parser.parse_args()
+
+    results = {
+        "benchmark": "pipeline",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": git_commit(),
+        "host": {"cpus": os.cpu_count(), "python": sys.version.split()[0],
+                 "process_stats": "psutil" if psutil is not None else "/proc"},
+        "runs": []
+    }
+
+    print(f"{'intersections':>13} {'interval':>8} {'msgs/s':>8} {'dec/s':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'dropped':>8} {'late':>5}")
+    print("─" * 84)
+    for n_intersections in args.intersections:
+        for interval in args.interval:
+            run = run_once(args, n_intersections, interval)
+            results["runs"].append(run)
+            latency = run["latency_ms"]
+            print(f"{n_intersections:>13} {interval:>8.2f} {run['throughput']['sensor_msgs_per_s']:>8.0f} "
+                  f"{run['throughput']['decisions_per_s']:>7.0f} {latency.get('p50', float('nan')):>8.1f} "
+                  f"{latency.get('p95', float('nan')):>8.1f} {latency.get('p99', float('nan')):>8.1f} "
+                  f"{str(run['messages']['dropped']):>8} {latency['late']:>5}")
+            for name, usage in run["components"].items():
+                print(f"    {name:<15} CPU {usage['cpu_percent']:>6.1f}%   RSS {usage['rss_mb']:>7.1f} MB "
+                      f"(peak {usage['peak_rss_mb']:.1f} MB)")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
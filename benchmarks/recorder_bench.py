@@ -0,0 +1,166 @@
+# recorder_bench.py - COLUMNAR SEGMENTS VS JSON LINES FOR THE RECORDER
+
+"""
+Cost of recording the traffic streams (recorder/segments.py), against the
+obvious alternative of one JSON line per message:
+
+- µs per recorded row, with an fsync every --fsync seconds (both)
+- bytes per row on disk: JSON lines, open segments, compacted segments
+- one intersection over the last --window seconds: time and blocks read
+  through the time index, against reading and parsing every JSON line
+- disk usage with a --budget smaller than the data: the budget, plus the
+  open segment (segments are a quarter of the budget in that run)
+
+Rows are generated for --intersections intersections over --minutes of
+simulated time: every second one summary and one decision per
+intersection, and --readings sensor readings. Files go to a temporary
+directory.
+
+    python benchmarks/recorder_bench.py [--intersections 200] [--minutes 20] [--readings 5]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from intersection import N_LANES
+from recorder.segments import SegmentStore
+from topics import intersection_id
+
+
+def generate(args, rng):
+    """Per simulated second: (time, arrival jitter, sensor values, ir, vehicles) of every intersection"""
+    n = args.intersections
+    for second in range(int(args.minutes * 60)):
+        t = 1.7e9 + second
+        jitter = rng.random((n, args.readings + 1)) * 0.05        # messages do not arrive on a grid
+        readings = rng.integers(0, 20, (n, args.readings))
+        ir = rng.integers(0, 2, (n, N_LANES))
+        vehicles = rng.integers(0, 20, (n, N_LANES))
+        yield t, jitter, readings, ir, vehicles
+
+
+def record_segments(directory, args, ids, rng, **options):
+    store = SegmentStore(directory, **options)
+    codes = [store.code(intersection) for intersection in ids]
+    confidence = np.full(N_LANES, 100)
+    rows = 0
+    started = time.perf_counter()
+    for t, jitter, readings, ir, vehicles in generate(args, rng):
+        for row, code in enumerate(codes):
+            for reading, value in enumerate(readings[row]):
+                sent_at = t + reading * 0.1
+                store.append("sensor", sent_at + jitter[row, reading], code, reading % N_LANES, reading % 2, value,
+                             sent_at)
+            received = t + jitter[row, -1]
+            store.append("summary", received, code, ir[row], vehicles[row], confidence, 0, -1, t)
+            store.append("decision", received, code, ir[row], vehicles[row], confidence, 0, -1, t, 0, 20, 1, 10.0, 1)
+            rows += args.readings + 2
+        store.maybe_flush(t)
+        if int(t) % 60 == 0:
+            store.maintain(t)
+    store.flush()
+    return store, rows, time.perf_counter() - started, t
+
+
+def record_json(path, args, ids, rng):
+    rows = 0
+    started = time.perf_counter()
+    last_sync = None
+    with open(path, "w") as handle:
+        for t, jitter, readings, ir, vehicles in generate(args, rng):
+            for row, intersection in enumerate(ids):
+                for reading, value in enumerate(readings[row]):
+                    handle.write(json.dumps({"t": t + reading * 0.1 + jitter[row, reading],
+                                             "topic": f"traffic/sensors/{intersection}/lane1", "lane": "Lane 1",
+                                             "sensor": "IR", "vehicle_detected": int(value), "sent_at": t}) + "\n")
+                summary = {"intersection": intersection, "ir": ir[row].tolist(), "vehicles": vehicles[row].tolist(),
+                           "confidence": [100] * N_LANES, "emergency": 0, "emergency_lane": None, "sensor_ts": t}
+                received = t + jitter[row, -1]
+                handle.write(json.dumps({"t": received, "topic": f"traffic/summary/{intersection}", **summary}) + "\n")
+                handle.write(json.dumps({"t": received, "topic": f"traffic/decision/{intersection}", **summary,
+                                         "green_light": "Lane 1", "green_duration": 20, "phase": "GREEN",
+                                         "phase_remaining": 10.0, "cycle": 1}) + "\n")
+                rows += args.readings + 2
+            if last_sync is None or t - last_sync >= args.fsync:
+                handle.flush()
+                os.fsync(handle.fileno())
+                last_sync = t
+    return rows, time.perf_counter() - started
+
+
+def query_json(path, intersection, start):
+    started = time.perf_counter()
+    topic = f"traffic/summary/{intersection}"
+    rows = 0
+    with open(path) as handle:
+        for line in handle:
+            message = json.loads(line)
+            if message["topic"] == topic and message["t"] >= start:
+                rows += 1
+    return rows, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recorder storage: columnar segments vs JSON lines")
+    parser.add_argument("--intersections", type=int, default=200)
+    parser.add_argument("--minutes", type=float, default=20, help="simulated minutes")
+    parser.add_argument("--readings", type=int, default=5, help="sensor readings per intersection per second")
+    parser.add_argument("--fsync", type=float, default=1.0, help="seconds between fsyncs")
+    parser.add_argument("--window", type=float, default=300, help="seconds queried")
+    parser.add_argument("--segment-seconds", type=float, default=300)
+    parser.add_argument("--budget", type=float, default=2, help="MB of disk for the bounded run")
+    args = parser.parse_args()
+
+    ids = [intersection_id(number) for number in range(args.intersections)]
+    options = {"fsync_interval": args.fsync, "segment_seconds": args.segment_seconds}
+    with tempfile.TemporaryDirectory() as directory:
+        store, rows, seconds, end = record_segments(os.path.join(directory, "segments"), args, ids,
+                                                    np.random.default_rng(1), **options)
+        compacted = sum(segment.size for segment in store.segments if segment.compacted)
+        compacted_rows = sum(int(segment.index["rows"].sum()) for segment in store.segments if segment.compacted)
+        open_bytes = sum(segment.size for segment in store.segments if not segment.compacted)
+        open_rows = sum(int(segment.index["rows"].sum()) for segment in store.segments if not segment.compacted)
+
+        json_path = os.path.join(directory, "messages.jsonl")
+        json_rows, json_seconds = record_json(json_path, args, ids, np.random.default_rng(1))
+
+        target = ids[len(ids) // 2]
+        start = end - args.window
+        started = time.perf_counter()
+        found = store.query("summary", start, end, intersection=target)
+        query_seconds = time.perf_counter() - started
+        blocks_read = store.stats["blocks_read"]
+        blocks = sum(len(segment.index) for segment in store.segments)
+        json_found, json_query_seconds = query_json(json_path, target, start)
+
+        print(f"{rows:,} rows: {args.intersections} intersections, {args.minutes:g} min, "
+              f"{args.readings} readings + 1 summary + 1 decision per intersection per second\n")
+        print(f"{'':<26} {'µs/row':>8} {'bytes/row':>10} {'fsyncs':>7}")
+        print("─" * 54)
+        print(f"{'JSON lines':<26} {json_seconds / json_rows * 1e6:>8.2f} "
+              f"{os.path.getsize(json_path) / json_rows:>10.1f} {'':>7}")
+        print(f"{'segments (open)':<26} {seconds / rows * 1e6:>8.2f} "
+              f"{open_bytes / max(open_rows, 1):>10.1f} {store.stats['fsyncs']:>7}")
+        print(f"{'segments (compacted)':<26} {'':>8} {compacted / max(compacted_rows, 1):>10.1f}")
+        print(f"\nsummaries of {target}, last {args.window:g} s:")
+        print(f"  JSON lines               {json_query_seconds * 1000:8.1f} ms  ({json_found} rows, every line parsed)")
+        print(f"  segments + time index    {query_seconds * 1000:8.1f} ms  ({len(found['time'])} rows, "
+              f"{blocks_read} of {blocks} blocks read)")
+
+        budget = args.budget * 2**20
+        bounded, _, _, _ = record_segments(os.path.join(directory, "bounded"), args, ids, np.random.default_rng(1),
+                                           max_bytes=budget, segment_bytes=budget / 4, **options)
+        print(f"\nwith a {args.budget:g} MB budget: {bounded.nbytes() / 2**20:.2f} MB on disk "
+              f"({len(bounded.segments)} segments, {bounded.stats['deleted']} deleted, "
+              f"open one {bounded.active.size / 2**20:.2f} MB)")
+
+
+if __name__ == "__main__":
+    main()
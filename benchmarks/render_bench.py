@@ -0,0 +1,146 @@
+# render_bench.py - FULL REDRAW VS INCREMENTAL DASHBOARD RENDERING
+
+"""
+Frame cost of the dashboard's two ways of updating its widgets, for a
+growing number of lanes:
+
+- full redraw    every label / frame .config()'d every frame, every traffic
+                 light deleted and its two ovals created again
+- incremental    render.py: options go through a Renderer, only changed ones
+                 are configured at flush(), lights are recolored in place
+
+Each frame changes what a real one does: the countdown and clock labels,
+plus a few lanes' vehicle counts (--change of them) and, every
+--phase-every frames, the lights.
+
+With --tk the widgets are real Tk widgets (needs a display); without it
+they are stand-ins that take the calls, so only the Python side is timed.
+A Tk call (a Tcl round trip, then a redraw of the widget) costs far more
+than the bookkeeping, so Tk calls per frame is the column to compare.
+
+    python benchmarks/render_bench.py [--lanes 2 8 32 128] [--frames 200] [--change 0.1] [--tk]
+"""
+
+import argparse
+import time
+import sys
+import os
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from render import Renderer, TrafficLight, LIGHT_COLORS
+
+
+class StandIn:
+    """Label / frame / canvas that takes the calls that would go to Tk"""
+
+    def __init__(self):
+        self.items = 0
+
+    def configure(self, **options):
+        pass
+
+    config = configure
+
+    def itemconfigure(self, item, **options):
+        pass
+
+    def create_oval(self, *coords, **options):
+        self.items += 1
+        return self.items
+
+    def delete(self, *items):
+        pass
+
+
+def make_widgets(lanes, use_tk):
+    if not use_tk:
+        return None, [StandIn() for _ in range(lanes)], [StandIn() for _ in range(lanes)], \
+               [StandIn() for _ in range(4)]
+    import tkinter as tk
+    root = tk.Tk()
+    labels, canvases = [], []
+    for lane in range(lanes):
+        frame = tk.Frame(root)
+        frame.grid(row=lane // 16, column=lane % 16)
+        labels.append(tk.Label(frame, text="🚗 Vehicles: 0"))
+        labels[-1].pack()
+        canvases.append(tk.Canvas(frame, width=150, height=100))
+        canvases[-1].pack()
+    others = [tk.Label(root, text="") for _ in range(4)]
+    return root, labels, canvases, others
+
+
+def draw_full(canvas, color):
+    """The old draw_traffic_light"""
+    canvas.delete("all")
+    canvas.create_oval(35, 10, 115, 90, outline="#444444", width=3, fill="#111111")
+    fill, outline = LIGHT_COLORS[color]
+    canvas.create_oval(45, 20, 105, 80, fill=fill, outline=outline, width=2)
+
+
+def frames(lanes, n_frames, change, phase_every, rng):
+    """Per frame: (vehicle counts, green lane, countdown text, clock text)"""
+    counts = rng.integers(0, 20, lanes)
+    green = 0
+    for frame in range(n_frames):
+        changed = rng.random(lanes) < change
+        counts = np.where(changed, rng.integers(0, 20, lanes), counts)
+        if frame % phase_every == 0:
+            green = (green + 1) % lanes
+        yield counts.tolist(), green, f"{45 - frame * 0.5 % 45:.1f} / 45 seconds", f"{frame // 2}"
+
+
+def run(mode, lanes, args, use_tk):
+    root, labels, canvases, others = make_widgets(lanes, use_tk)
+    render = Renderer()
+    lights = [TrafficLight(canvas, render) for canvas in canvases] if mode == "incremental" else None
+    rng = np.random.default_rng(args.seed)
+    calls = 0
+
+    started = time.perf_counter()
+    for counts, green, countdown, clock in frames(lanes, args.frames, args.change, args.phase_every, rng):
+        if mode == "full":
+            for lane in range(lanes):
+                labels[lane].config(text=f"🚗 Vehicles: {counts[lane]}")
+                draw_full(canvases[lane], "green" if lane == green else "red")
+            for widget, text in zip(others, (countdown, clock, "✓ NONE", "No emergency vehicles")):
+                widget.config(text=text)
+            calls += 4 * lanes + len(others)      # config + delete + 2 create_oval per lane
+        else:
+            for lane in range(lanes):
+                render.set(labels[lane], text=f"🚗 Vehicles: {counts[lane]}")
+                lights[lane].show("green" if lane == green else "red")
+            for widget, text in zip(others, (countdown, clock, "✓ NONE", "No emergency vehicles")):
+                render.set(widget, text=text)
+            calls += render.flush()
+        if root is not None:
+            root.update_idletasks()
+    seconds = time.perf_counter() - started
+
+    if root is not None:
+        root.destroy()
+    return seconds / args.frames * 1e6, calls / args.frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full redraw vs incremental rendering")
+    parser.add_argument("--lanes", type=int, nargs="+", default=[2, 8, 32, 128])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--change", type=float, default=0.1, help="share of lanes whose count changes per frame")
+    parser.add_argument("--phase-every", type=int, default=20, help="frames between light changes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tk", action="store_true", help="real Tk widgets (needs a display)")
+    args = parser.parse_args()
+
+    print(f"{'lanes':>6} {'mode':<12} {'µs/frame':>10} {'Tk calls/frame':>15}")
+    print("─" * 46)
+    for lanes in args.lanes:
+        for mode in ("full", "incremental"):
+            frame_us, calls = run(mode, lanes, args, args.tk)
+            print(f"{lanes:>6} {mode:<12} {frame_us:>10.1f} {calls:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
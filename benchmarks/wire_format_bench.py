@@ -0,0 +1,88 @@
+# wire_format_bench.py - BYTES/MSG AND DECODE COST OF JSON VS BINARY
+
+"""
+Compares the JSON and binary wire formats on typical messages:
+bytes per message, encode and decode microseconds per message.
+
+    python benchmarks/wire_format_bench.py [--repeat 20000]
+"""
+
+import argparse
+import time
+import timeit
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from wire_format import FORMAT_BINARY, FORMAT_JSON, decode, encode
+
+MESSAGES = {
+    "IR reading": {"lane": "Lane 1", "sensor": "IR", "vehicle_detected": 1, "sent_at": time.time()},
+    "Ultrasonic reading": {"lane": "Lane 2", "sensor": "Ultrasonic", "vehicle_count": 14, "sent_at": time.time()},
+    "RFID reading": {"sensor": "RFID", "emergency": 1, "emergency_lane": "Lane 2", "sent_at": time.time()},
+    "Gateway summary": {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "intersection": "I0042",
+        "ir": [1, 0], "vehicles": [12, 7], "confidence": [100, 75],
+        "average_confidence": 87.5,
+        "emergency": 0, "emergency_lane": None,
+        "green_light": "Lane 1",
+        "sensor_ts": time.time(),
+        "messages_processed": 123456,
+        "sensor_mismatches_detected": 321
+    },
+    "Cloud decision": {
+        "intersection": "I0042", "emergency": 1, "emergency_lane": "Lane 2",
+        "green_light": "Lane 2", "green_duration": 45, "sensor_ts": None,
+        "ir": [1, 0], "vehicles": [12, 7], "confidence": [100, 75],
+        "phase": "GREEN", "phase_remaining": 31.5, "cycle": 812
+    },
+    # lane1_* / lane2_* keys of older gateways and clouds
+    "Summary (legacy)": {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "intersection": "I0042",
+        "lane1_ir": 1, "lane2_ir": 0,
+        "lane1_vehicles": 12, "lane2_vehicles": 7,
+        "lane1_confidence": 100, "lane2_confidence": 75,
+        "average_confidence": 87.5,
+        "emergency": 0, "emergency_lane": None,
+        "green_light": "Lane 1",
+        "sensor_ts": time.time(),
+        "messages_processed": 123456,
+        "sensor_mismatches_detected": 321
+    },
+    "Decision (legacy)": {
+        "intersection": "I0042", "emergency": 1, "emergency_lane": "Lane 2",
+        "green_light": "Lane 2", "green_duration": 45, "sensor_ts": None,
+        "lane1_ir": 1, "lane1_vehicles": 12, "lane1_confidence": 100,
+        "lane2_ir": 0, "lane2_vehicles": 7, "lane2_confidence": 75
+    },
+    "Other dict": {"intersection": "a-long-intersection-name", "green_light": "Lane 1", "note": "free-form"}
+}
+
+
+def per_message_us(func, repeat):
+    return min(timeit.repeat(func, number=repeat, repeat=3)) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wire format benchmark")
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'message':<20} {'format':<7} {'bytes':>6} {'encode µs':>10} {'decode µs':>10}")
+    print("─" * 58)
+    for name, message in MESSAGES.items():
+        for fmt in (FORMAT_JSON, FORMAT_BINARY):
+            payload = encode(message, fmt)
+            if isinstance(payload, str):
+                payload = payload.encode()
+            assert decode(payload) == message, f"{name} does not round-trip in {fmt}"
+
+            encode_us = per_message_us(lambda: encode(message, fmt), args.repeat)
+            decode_us = per_message_us(lambda: decode(payload), args.repeat)
+            print(f"{name:<20} {fmt:<7} {len(payload):>6} {encode_us:>10.2f} {decode_us:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+# local_broker.py - LIGHTWEIGHT LOCAL MQTT BROKER (asyncio)
+
+"""
+Local MQTT 3.1.1 broker for offline runs and benchmarks
+
+Select it with BROKER_PROFILE = "local" in config.py (or the environment
+variable TRAFFIC_BROKER=local), start it, then start the other components
+as usual:
+
+    python broker/local_broker.py [--host 127.0.0.1] [--port 1883]
+
+Supported:
+- CONNECT / CONNACK (clean sessions only, last will on unclean disconnect)
+- PUBLISH with QoS 0 and 1 (PUBACK); QoS 2 is acknowledged (PUBREC/PUBCOMP)
+  and delivered as QoS 1
+- SUBSCRIBE / UNSUBSCRIBE with "+" and "#" wildcards (topic trie)
+- retained messages, PINGREQ, DISCONNECT, keep-alive timeout
+
+No persistence, no authentication, no redelivery of unacknowledged QoS 1
+messages: it is a stand-in for a real broker on one machine.
+"""
+
+import argparse
+import asyncio
+import struct
+import threading
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import BROKER, BROKER_PROFILE, BROKER_PROFILES, PORT
+
+# Where to listen by default: this machine, even when the configured broker is the public one
+LOCAL_HOST = BROKER if BROKER_PROFILE == "local" else BROKER_PROFILES["local"][0]
+
+# Packet types (high nibble of the first byte)
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+PUBREC = 5
+PUBREL = 6
+PUBCOMP = 7
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+CONNACK_ACCEPTED = 0
+CONNACK_BAD_PROTOCOL = 1
+
+MAX_QOS = 1
+# Outgoing bytes queued for one client before QoS 0 messages to it are dropped
+MAX_CLIENT_BUFFER = 8 * 1024 * 1024
+
+_U16 = struct.Struct("!H")
+
+
+# =====================================================================
+# PACKET ENCODING
+# =====================================================================
+
+def _remaining_length(length):
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        encoded.append(byte)
+        if not length:
+            return bytes(encoded)
+
+
+def packet(packet_type, flags, body=b""):
+    """Fixed header + body"""
+    return bytes([(packet_type << 4) | flags]) + _remaining_length(len(body)) + body
+
+
+def publish_packet(topic, payload, qos=0, packet_id=0, retain=False):
+    topic = topic.encode()
+    body = _U16.pack(len(topic)) + topic
+    if qos:
+        body += _U16.pack(packet_id)
+    return packet(PUBLISH, (qos << 1) | int(retain), body + payload)
+
+
+def _read_string(data, offset):
+    length = _U16.unpack_from(data, offset)[0]
+    offset += 2
+    return data[offset:offset + length], offset + length
+
+
+# =====================================================================
+# SUBSCRIPTIONS (topic trie)
+# =====================================================================
+
+class TopicTrie:
+    """Topic filter -> {session: qos}, matched level by level"""
+
+    def __init__(self):
+        self.root = {}     # level -> [children dict, {session: qos}]
+
+    def add(self, topic_filter, session, qos):
+        node = None
+        children = self.root
+        for level in topic_filter.split("/"):
+            node = children.setdefault(level, [{}, {}])
+            children = node[0]
+        node[1][session] = qos
+
+    def remove(self, topic_filter, session):
+        node = None
+        children = self.root
+        for level in topic_filter.split("/"):
+            node = children.get(level)
+            if node is None:
+                return
+            children = node[0]
+        node[1].pop(session, None)
+
+    def match(self, topic):
+        """{session: max qos} of every filter matching `topic`"""
+        levels = topic.split("/")
+        matched = {}
+        # Wildcards at the first level never match $SYS-style topics
+        self._match(self.root, levels, 0, matched, topic.startswith("$"))
+        return matched
+
+    def _match(self, children, levels, depth, matched, system):
+        wildcards = not (system and depth == 0)
+
+        if wildcards:
+            node = children.get("#")
+            if node is not None:
+                self._collect(node[1], matched)
+
+        if depth == len(levels):
+            return
+
+        last = depth + 1 == len(levels)
+        for key in (levels[depth], "+") if wildcards else (levels[depth],):
+            node = children.get(key)
+            if node is None:
+                continue
+            if last:
+                self._collect(node[1], matched)
+                # "a/#" also matches "a"
+                parent_of_hash = node[0].get("#")
+                if parent_of_hash is not None:
+                    self._collect(parent_of_hash[1], matched)
+            else:
+                self._match(node[0], levels, depth + 1, matched, system)
+
+    @staticmethod
+    def _collect(subscribers, matched):
+        for session, qos in subscribers.items():
+            if qos > matched.get(session, -1):
+                matched[session] = qos
+
+
+# =====================================================================
+# BROKER
+# =====================================================================
+
+class Session:
+
+    def __init__(self, broker, reader, writer):
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        self.client_id = None
+        self.keepalive = 0
+        self.subscriptions = set()
+        self.will = None            # (topic, payload, qos, retain)
+        self.next_packet_id = 0
+
+    def send(self, data):
+        self.writer.write(data)
+
+    def deliver(self, topic, payload, qos, retain=False):
+        if qos == 0 and self.writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            self.broker.stats["dropped"] += 1
+            return
+        packet_id = 0
+        if qos:
+            self.next_packet_id = self.next_packet_id % 65535 + 1
+            packet_id = self.next_packet_id
+        self.send(publish_packet(topic, payload, qos, packet_id, retain))
+        self.broker.stats["messages_out"] += 1
+
+
+class LocalBroker:
+
+    def __init__(self, verbose=True):
+        self.verbose = verbose
+        self.subscriptions = TopicTrie()
+        self.sessions = {}          # client id -> Session
+        self.retained = {}          # topic -> (payload, qos)
+        self.server = None
+        self.stats = {
+            "connections": 0,
+            "messages_in": 0,
+            "messages_out": 0,
+            "dropped": 0
+        }
+
+    def log(self, text):
+        if self.verbose:
+            print(text)
+
+    async def start(self, host, port):
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        return self.server
+
+    async def serve_forever(self, host, port):
+        await self.start(host, port)
+        self.log(f"✅ Local MQTT broker listening on {host}:{port}")
+        async with self.server:
+            await self.server.serve_forever()
+
+    # ===== ROUTING =====
+
+    def route(self, topic, payload, qos, retain=False):
+        """Deliver a published message to every matching subscriber"""
+        self.stats["messages_in"] += 1
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+
+        for session, granted in self.subscriptions.match(topic).items():
+            session.deliver(topic, payload, min(qos, granted))
+
+    # ===== CONNECTION =====
+
+    async def read_packet(self, reader):
+        header = await reader.readexactly(1)
+        length = 0
+        multiplier = 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+            if multiplier > 128 ** 3:
+                raise ValueError("malformed remaining length")
+        body = await reader.readexactly(length) if length else b""
+        return header[0] >> 4, header[0] & 0x0F, body
+
+    async def handle_client(self, reader, writer):
+        session = Session(self, reader, writer)
+        clean = False
+        try:
+            packet_type, _, body = await asyncio.wait_for(self.read_packet(reader), 10)
+            if packet_type != CONNECT or not self.connect(session, body):
+                return
+
+            while True:
+                timeout = session.keepalive * 1.5 if session.keepalive else None
+                packet_type, flags, body = await asyncio.wait_for(self.read_packet(reader), timeout)
+
+                if packet_type == PUBLISH:
+                    self.handle_publish(session, flags, body)
+                elif packet_type == SUBSCRIBE:
+                    self.handle_subscribe(session, body)
+                elif packet_type == UNSUBSCRIBE:
+                    self.handle_unsubscribe(session, body)
+                elif packet_type == PUBREL:
+                    session.send(packet(PUBCOMP, 0, body[:2]))
+                elif packet_type == PINGREQ:
+                    session.send(packet(PINGRESP, 0))
+                elif packet_type == DISCONNECT:
+                    clean = True
+                    break
+                # PUBACK / PUBREC / PUBCOMP from clients: nothing is kept for redelivery
+
+                if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                    await writer.drain()
+
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ValueError,
+                struct.error, IndexError):
+            # Gone, or sent a malformed packet: drop this client, keep serving the others
+            pass
+        finally:
+            self.disconnect(session, clean)
+            writer.close()
+
+    def connect(self, session, body):
+        protocol, offset = _read_string(body, 0)
+        level, flags = body[offset], body[offset + 1]
+        session.keepalive = _U16.unpack_from(body, offset + 2)[0]
+        offset += 4
+
+        if protocol not in (b"MQTT", b"MQIsdp") or level not in (3, 4):
+            session.send(packet(CONNACK, 0, bytes([0, CONNACK_BAD_PROTOCOL])))
+            return False
+
+        client_id, offset = _read_string(body, offset)
+        session.client_id = client_id.decode() or f"anonymous-{id(session):x}"
+        if flags & 0x04:
+            will_topic, offset = _read_string(body, offset)
+            will_payload, offset = _read_string(body, offset)
+            session.will = (will_topic.decode(), will_payload, min((flags >> 3) & 0x03, MAX_QOS),
+                            bool(flags & 0x20))
+
+        # Same client id: the new connection takes over
+        previous = self.sessions.get(session.client_id)
+        if previous is not None:
+            previous.writer.close()
+        self.sessions[session.client_id] = session
+        self.stats["connections"] += 1
+
+        session.send(packet(CONNACK, 0, bytes([0, CONNACK_ACCEPTED])))
+        self.log(f"🔌 Client connected: {session.client_id}")
+        return True
+
+    def disconnect(self, session, clean):
+        for topic_filter in session.subscriptions:
+            self.subscriptions.remove(topic_filter, session)
+        session.subscriptions.clear()
+
+        if session.client_id is None:
+            return
+        if self.sessions.get(session.client_id) is session:
+            del self.sessions[session.client_id]
+        if not clean and session.will is not None:
+            topic, payload, qos, retain = session.will
+            self.route(topic, payload, qos, retain)
+        self.log(f"🔌 Client disconnected: {session.client_id}")
+
+    # ===== PACKETS =====
+
+    def handle_publish(self, session, flags, body):
+        qos = (flags >> 1) & 0x03
+        topic, offset = _read_string(body, 0)
+        if qos:
+            packet_id = body[offset:offset + 2]
+            offset += 2
+            session.send(packet(PUBACK if qos == 1 else PUBREC, 0, packet_id))
+        self.route(topic.decode(), bytes(body[offset:]), min(qos, MAX_QOS), bool(flags & 0x01))
+
+    def handle_subscribe(self, session, body):
+        packet_id = body[:2]
+        offset = 2
+        granted = bytearray()
+        new_filters = []
+        while offset < len(body):
+            topic_filter, offset = _read_string(body, offset)
+            qos = min(body[offset] & 0x03, MAX_QOS)
+            offset += 1
+            topic_filter = topic_filter.decode()
+            self.subscriptions.add(topic_filter, session, qos)
+            session.subscriptions.add(topic_filter)
+            new_filters.append((topic_filter, qos))
+            granted.append(qos)
+        session.send(packet(SUBACK, 0, packet_id + bytes(granted)))
+
+        # Retained messages matching the new filters
+        if self.retained:
+            matcher = TopicTrie()
+            for topic_filter, qos in new_filters:
+                matcher.add(topic_filter, session, qos)
+            for topic, (payload, retained_qos) in self.retained.items():
+                granted_qos = matcher.match(topic).get(session)
+                if granted_qos is not None:
+                    session.deliver(topic, payload, min(retained_qos, granted_qos), retain=True)
+
+    def handle_unsubscribe(self, session, body):
+        packet_id = body[:2]
+        offset = 2
+        while offset < len(body):
+            topic_filter, offset = _read_string(body, offset)
+            topic_filter = topic_filter.decode()
+            self.subscriptions.remove(topic_filter, session)
+            session.subscriptions.discard(topic_filter)
+        session.send(packet(UNSUBACK, 0, packet_id))
+
+
+def start_in_thread(host=LOCAL_HOST, port=PORT, verbose=False):
+    """Run a LocalBroker on a daemon thread (benchmarks, all-in-one runs); returns it once listening"""
+    broker = LocalBroker(verbose=verbose)
+    started = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(broker.start(host, port))
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="local-broker", daemon=True).start()
+    if not started.wait(5):
+        raise RuntimeError(f"local broker did not start on {host}:{port}")
+    return broker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local MQTT broker")
+    parser.add_argument("--host", default=LOCAL_HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--quiet", action="store_true", help="do not log connects / disconnects")
+    args = parser.parse_args()
+
+    broker = LocalBroker(verbose=not args.quiet)
+
+    print("\n" + "=" * 70)
+    print("📡 LOCAL MQTT BROKER STARTED")
+    print("=" * 70)
+    try:
+        asyncio.run(broker.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        print(f"\n\n⛔ Broker stopped by user")
+        print(f"Messages in: {broker.stats['messages_in']}, out: {broker.stats['messages_out']}, "
+              f"dropped: {broker.stats['dropped']}")
+
+
+if __name__ == "__main__":
+    main()
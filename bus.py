@@ -0,0 +1,218 @@
+# bus.py - IN-MEMORY PUB/SUB BUS WITH PAHO-STYLE CLIENTS
+
+"""
+In-process stand-in for the MQTT broker (all_in_one.py)
+
+- same topic semantics as the broker: "+" / "#" filters (the broker's topic
+  trie), "a/#" also matches "a", retained messages, no wildcard match on
+  "$..." topics
+- Client mirrors the part of paho.mqtt.client.Client the components use
+  (on_connect / on_subscribe / on_message, connect, subscribe, publish,
+  loop_start, disconnect), so gateway, cloud logic and sensor engine run on
+  it unchanged and it can be swapped for a real MQTT client
+- zero copy: clients set `carries_objects`, so publishers hand over the
+  message dict itself (wire_format.encode_for_client) and decode() passes it
+  through. Every subscriber gets the same object: treat it as read-only.
+
+Delivery is never re-entrant: publish() queues, and the queue is drained on
+the asyncio loop (call_soon) or, without a loop, by calling drain(). So
+callbacks run one at a time, after the publisher's own code, as with paho.
+
+    bus = InMemoryBus(asyncio.get_running_loop())
+    client = bus.client("gateway")
+    client.on_message = on_message
+    client.connect()
+    client.subscribe("traffic/sensors/+/lane1")
+"""
+
+import itertools
+from collections import deque
+
+from broker.local_broker import TopicTrie
+from topics import topic_matches
+
+# paho return codes
+MQTT_ERR_SUCCESS = 0
+MQTT_ERR_NO_CONN = 4
+
+
+class Message:
+    """What on_message receives (same attributes as paho's MQTTMessage)"""
+
+    __slots__ = ("topic", "payload", "qos", "retain", "mid")
+
+    def __init__(self, topic, payload, qos=0, retain=False, mid=0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.mid = mid
+
+
+class MessageInfo:
+    """What publish() returns (delivery is queued, so it is "published" at once)"""
+
+    __slots__ = ("rc", "mid")
+
+    def __init__(self, rc, mid):
+        self.rc = rc
+        self.mid = mid
+
+    def is_published(self):
+        return self.rc == MQTT_ERR_SUCCESS
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+
+class InMemoryBus:
+
+    def __init__(self, loop=None):
+        self.loop = loop                    # None -> the owner calls drain()
+        self.subscriptions = TopicTrie()    # filter -> {client: qos}
+        self.retained = {}                  # topic -> Message
+        self._routes = {}                   # topic -> [(client, qos)], reset when subscriptions change
+        self._queue = deque()               # (callback, args) waiting to run
+        self._scheduled = False
+        self._mids = itertools.count(1)
+        self.stats = {"published": 0, "delivered": 0}
+
+    def client(self, client_id="", userdata=None):
+        return Client(self, client_id, userdata)
+
+    def next_mid(self):
+        return next(self._mids)
+
+    # ===== QUEUE =====
+
+    def call(self, callback, *args):
+        """Run a client callback after the current one (never inside publish())"""
+        self._queue.append((callback, args))
+        if self.loop is not None and not self._scheduled:
+            self._scheduled = True
+            self.loop.call_soon(self.drain)
+
+    def drain(self):
+        """Run every queued callback, including those queued meanwhile; returns how many ran"""
+        self._scheduled = False
+        ran = 0
+        while self._queue:
+            callback, args = self._queue.popleft()
+            callback(*args)
+            ran += 1
+        return ran
+
+    # ===== PUB / SUB =====
+
+    def subscribe(self, client, topic_filter, qos):
+        self.subscriptions.add(topic_filter, client, qos)
+        self._routes.clear()
+        for topic, message in self.retained.items():
+            if topic_matches(topic_filter, topic):
+                self.call(client.deliver, message)
+
+    def unsubscribe(self, client, topic_filter):
+        self.subscriptions.remove(topic_filter, client)
+        self._routes.clear()
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        mid = self.next_mid()
+        self.stats["published"] += 1
+
+        if retain:
+            if payload is None or payload == b"" or payload == "":
+                self.retained.pop(topic, None)
+            else:
+                self.retained[topic] = Message(topic, payload, qos, True, mid)
+
+        route = self._routes.get(topic)
+        if route is None:
+            route = self._routes[topic] = list(self.subscriptions.match(topic).items())
+        if route:
+            # One message object for every subscriber: nothing is copied
+            message = Message(topic, payload, qos, False, mid)
+            for client, granted in route:
+                self.call(client.deliver, message)
+            self.stats["delivered"] += len(route)
+        return mid
+
+
+class Client:
+    """paho.mqtt.client.Client look-alike on an InMemoryBus"""
+
+    carries_objects = True      # publishers hand over dicts, not encoded bytes
+
+    def __init__(self, bus, client_id="", userdata=None):
+        self.bus = bus
+        self.client_id = client_id
+        self.userdata = userdata
+        self.connected = False
+        self.filters = set()
+        self.on_connect = None
+        self.on_subscribe = None
+        self.on_message = None
+        self.on_disconnect = None
+
+    def reinitialise(self, client_id="", clean_session=True, userdata=None):
+        self.disconnect()
+        self.client_id = client_id
+        self.userdata = userdata
+
+    def connect(self, host=None, port=None, keepalive=60):
+        """Host and port are ignored: the bus is in this process"""
+        self.connected = True
+        if self.on_connect is not None:
+            self.bus.call(self.on_connect, self, self.userdata, {"session present": 0}, 0)
+        return MQTT_ERR_SUCCESS
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self, force=False):
+        pass
+
+    def disconnect(self):
+        if not self.connected:
+            return MQTT_ERR_NO_CONN
+        for topic_filter in self.filters:
+            self.bus.unsubscribe(self, topic_filter)
+        self.filters.clear()
+        self.connected = False
+        if self.on_disconnect is not None:
+            self.bus.call(self.on_disconnect, self, self.userdata, 0)
+        return MQTT_ERR_SUCCESS
+
+    def subscribe(self, topic, qos=0):
+        """topic: "a/b", ("a/b", qos) or [("a/b", qos), ...] as with paho"""
+        if isinstance(topic, str):
+            filters = [(topic, qos)]
+        elif isinstance(topic, tuple):
+            filters = [topic]
+        else:
+            filters = list(topic)
+        if not self.connected:
+            return MQTT_ERR_NO_CONN, None
+
+        mid = self.bus.next_mid()
+        for topic_filter, filter_qos in filters:
+            self.filters.add(topic_filter)
+            self.bus.subscribe(self, topic_filter, filter_qos)
+        if self.on_subscribe is not None:
+            self.bus.call(self.on_subscribe, self, self.userdata, mid,
+                          tuple(filter_qos for _, filter_qos in filters))
+        return MQTT_ERR_SUCCESS, mid
+
+    def unsubscribe(self, topic):
+        for topic_filter in [topic] if isinstance(topic, str) else topic:
+            self.filters.discard(topic_filter)
+            self.bus.unsubscribe(self, topic_filter)
+        return MQTT_ERR_SUCCESS, self.bus.next_mid()
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        if not self.connected:
+            return MessageInfo(MQTT_ERR_NO_CONN, 0)
+        return MessageInfo(MQTT_ERR_SUCCESS, self.bus.publish(topic, payload, qos, retain))
+
+    def deliver(self, message):
+        if self.connected and self.on_message is not None:
+            self.on_message(self, self.userdata, message)
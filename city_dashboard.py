@@ -0,0 +1,538 @@
+# city_dashboard.py - CITY-WIDE GRID OF INTERSECTIONS
+
+"""
+Dashboard for many intersections (I0000, I0001, ... as in sensor_engine.py
+and the gateway / cloud --intersections option)
+
+- One tile per intersection on a single canvas, virtualized: only the slots
+  on screen have canvas items, and scrolling binds the same tiles to other
+  intersections, so the item count depends on the window, not on N
+- Level of detail: small tiles show the intersection, the light of each
+  phase group, the vehicles waiting and emergencies (red border); from
+  CITY_DETAIL_TILE_WIDTH pixels wide tiles also list every lane. "+" / "-"
+  zoom through CITY_TILE_SIZES. Clicking a tile opens the full detail of
+  that intersection on the right (countdown, every lane, confidence)
+- Subscriptions follow the view: only the summary / decision topics of the
+  intersections on screen, CITY_SUBSCRIBE_MARGIN screens around them and the
+  selected one are subscribed, updated once scrolling has settled for
+  CITY_SUBSCRIBE_DELAY seconds. Tiles without news for CITY_STALE_AFTER
+  seconds are dimmed
+- As in dashboard.py the MQTT thread only queues raw payloads; every frame
+  the UI thread drains them and re-renders the tiles whose intersection
+  changed, through render.py (only changed options reach Tk)
+
+    python city_dashboard.py --intersections 1000
+"""
+
+import argparse
+import math
+import time
+from collections import deque
+
+import numpy as np
+import tkinter as tk
+import paho.mqtt.client as mqtt
+
+from config import (BROKER, PORT, TOPIC_RESYNC, DASHBOARD_INBOX_SIZE, DASHBOARD_DRAIN_BATCH,
+                    CITY_TILE_SIZES, CITY_DETAIL_TILE_WIDTH, CITY_SUBSCRIBE_MARGIN,
+                    CITY_SUBSCRIBE_DELAY, CITY_STALE_AFTER)
+from delta import DeltaTracker
+from intersection import GROUP_LANES, LANES, N_GROUPS, N_LANES, group_index, group_name, group_of_lane
+from lane_store import LaneStore, lane_name
+from metrics import counter, gauge, histogram, start_metrics
+from render import Renderer, LIGHT_COLORS
+from structured_log import get_logger
+from topics import decision_topic, intersection_id, summary_topic
+from wire_format import decode, encode_for_client
+
+# Tile colors
+TILE_BG = "#2d2d2d"
+TILE_STALE_BG = "#1a1a1a"
+TEXT = "#ffffff"
+TEXT_STALE = "#666666"
+LANE_GREEN = "#00ff00"
+LANE_RED = "#ff6b6b"
+
+# Phase -> color of the lit group's light (the other groups are red)
+PHASE_COLORS = {"MIN_GREEN": "green", "GREEN": "green", "YELLOW": "yellow", "ALL_RED": "red"}
+
+LANE_LINE = 14      # pixels per lane line in detailed tiles
+
+
+# =====================================================================
+# STATE
+# =====================================================================
+
+store = LaneStore(capacity=1)   # one row per intersection (setup())
+city = {
+    "n": 0,
+    "topics": {},               # topic -> (row, is decision topic)
+    "phase": [],                # row -> phase name of the last decision (None = none yet)
+    "ends_at": None,            # row -> end of that phase (time.time())
+    "updated": None             # row -> time of the last message (0 = never)
+}
+
+# Raw (topic, payload, received at) from the network thread, drained every frame
+inbox = deque(maxlen=DASHBOARD_INBOX_SIZE)
+deltas = DeltaTracker()
+dirty = set()                   # rows changed since the last frame
+
+view = {
+    "zoom": 1,                  # index in CITY_TILE_SIZES
+    "tile": None,               # (width, height) of the tiles on the canvas
+    "first_row": 0,             # first grid row on screen
+    "columns": 0,
+    "rows": 0,                  # grid rows on screen
+    "selected": None,           # row shown in the detail panel
+    "moved_at": None,           # when the view last changed (subscriptions not updated yet)
+    "reconnected": False        # set by the network thread: subscribe everything again
+}
+subscribed = set()              # topics
+tiles = []
+render = Renderer()
+
+metric = {
+    "received": counter("city_messages_received_total", "Summaries / decisions received"),
+    "overflow": counter("city_inbox_dropped_total", "Messages dropped because the inbox was full"),
+    "decode": histogram("city_decode_seconds", "Time to decode one payload"),
+    "render": histogram("city_render_seconds", "Time to drain the inbox and render one frame"),
+    "subscribe": counter("city_subscription_changes_total", "Topics subscribed / unsubscribed")
+}
+gauge("city_inbox", "Messages waiting for the UI thread", lambda: len(inbox))
+gauge("city_subscribed_topics", "Topics subscribed", lambda: len(subscribed))
+gauge("city_tiles", "Tiles on the canvas", lambda: len(tiles))
+
+log = get_logger("city_dashboard")
+
+
+def setup(n):
+    """n intersections, one store row and two topics each"""
+    global store
+    store = LaneStore(capacity=max(n, 1))
+    for number in range(n):
+        intersection = intersection_id(number)
+        row = store.row(intersection)
+        city["topics"][summary_topic(intersection)] = (row, False)
+        city["topics"][decision_topic(intersection)] = (row, True)
+    city["n"] = n
+    city["phase"] = [None] * n
+    city["ends_at"] = np.full(n, np.nan)
+    city["updated"] = np.zeros(n)
+
+
+# =====================================================================
+# MESSAGES
+# =====================================================================
+
+def on_connect(client, userdata, flags, rc):
+    if rc == 0:
+        log.info("connected", "✓ Connected to MQTT broker")
+        # The UI thread subscribes (again) to what is on screen
+        view["reconnected"] = True
+    else:
+        log.error("connect_failed", f"✗ Connection failed: {rc}", rc=rc)
+
+
+def on_message(client, userdata, msg):
+    # Network thread: queue the raw payload, the UI thread does the rest
+    if len(inbox) == inbox.maxlen:
+        metric["overflow"].inc()
+    inbox.append((msg.topic, msg.payload, time.time()))
+    metric["received"].inc()
+
+
+def apply_message(client, topic, payload, received_at):
+    located = city["topics"].get(topic)
+    if located is None:
+        return
+    row, is_decision = located
+
+    # Delta mode: drop messages after a gap and ask for a keyframe
+    apply, resync = deltas.check(topic, payload)
+    if resync is not None:
+        client.publish(TOPIC_RESYNC, encode_for_client(client, TOPIC_RESYNC, resync), qos=1)
+    if not apply:
+        return
+
+    # Decisions carry the lane readings too; the green comes from them only
+    store.update_from_summary(row, payload)
+    if is_decision:
+        if "green_light" in payload:
+            store.green_group[row] = group_index(payload["green_light"])
+        if "green_duration" in payload:
+            store.green_duration[row] = payload["green_duration"]
+        if "phase" in payload:
+            city["phase"][row] = payload["phase"]
+        if "phase_remaining" in payload:
+            city["ends_at"][row] = received_at + payload["phase_remaining"]
+    city["updated"][row] = received_at
+    dirty.add(row)
+
+
+def ingest(client):
+    """Drain the inbox (at most DASHBOARD_DRAIN_BATCH messages); returns how many were handled"""
+    handled = 0
+    while inbox and handled < DASHBOARD_DRAIN_BATCH:
+        topic, raw, received_at = inbox.popleft()
+        handled += 1
+        try:
+            started = time.perf_counter()
+            payload = decode(raw)
+            metric["decode"].record(time.perf_counter() - started)
+            apply_message(client, topic, payload, received_at)
+        except Exception as e:
+            log.error("bad_message", f"Error parsing message: {e}", topic=topic, error=str(e))
+    return handled
+
+
+# =====================================================================
+# SUBSCRIPTIONS (VISIBLE INTERSECTIONS ONLY)
+# =====================================================================
+
+def wanted_rows():
+    """Rows on screen, CITY_SUBSCRIBE_MARGIN screens above and below, and the selected one"""
+    margin = CITY_SUBSCRIBE_MARGIN * view["rows"]
+    first = max(0, view["first_row"] - margin) * view["columns"]
+    last = min(city["n"], (view["first_row"] + view["rows"] + margin) * view["columns"])
+    rows = set(range(first, last))
+    if view["selected"] is not None:
+        rows.add(view["selected"])
+    return rows
+
+
+def update_subscriptions(client):
+    """Subscribe to the topics of wanted_rows(), unsubscribe from the others"""
+    wanted = set()
+    for row in wanted_rows():
+        intersection = store.ids[row]
+        wanted.add(summary_topic(intersection))
+        wanted.add(decision_topic(intersection))
+
+    added = sorted(wanted - subscribed)
+    removed = sorted(subscribed - wanted)
+    if removed:
+        client.unsubscribe(removed)
+    if added:
+        client.subscribe([(topic, 0) for topic in added])
+    subscribed.difference_update(removed)
+    subscribed.update(added)
+    metric["subscribe"].inc(len(added) + len(removed))
+    if added or removed:
+        log.debug("subscriptions", f"📡 +{len(added)} / -{len(removed)} topics ({len(subscribed)} subscribed)",
+                  added=len(added), removed=len(removed), subscribed=len(subscribed))
+
+
+# =====================================================================
+# TILES
+# =====================================================================
+
+def tile_size(zoom):
+    """(width, height) of a tile at a zoom level; detailed tiles get one line per lane"""
+    width = CITY_TILE_SIZES[zoom]
+    height = 46 + (N_LANES * LANE_LINE if width >= CITY_DETAIL_TILE_WIDTH else 0)
+    return width, height
+
+
+class Tile:
+    """Canvas items of one grid slot, bound to one intersection at a time"""
+
+    def __init__(self, canvas, x, y, width, height):
+        self.canvas = canvas
+        self.row = None
+        self.box = canvas.create_rectangle(x + 2, y + 2, x + width - 2, y + height - 2,
+                                           fill=TILE_BG, outline="#444444", width=1)
+        self.name = canvas.create_text(x + 7, y + 6, anchor="nw", text="", fill=TEXT, font=("Arial", 8, "bold"))
+        self.total = canvas.create_text(x + width - 7, y + 6, anchor="ne", text="", fill=TEXT, font=("Arial", 8))
+
+        # One light per phase group
+        spacing = min(16, (width - 14) / max(N_GROUPS, 1))
+        size = max(4, spacing - 4)
+        self.lights = [canvas.create_oval(x + 7 + group * spacing, y + 24, x + 7 + group * spacing + size, y + 24 + size,
+                                          fill=LIGHT_COLORS["off"][0], outline="")
+                       for group in range(N_GROUPS)]
+
+        # Detailed tiles: one line per lane
+        self.lanes = []
+        if width >= CITY_DETAIL_TILE_WIDTH:
+            self.lanes = [canvas.create_text(x + 7, y + 44 + lane * LANE_LINE, anchor="nw", text="", fill=TEXT,
+                                             font=("Arial", 8)) for lane in range(N_LANES)]
+        self.items = [self.box, self.name, self.total] + self.lights + self.lanes
+
+    def show(self, now):
+        """Render the bound intersection (or hide the tile past the last one)"""
+        row = self.row
+        canvas = self.canvas
+        if row is None:
+            for item in self.items:
+                render.item(canvas, item, state="hidden")
+            return
+
+        stale = now - city["updated"][row] > CITY_STALE_AFTER
+        emergency = bool(store.emergency[row])
+        render.item(canvas, self.box, state="normal", fill=TILE_STALE_BG if stale else TILE_BG,
+                    outline="#ff0000" if emergency else "#444444", width=3 if emergency else 1)
+        text = TEXT_STALE if stale else TEXT
+        render.item(canvas, self.name, state="normal", text=store.ids[row], fill=text)
+        render.item(canvas, self.total, state="normal", fill=text,
+                    text=f"🚗 {int(store.vehicle_count[row].sum())}" if city["updated"][row] else "…")
+
+        phase = city["phase"][row]
+        green = int(store.green_group[row])
+        for group, light in enumerate(self.lights):
+            if phase is None:
+                color = "off"
+            else:
+                color = PHASE_COLORS.get(phase, "red") if group == green else "red"
+            render.item(canvas, light, state="normal", fill=LIGHT_COLORS[color][0])
+
+        if self.lanes:
+            lit = GROUP_LANES[green] if phase in ("MIN_GREEN", "GREEN") and 0 <= green < N_GROUPS else ()
+            for lane, item in enumerate(self.lanes):
+                render.item(canvas, item, state="normal", fill=TEXT_STALE if stale else LANE_GREEN if lane in lit else LANE_RED,
+                            text=f"{LANES[lane]}: {store.get_count(row, lane)} {'●' if store.get_ir(row, lane) else '○'}")
+
+
+def layout(canvas):
+    """(Re)build the tile pool for the canvas size and zoom; returns True if it changed"""
+    width, height = tile_size(view["zoom"])
+    columns = max(1, canvas.winfo_width() // width)
+    rows = max(1, math.ceil(canvas.winfo_height() / height))
+    if (columns, rows, (width, height)) == (view["columns"], view["rows"], view["tile"]):
+        return False
+
+    # Keep the first intersection on screen in view
+    first = view["first_row"] * view["columns"] if view["columns"] else 0
+    canvas.delete("all")
+    render.forget(canvas)
+    tiles.clear()
+    for row in range(rows):
+        for column in range(columns):
+            tiles.append(Tile(canvas, column * width, row * height, width, height))
+    view["columns"], view["rows"], view["tile"] = columns, rows, (width, height)
+    scroll_to(first // columns)
+    return True
+
+
+def total_rows():
+    return math.ceil(city["n"] / max(view["columns"], 1))
+
+
+def scroll_to(first_row):
+    """Bind the tiles to the intersections from grid row `first_row` on"""
+    first_row = max(0, min(first_row, total_rows() - view["rows"]))
+    view["first_row"] = first_row
+    base = first_row * view["columns"]
+    for slot, tile in enumerate(tiles):
+        row = base + slot
+        tile.row = row if row < city["n"] else None
+    view["moved_at"] = time.monotonic()
+    ui["scrollbar"].set(first_row / max(total_rows(), 1),
+                        min(1.0, (first_row + view["rows"]) / max(total_rows(), 1)))
+    for tile in tiles:
+        tile.show(time.time())
+
+
+def on_scrollbar(*args):
+    """Scrollbar command: ("moveto", fraction) or ("scroll", n, "units" / "pages")"""
+    if args[0] == "moveto":
+        scroll_to(round(float(args[1]) * total_rows()))
+    elif args[0] == "scroll":
+        step = view["rows"] if args[2] == "pages" else 1
+        scroll_to(view["first_row"] + int(args[1]) * step)
+
+
+def on_wheel(event):
+    if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+        scroll_to(view["first_row"] - 2)
+    else:
+        scroll_to(view["first_row"] + 2)
+
+
+def on_zoom(step):
+    zoom = max(0, min(len(CITY_TILE_SIZES) - 1, view["zoom"] + step))
+    if zoom != view["zoom"]:
+        view["zoom"] = zoom
+        layout(ui["grid"])
+
+
+def on_click(event):
+    width, height = view["tile"]
+    column, row = int(event.x // width), int(event.y // height)
+    if column >= view["columns"] or row >= view["rows"]:
+        return
+    tile = tiles[row * view["columns"] + column]
+    if tile.row is not None:
+        view["selected"] = tile.row
+        view["moved_at"] = time.monotonic()     # subscribe to it even when it scrolls away
+
+
+# =====================================================================
+# DETAIL PANEL (SELECTED INTERSECTION)
+# =====================================================================
+
+ui = {}
+
+
+def build_ui(root):
+    root.title("🚦 Smart Traffic Control System - City")
+    root.geometry("1200x700")
+    root.configure(bg="#1e1e1e")
+
+    header = tk.Frame(root, bg="#2d2d2d", height=50)
+    header.pack(fill=tk.X)
+    header.pack_propagate(False)
+    tk.Label(header, text="🚦 CITY VIEW", font=("Arial", 16, "bold"), bg="#2d2d2d", fg="#00ff00").pack(
+        side=tk.LEFT, padx=20, pady=8)
+    ui["status"] = tk.Label(header, text="", font=("Arial", 9), bg="#2d2d2d", fg="#888888")
+    ui["status"].pack(side=tk.RIGHT, padx=20)
+
+    main = tk.Frame(root, bg="#1e1e1e")
+    main.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+    # Detail panel: a fixed set of labels, whatever N is
+    panel = tk.Frame(main, bg="#2d2d2d", relief=tk.RAISED, bd=2, width=300)
+    panel.pack(side=tk.RIGHT, fill=tk.Y, padx=(10, 0))
+    panel.pack_propagate(False)
+    ui["title"] = tk.Label(panel, text="Click an intersection", font=("Arial", 14, "bold"), bg="#2d2d2d", fg="#00ff00")
+    ui["title"].pack(pady=10)
+    for key in ("phase", "countdown", "green", "emergency", "updated"):
+        ui[key] = tk.Label(panel, text="", font=("Arial", 11), bg="#2d2d2d", fg="#ffffff", anchor="w")
+        ui[key].pack(fill=tk.X, padx=15, pady=3)
+    ui["lanes"] = []
+    for lane in range(N_LANES):
+        label = tk.Label(panel, text="", font=("Arial", 11, "bold"), bg="#1a1a2e", fg="#ffffff", anchor="w")
+        label.pack(fill=tk.X, padx=15, pady=2)
+        ui["lanes"].append(label)
+
+    grid_frame = tk.Frame(main, bg="#1e1e1e")
+    grid_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    ui["scrollbar"] = tk.Scrollbar(grid_frame, orient=tk.VERTICAL, command=on_scrollbar)
+    ui["scrollbar"].pack(side=tk.RIGHT, fill=tk.Y)
+    grid = ui["grid"] = tk.Canvas(grid_frame, bg="#1e1e1e", highlightthickness=0)
+    grid.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+    grid.bind("<Configure>", lambda event: layout(grid))
+    grid.bind("<Button-1>", on_click)
+    grid.bind("<MouseWheel>", on_wheel)
+    grid.bind("<Button-4>", on_wheel)
+    grid.bind("<Button-5>", on_wheel)
+    for key, step in (("<plus>", 1), ("<equal>", 1), ("<KP_Add>", 1), ("<minus>", -1), ("<KP_Subtract>", -1)):
+        root.bind(key, lambda event, step=step: on_zoom(step))
+    root.bind("<Prior>", lambda event: scroll_to(view["first_row"] - view["rows"]))
+    root.bind("<Next>", lambda event: scroll_to(view["first_row"] + view["rows"]))
+    root.bind("<Up>", lambda event: scroll_to(view["first_row"] - 1))
+    root.bind("<Down>", lambda event: scroll_to(view["first_row"] + 1))
+
+
+def show_detail(now):
+    row = view["selected"]
+    if row is None:
+        return
+    render.set(ui["title"], text=f"🚦 {store.ids[row]}")
+    if not city["updated"][row]:
+        render.set(ui["phase"], text="Waiting for data…")
+        return
+
+    phase = city["phase"][row]
+    green = group_name(int(store.green_group[row]))
+    remaining = max(0.0, city["ends_at"][row] - now) if not np.isnan(city["ends_at"][row]) else None
+    render.set(ui["phase"], text=f"Phase: {phase or '-'}")
+    render.set(ui["countdown"], text="" if remaining is None else f"⏱️  {remaining:.1f} s left")
+    render.set(ui["green"], text=f"✅ {green} ({int(store.green_duration[row])} s)")
+
+    if store.emergency[row]:
+        lane = int(store.emergency_lane[row])
+        render.set(ui["emergency"], text=f"🚨 {lane_name(lane)} → {group_name(int(group_of_lane(lane)))}",
+                   fg="#ff0000")
+    else:
+        render.set(ui["emergency"], text="✓ No emergency", fg="#00ff00")
+    render.set(ui["updated"], text=f"Updated {now - city['updated'][row]:.0f} s ago")
+
+    lit = GROUP_LANES[int(store.green_group[row])] if phase in ("MIN_GREEN", "GREEN") else ()
+    for lane, label in enumerate(ui["lanes"]):
+        render.set(label, fg="#00ff00" if lane in lit else "#ff6b6b",
+                   text=f"{LANES[lane]}: 🚗 {store.get_count(row, lane)}  IR {store.get_ir(row, lane)}  "
+                        f"{int(store.confidence[row, lane])}%")
+
+
+# =====================================================================
+# FRAME
+# =====================================================================
+
+frame_time = {"seconds": 0.0, "full_pass": 0.0}
+
+
+def update_frame(root, client):
+    """
+    Drain the inbox, re-render the tiles whose intersection changed (all of
+    them once a second, for staleness), the detail panel and the status line
+    """
+    started = time.perf_counter()
+    now = time.time()
+
+    if view["reconnected"]:
+        view["reconnected"] = False
+        subscribed.clear()
+        update_subscriptions(client)
+    elif view["moved_at"] is not None and time.monotonic() - view["moved_at"] >= CITY_SUBSCRIBE_DELAY:
+        view["moved_at"] = None
+        update_subscriptions(client)
+
+    ingest(client)
+    if now - frame_time["full_pass"] >= 1.0:
+        frame_time["full_pass"] = now
+        for tile in tiles:
+            tile.show(now)
+    elif dirty:
+        for tile in tiles:
+            if tile.row in dirty:
+                tile.show(now)
+    dirty.clear()
+    show_detail(now)
+
+    visible = sum(tile.row is not None for tile in tiles)
+    render.set(ui["status"], text=f"{city['n']} intersections · {visible} on screen · "
+                                  f"{len(subscribed) // 2} subscribed · {len(tiles)} tiles · "
+                                  f"frame {frame_time['seconds'] * 1000:.1f} ms, {render.frame_updates} updates")
+    render.flush()
+    frame_time["seconds"] = time.perf_counter() - started
+    metric["render"].record(frame_time["seconds"])
+
+    root.after(10 if inbox else 250, update_frame, root, client)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="City-wide dashboard")
+    parser.add_argument("--intersections", type=int, default=100,
+                        help="intersections I0000.. to show (as given to the sensors / gateway / cloud)")
+    parser.add_argument("--zoom", type=int, default=1, choices=range(len(CITY_TILE_SIZES)),
+                        help="initial tile size (index in CITY_TILE_SIZES)")
+    args = parser.parse_args()
+
+    setup(args.intersections)
+    view["zoom"] = args.zoom
+    start_metrics("city_dashboard")
+
+    client = mqtt.Client()
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(BROKER, PORT, 60)
+    client.loop_start()
+
+    root = tk.Tk()
+    build_ui(root)
+    root.update_idletasks()
+    layout(ui["grid"])
+    update_frame(root, client)
+
+    print(f"City dashboard started: {args.intersections} intersections")
+    print("  ✓ Scroll / PageUp / PageDown to move, + / - to zoom, click a tile for its detail")
+    try:
+        root.mainloop()
+    finally:
+        client.loop_stop()
+        client.disconnect()
+
+
+if __name__ == "__main__":
+    main()
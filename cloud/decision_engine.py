@@ -0,0 +1,99 @@
+# decision_engine.py - VECTORIZED DECISIONS FOR MANY INTERSECTIONS
+
+"""
+Batch form of the cloud decision rules (traffic_logic.py)
+
+Every function takes plain arrays for N intersections and returns arrays,
+with no store, no globals and no per-intersection Python. The "lanes" axis
+is whatever the caller decides between: traffic_logic.py passes phase-group
+columns (intersection.py: group_counts / group_ir, emergency lane -> group),
+which are the lane columns with the default one-group-per-lane layout.
+
+    counts          (N, lanes) vehicle counts
+    ir              (N, lanes) IR flags 0 / 1
+    emergency       (N,)       0 / 1
+    emergency_lane  (N,)       lane index or NO_LANE
+    confidence      (N, lanes) fraction 0.5-1.0 (optional: derived from ir / counts
+                               with scoring.py, as the scalar rules do)
+
+Results are bit-identical to the scalar functions in traffic_logic.py
+(decide_green_light, calculate_green_duration, next_green): same float64
+arithmetic, same truncation, same tie-breaks. benchmarks/decision_engine_bench.py
+checks that on random inputs and times both paths.
+
+    lanes, durations = decide(counts, ir, emergency, emergency_lane)
+"""
+
+import numpy as np
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import GREEN_MIN, GREEN_MAX
+from lane_store import NO_LANE
+from scoring import confidence_scores
+
+
+def _has_emergency(emergency, emergency_lane):
+    return (np.asarray(emergency) == 1) & (np.asarray(emergency_lane) != NO_LANE)
+
+
+def green_lanes(counts, emergency, emergency_lane):
+    """Green lane of every intersection (decide_green_light): emergency lane, else most vehicles"""
+    counts = np.asarray(counts)
+    # argmax keeps the first lane on ties, like the scalar rule
+    green = np.argmax(counts, axis=1)
+    return np.where(_has_emergency(emergency, emergency_lane), emergency_lane, green).astype(np.intp)
+
+
+def green_durations(lane, counts, ir, emergency, emergency_lane, confidence=None):
+    """Green duration (seconds) of `lane` at every intersection (calculate_green_duration)"""
+    counts = np.asarray(counts).astype(np.int64)
+    ir = np.asarray(ir)
+    lane = np.asarray(lane).astype(np.intp)
+    rows = np.arange(len(counts))
+    if confidence is None:
+        confidence = confidence_scores(ir, counts)
+
+    current_count = counts[rows, lane]
+    lane_ir = ir[rows, lane]
+    lane_confidence = np.asarray(confidence)[rows, lane]
+
+    # IR detected vehicle but count is 0 -> assume at least 1 vehicle
+    current_count = np.where((lane_ir == 1) & (current_count == 0), 1, current_count)
+
+    total_vehicles = counts.sum(axis=1)
+    congestion_ratio = current_count / np.maximum(total_vehicles, 1)
+
+    base_duration = GREEN_MIN + (congestion_ratio * (GREEN_MAX - GREEN_MIN)).astype(np.int64)
+    adjusted_duration = np.clip((base_duration * lane_confidence).astype(np.int64), GREEN_MIN, GREEN_MAX)
+
+    duration = np.where(total_vehicles == 0, GREEN_MIN, adjusted_duration)
+    emergency_here = (np.asarray(emergency) == 1) & (np.asarray(emergency_lane) == lane)
+    return np.where(emergency_here, GREEN_MAX, duration).astype(np.int64)
+
+
+def next_lanes(current, counts, ir, emergency, emergency_lane):
+    """
+    Lane to serve after `current`'s green (next_green): the emergency lane,
+    else the waiting lane (vehicles or IR) with most vehicles, else `current`
+    itself; current = NO_LANE at start-up
+    """
+    counts = np.asarray(counts)
+    current = np.asarray(current).astype(np.intp)
+    rows = np.arange(len(counts))
+
+    waiting = (counts > 0) | (np.asarray(ir) == 1)
+    has_current = current != NO_LANE
+    waiting[rows[has_current], current[has_current]] = False
+
+    best = np.argmax(np.where(waiting, counts, -1), axis=1)
+    keep = np.where(has_current, current, 0)
+    lanes = np.where(waiting.any(axis=1), best, keep)
+    return np.where(_has_emergency(emergency, emergency_lane), emergency_lane, lanes).astype(np.intp)
+
+
+def decide(counts, ir, emergency, emergency_lane, confidence=None):
+    """(green lanes, green durations) of every intersection"""
+    lanes = green_lanes(counts, emergency, emergency_lane)
+    return lanes, green_durations(lanes, counts, ir, emergency, emergency_lane, confidence)
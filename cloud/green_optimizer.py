@@ -0,0 +1,215 @@
+# green_optimizer.py - PREDICTIVE GREEN TIMES FROM ARRIVAL-RATE ESTIMATES
+
+"""
+Optional green-time strategy of the cloud logic (GREEN_TIME_STRATEGY = "predictive")
+
+The heuristic (calculate_green_duration) only looks at the counts of the
+moment. This one also keeps, for every lane of every intersection, an
+estimate of its arrival rate (vehicles/s), updated from each new ultrasonic
+count in O(1):
+
+    arrivals ~ count - previous count + vehicles served in between
+    served   ~ min(previous count, SATURATION_FLOW * dt) if the lane had green
+
+smoothed by an EWMA (time constant ARRIVAL_EWMA_TAU, for uneven intervals)
+or a scalar Kalman filter per lane (random-walk rate, ARRIVAL_KALMAN_Q /
+ARRIVAL_KALMAN_R), ARRIVAL_ESTIMATOR picks which.
+
+At the end of ALL_RED the green of the lane about to get it is chosen among
+GREEN_MIN..GREEN_MAX to minimize the predicted queue delay over the next
+cycle, per second of cycle (so short and long cycles compare fairly):
+
+    lane green G -> lost time -> other lanes green (time to clear them) -> lost time
+
+with fluid queues (arrivals at the estimated rates, departures at
+SATURATION_FLOW). Every candidate of every intersection is one array
+operation, no per-intersection Python. Emergencies keep GREEN_MAX, and an IR
+detection with a count of 0 counts as 1 vehicle, as in the heuristic.
+
+Lanes here are the columns the cloud decides between: phase groups
+(intersection.py), one per lane with the default layout.
+
+    optimizer = GreenOptimizer(n_lanes)
+    optimizer.observe(row, now, counts, serving_lane)       # every summary
+    durations = optimizer.green_times(rows, lane, counts, ir, emergency, emergency_lane)
+"""
+
+import math
+import sys
+import os
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import (GREEN_MIN, GREEN_MAX, YELLOW_TIME, ALL_RED_TIME, ARRIVAL_ESTIMATOR,
+                    ARRIVAL_EWMA_TAU, ARRIVAL_KALMAN_Q, ARRIVAL_KALMAN_R, SATURATION_FLOW)
+from lane_store import NO_LANE
+
+ESTIMATORS = ("ewma", "kalman")
+CANDIDATES = np.arange(GREEN_MIN, GREEN_MAX + 1, dtype=np.float64)
+
+
+# =====================================================================
+# QUEUE MODEL
+# =====================================================================
+
+def _served(queue, net, seconds):
+    """
+    Fluid queue served for `seconds` at `net` = saturation flow - arrival rate:
+    (vehicle-seconds of waiting, queue left)
+    """
+    clear = np.where(net > 0, queue / np.where(net > 0, net, 1.0), np.inf)
+    busy = np.minimum(seconds, clear)
+    return queue * busy - net * busy * busy / 2, np.maximum(queue - net * seconds, 0.0)
+
+
+def _waiting(queue, rate, seconds):
+    """Queue that only grows for `seconds`: (vehicle-seconds of waiting, queue after)"""
+    return queue * seconds + rate * seconds * seconds / 2, queue + rate * seconds
+
+
+def cycle_delays(queue, rate, others, others_rate, green, saturation=SATURATION_FLOW,
+                 lost=YELLOW_TIME + ALL_RED_TIME):
+    """
+    Predicted queue delay per second of the next cycle if the lane gets `green` seconds
+
+    queue / rate               lane about to get green (vehicles, vehicles/s)
+    others / others_rate       every other lane together
+    Shapes broadcast: (N, 1) per intersection against (K,) candidates gives (N, K).
+    """
+    # Lane green, the others wait
+    delay, queue = _served(queue, saturation - rate, green)
+    waited, others = _waiting(others, others_rate, green)
+    delay = delay + waited
+
+    # Lost time (yellow + all red): everybody waits
+    waited, queue = _waiting(queue, rate, lost)
+    delay = delay + waited
+    waited, others = _waiting(others, others_rate, lost)
+    delay = delay + waited
+
+    # The others get green for as long as it takes to clear them (GREEN_MIN..GREEN_MAX)
+    net = saturation - others_rate
+    other_green = np.clip(np.where(net > 0, others / np.where(net > 0, net, 1.0), GREEN_MAX),
+                          GREEN_MIN, GREEN_MAX)
+    served, others = _served(others, net, other_green)
+    waited, queue = _waiting(queue, rate, other_green)
+    delay = delay + served + waited
+
+    # Lost time back to the lane
+    delay = delay + _waiting(queue, rate, lost)[0] + _waiting(others, others_rate, lost)[0]
+    return delay / (green + other_green + 2 * lost)
+
+
+def optimal_greens(lane, queues, rates, emergency, emergency_lane, saturation=SATURATION_FLOW):
+    """
+    Green (whole seconds, GREEN_MIN..GREEN_MAX) of `lane` at every intersection
+    that minimizes cycle_delays(); the shortest one on ties
+
+    queues (N, lanes) vehicles, rates (N, lanes) vehicles/s, lane / emergency / emergency_lane (N,)
+    """
+    queues = np.asarray(queues, dtype=np.float64)
+    rates = np.asarray(rates, dtype=np.float64)
+    lane = np.asarray(lane).astype(np.intp)
+    rows = np.arange(len(queues))
+
+    queue = queues[rows, lane][:, None]
+    rate = rates[rows, lane][:, None]
+    others = queues.sum(axis=1)[:, None] - queue
+    others_rate = rates.sum(axis=1)[:, None] - rate
+
+    delays = cycle_delays(queue, rate, others, others_rate, CANDIDATES, saturation)
+    durations = CANDIDATES[np.argmin(delays, axis=1)].astype(np.int64)
+
+    emergency_here = (np.asarray(emergency) == 1) & (np.asarray(emergency_lane) == lane)
+    return np.where(emergency_here, GREEN_MAX, durations)
+
+
+# =====================================================================
+# ARRIVAL RATES
+# =====================================================================
+
+class GreenOptimizer:
+    """Arrival-rate estimate of every lane of every row, and the green times they give"""
+
+    def __init__(self, n_lanes, estimator=ARRIVAL_ESTIMATOR, saturation=SATURATION_FLOW, capacity=64):
+        if estimator not in ESTIMATORS:
+            raise ValueError(f"Unknown arrival estimator {estimator!r} (expected one of {ESTIMATORS})")
+        self.n_lanes = n_lanes
+        self.estimator = estimator
+        self.saturation = saturation
+        self.capacity = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        """(Re)allocate the per-row arrays with room for `capacity` rows, like LaneStore"""
+        for name, fill, per_lane in (("rate", 0.0, True), ("variance", 0.0, True),
+                                     ("last_count", 0.0, True), ("last_time", np.nan, False)):
+            shape = (capacity, self.n_lanes) if per_lane else (capacity,)
+            array = np.full(shape, fill)
+            if self.capacity:
+                array[:self.capacity] = getattr(self, name)
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def observe(self, row, now, counts, serving=NO_LANE):
+        """
+        New counts of a row at time `now` (seconds); `serving` = lane that had
+        green since the previous counts. O(1): only this row's lanes are touched.
+        """
+        if row >= self.capacity:
+            self._allocate(max(row + 1, self.capacity * 2))
+        last = self.last_time[row]
+        if math.isnan(last):
+            # First counts: nothing to compare with yet
+            self.last_count[row] = counts
+            self.last_time[row] = now
+            return
+        dt = now - last
+        if dt <= 0:
+            # Same or older reading (heartbeat, reordering): no new information
+            return
+
+        # A handful of lanes: plain floats beat array operations on one row
+        rate = self.rate[row].tolist()
+        variance = self.variance[row].tolist()
+        previous = self.last_count[row].tolist()
+        kalman = self.estimator == "kalman"
+        alpha = 1 - math.exp(-dt / ARRIVAL_EWMA_TAU)
+        noise = ARRIVAL_KALMAN_R / dt
+        for lane in range(self.n_lanes):
+            arrivals = counts[lane] - previous[lane]
+            if lane == serving:
+                arrivals += min(previous[lane], self.saturation * dt)
+            sample = max(arrivals, 0.0) / dt
+
+            if not kalman:
+                rate[lane] += alpha * (sample - rate[lane])
+            elif variance[lane] == 0.0:
+                # First sample: take it as it is
+                rate[lane] = sample
+                variance[lane] = noise
+            else:
+                prior = variance[lane] + ARRIVAL_KALMAN_Q * dt
+                gain = prior / (prior + noise)
+                rate[lane] += gain * (sample - rate[lane])
+                variance[lane] = (1 - gain) * prior
+
+        self.rate[row] = rate
+        self.variance[row] = variance
+        self.last_count[row] = counts
+        self.last_time[row] = now
+
+    def rates(self, rows):
+        """(len(rows), lanes) arrival rates in vehicles/s (0 for rows never observed)"""
+        rows = np.asarray(rows, dtype=np.intp)
+        rates = np.zeros((len(rows), self.n_lanes))
+        known = rows < self.capacity
+        rates[known] = self.rate[rows[known]]
+        return rates
+
+    def green_times(self, rows, lane, counts, ir, emergency, emergency_lane):
+        """Green (seconds) of `lane` at each of `rows`, from their counts and arrival rates"""
+        # IR detected vehicle but count is 0 -> assume at least 1 vehicle
+        queues = np.maximum(np.asarray(counts), np.asarray(ir))
+        return optimal_greens(lane, queues, self.rates(rows), emergency, emergency_lane, self.saturation)
@@ -0,0 +1,292 @@
+# signal_controller.py - SIGNAL PHASES ON A TIMER WHEEL
+
+"""
+Signal-phase state machine for every intersection (cloud logic)
+
+Each intersection cycles through
+
+    MIN_GREEN  a phase group has green, held for GREEN_MIN (only an emergency cuts it short)
+    GREEN      rest of the green decided at the start of MIN_GREEN
+    YELLOW     YELLOW_TIME, the group's lanes are being cleared
+    ALL_RED    ALL_RED_TIME, every lane red, then MIN_GREEN of the next group
+
+Green goes to phase groups (conflict-free sets of lanes, intersection.py);
+with the default layout every lane is its own group.
+
+Decisions are only taken at phase boundaries, in one batch call for every
+intersection that reaches the same boundary on the same tick:
+- end of GREEN: next_groups(rows, current) picks the group to serve next; if
+  it is the current group (nobody else waiting) the green is extended by
+  GREEN_MIN instead of cycling, otherwise the group goes to YELLOW
+- end of ALL_RED: the next group gets green for green_times(rows) seconds
+- emergency (preempt()): green of a group without the emergency lane goes to
+  YELLOW at once (even during MIN_GREEN), YELLOW / ALL_RED are never skipped,
+  and the next green is the group serving the emergency lane; green of that
+  group is kept going
+
+Every phase end is one entry on a single TimerWheel on the monotonic clock,
+so thousands of intersections share one scheduler: advance() pops the
+timers that are due, nothing runs per intersection in between.
+
+The green group / duration of the current decision stay in the LaneStore
+columns (green_group, green_duration), so decision messages are built as
+before; during ALL_RED green_group is the group that gets green next.
+"""
+
+import math
+import sys
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import GREEN_MIN, YELLOW_TIME, ALL_RED_TIME, CONTROLLER_TICK
+from intersection import NO_LANE, group_of_lane
+
+MIN_GREEN = 0
+GREEN = 1
+YELLOW = 2
+ALL_RED = 3
+PHASES = ("MIN_GREEN", "GREEN", "YELLOW", "ALL_RED")
+
+
+# =====================================================================
+# TIMER WHEEL
+# =====================================================================
+
+class TimerWheel:
+    """
+    Hashed timing wheel: `slots` buckets of `tick` seconds each
+
+    A timer lands in the bucket of its deadline tick (modulo the wheel size),
+    so schedule() is O(1) and advance() only looks at the buckets of the ticks
+    that went by. Timers further out than one turn just stay in their bucket
+    until their own tick comes round. There is no cancel(): owners keep a
+    generation number in the item and ignore stale timers.
+    """
+
+    def __init__(self, tick=CONTROLLER_TICK, slots=512, now=0.0):
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.current = int(now // tick)     # last tick already processed
+        self.pending = 0
+
+    def __len__(self):
+        return self.pending
+
+    def schedule(self, deadline, item):
+        """Fire `item` at the first tick at or after `deadline` (and never in the past)"""
+        tick = max(math.ceil(deadline / self.tick), self.current + 1)
+        self.slots[tick % len(self.slots)].append((tick, item))
+        self.pending += 1
+
+    def advance(self, now):
+        """Items of every timer due by `now`, in deadline order"""
+        target = int(now // self.tick)
+        if target <= self.current:
+            return []
+
+        due = []
+        if target - self.current >= len(self.slots):
+            # Behind by a whole turn or more: every bucket is due at least once
+            for slot in self.slots:
+                self._collect(slot, target, due)
+            due.sort(key=lambda entry: entry[0])
+        else:
+            for tick in range(self.current + 1, target + 1):
+                slot = self.slots[tick % len(self.slots)]
+                if slot:
+                    self._collect(slot, target, due)
+        self.current = target
+        self.pending -= len(due)
+        return [item for _, item in due]
+
+    @staticmethod
+    def _collect(slot, target, due):
+        keep = []
+        for entry in slot:
+            (due if entry[0] <= target else keep).append(entry)
+        slot[:] = keep
+
+
+# =====================================================================
+# PHASE CONTROLLER
+# =====================================================================
+
+class SignalController:
+    """
+    Phases of every row of a LaneStore
+
+        controller = SignalController(store, next_groups, green_times)
+        changed = controller.advance()      # rows whose phase changed
+
+    next_groups(rows, current) -> phase group to serve after `current` (NO_LANE at start-up)
+    green_times(rows)          -> seconds of green for store.green_group[rows]
+
+    Both take / return arrays (decision_engine.py), one call per boundary per tick.
+
+    Rows are picked up by advance() as they appear in the store, starting
+    with ALL_RED. advance() must be called from one thread; preempt() may be
+    called from any (the MQTT network thread).
+    """
+
+    def __init__(self, store, next_groups, green_times, clock=time.monotonic, tick=CONTROLLER_TICK):
+        self.store = store
+        self.next_groups = next_groups
+        self.green_times = green_times
+        self.clock = clock
+        self.wheel = TimerWheel(tick, now=clock())
+
+        # Per row
+        self.phase = []
+        self.phase_end = []     # monotonic time the current phase ends
+        self.green_end = []     # monotonic time the current green ends (MIN_GREEN / GREEN)
+        self.upcoming = []      # group that gets green after YELLOW / ALL_RED (NO_LANE = decide then)
+        self.generation = []    # bumped on every phase change: older timers are stale
+        self.cycle = []         # greens started so far
+
+        self._preempt = deque()
+
+    def __len__(self):
+        return len(self.phase)
+
+    # ===== PUBLIC =====
+
+    def preempt(self, row):
+        """Emergency reported at `row`: handled on the next advance()"""
+        self._preempt.append(row)
+
+    def advance(self, now=None):
+        """Run every phase change due by `now`; returns the rows that changed, sorted"""
+        now = self.clock() if now is None else now
+        changed = set()
+
+        # New intersections start all-red (safe start-up)
+        for row in range(len(self.phase), len(self.store)):
+            self.phase.append(ALL_RED)
+            self.phase_end.append(now)
+            self.green_end.append(now)
+            self.upcoming.append(NO_LANE)
+            self.generation.append(0)
+            self.cycle.append(0)
+            self._enter(row, ALL_RED, now, ALL_RED_TIME)
+            changed.add(row)
+
+        while self._preempt:
+            row = self._preempt.popleft()
+            if row < len(self.phase) and self._handle_emergency(row, now):
+                changed.add(row)
+
+        due = [row for row, generation in self.wheel.advance(now) if generation == self.generation[row]]
+        if due:
+            self._phases_over(due, now)
+            changed.update(due)
+        return sorted(changed)
+
+    def serving(self, row):
+        """Group that has green at `row` (NO_LANE during YELLOW / ALL_RED, or before the row is picked up)"""
+        if row >= len(self.phase) or self.phase[row] not in (MIN_GREEN, GREEN):
+            return NO_LANE
+        return int(self.store.green_group[row])
+
+    def phase_name(self, row):
+        return PHASES[self.phase[row]]
+
+    def remaining(self, row, now=None):
+        """Seconds until the green ends (MIN_GREEN / GREEN) or the phase ends (YELLOW / ALL_RED)"""
+        now = self.clock() if now is None else now
+        phase = self.phase[row]
+        end = self.green_end[row] if phase in (MIN_GREEN, GREEN) else self.phase_end[row]
+        return max(0.0, end - now)
+
+    # ===== TRANSITIONS =====
+
+    def _enter(self, row, phase, now, duration):
+        self.phase[row] = phase
+        self.phase_end[row] = now + duration
+        self.generation[row] += 1
+        self.wheel.schedule(now + duration, (row, self.generation[row]))
+
+    def _phases_over(self, rows, now):
+        """Phase ends of every row due on this tick; decisions in one batch per boundary"""
+        store = self.store
+        green_over = []
+        all_red_over = []
+
+        for row in rows:
+            phase = self.phase[row]
+            if phase == MIN_GREEN:
+                self._enter(row, GREEN, now, max(0.0, self.green_end[row] - now))
+            elif phase == GREEN:
+                green_over.append(row)
+            elif phase == YELLOW:
+                store.green_group[row] = self.upcoming[row]
+                self._enter(row, ALL_RED, now, ALL_RED_TIME)
+            else:
+                all_red_over.append(row)
+
+        if green_over:
+            current = store.green_group[green_over].astype(np.intp)
+            upcoming = self.next_groups(np.array(green_over), current)
+            for row, group, next_group in zip(green_over, current.tolist(), upcoming.tolist()):
+                if next_group == group:
+                    # Nobody else waiting: keep the green, look again after GREEN_MIN
+                    self.green_end[row] = now + GREEN_MIN
+                    self._enter(row, GREEN, now, GREEN_MIN)
+                else:
+                    self.upcoming[row] = next_group
+                    self._enter(row, YELLOW, now, YELLOW_TIME)
+
+        if all_red_over:
+            start_up = [row for row in all_red_over if self.upcoming[row] == NO_LANE]
+            if start_up:
+                # No group had green yet
+                first = self.next_groups(np.array(start_up), np.full(len(start_up), NO_LANE))
+                for row, group in zip(start_up, first.tolist()):
+                    self.upcoming[row] = group
+            self._start_greens(all_red_over, now)
+
+    def _start_greens(self, rows, now):
+        """Decision at the end of ALL_RED: green for the upcoming group of every row"""
+        store = self.store
+        for row in rows:
+            store.green_group[row] = self.upcoming[row]
+            self.upcoming[row] = NO_LANE
+        durations = self.green_times(np.array(rows))
+        store.green_duration[rows] = durations
+
+        for row, duration in zip(rows, store.green_duration[rows].tolist()):
+            self.green_end[row] = now + duration
+            self.cycle[row] += 1
+            self._enter(row, MIN_GREEN, now, min(GREEN_MIN, duration))
+
+    def _handle_emergency(self, row, now):
+        store = self.store
+        # Group serving the emergency lane
+        group = int(group_of_lane(store.emergency_lane[row]))
+        if store.emergency[row] != 1 or group == NO_LANE:
+            return False
+
+        phase = self.phase[row]
+        if phase in (MIN_GREEN, GREEN):
+            if int(store.green_group[row]) == group:
+                # Emergency lane already green: keep it green while the vehicle is reported
+                if self.green_end[row] >= now + GREEN_MIN:
+                    return False
+                self.green_end[row] = now + GREEN_MIN
+                if phase == GREEN:
+                    self._enter(row, GREEN, now, GREEN_MIN)
+                return True
+            self.upcoming[row] = group
+            self._enter(row, YELLOW, now, YELLOW_TIME)
+            return True
+
+        # YELLOW / ALL_RED: the emergency lane's group is served next
+        if self.upcoming[row] == group:
+            return False
+        self.upcoming[row] = group
+        if phase == ALL_RED:
+            store.green_group[row] = group
+        return True
@@ -1,130 +1,306 @@
 # traffic_logic.py - UPDATED WITH IR INTEGRATION
 
-import json
+"""
+Cloud traffic logic - one stage of the pipeline:
+
+    gateway summaries (traffic/summary[/<id>])
+        -> on_message (queue) -> ingest() -> decide -> publish_decisions()
+        -> decisions (traffic/decision[/<id>])
+
+The cloud never subscribes to the decision topics, so it never re-reads its
+own output; the dashboard merges both streams.
+
+Keeps the latest gateway summary of every intersection in a LaneStore and
+runs a signal-phase controller for each one (signal_controller.py): green,
+yellow and all-red phases with a min-green hold, decided at phase boundaries
+(next_green() / calculate_green_duration()) and preempted by emergencies.
+Green goes to the phase groups of the intersection model (intersection.py);
+readings and decisions carry one array entry per lane.
+The loop ticks every CONTROLLER_TICK: intersections whose phase changed are
+published at once, every intersection again every PUBLISH_INTERVAL.
+
+decide_green_light() / calculate_green_duration() / next_green() work on one
+intersection; their batch forms (decision_engine.py) do every intersection at
+once on whole columns and give bit-identical results. The controller decides
+with the batch forms; the legacy intersection stays on the scalar path.
+
+Batched intake and publishing: the MQTT network thread only queues raw
+payloads; each tick the loop drains the queue (decode + load into the store),
+advances the controller and publishes the decisions of that tick in one pass.
+
+Many intersections: --workers N partitions intersections across N processes
+by consistent hashing (sharding.py, shared with the gateway shards). Each worker
+owns its partition's store and controller and drops summaries of the others.
+
+Green times (GREEN_TIME_STRATEGY, or --green-time): "heuristic" is
+calculate_green_duration(); "predictive" keeps per-lane arrival-rate estimates
+from every summary and picks the green that minimizes the predicted queue
+delay of the next cycle (green_optimizer.py).
+
+Delta mode (SUMMARY_DELTA_MODE): incoming deltas are applied field by field
+after a sequence check (gaps trigger a resync request), and decisions are
+published as deltas too.
+"""
+
+import argparse
+import threading
 import time
+import numpy as np
 import paho.mqtt.client as mqtt
 import sys
 import os
+from collections import deque
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from config import BROKER, PORT, TOPIC_SUMMARY, PUBLISH_INTERVAL, GREEN_MIN, GREEN_MAX
-
-# Store latest summary
-latest_summary = {
-    "lane1_vehicles": 0,
-    "lane1_ir": 0,  # IR data
-    "lane2_vehicles": 0,
-    "lane2_ir": 0,  #  IR data
-    "emergency": 0,
-    "emergency_lane": None,
-    "green_light": "Lane 1",
-    "green_duration": GREEN_MIN
+from cloud import decision_engine
+from cloud.green_optimizer import GreenOptimizer
+from cloud.signal_controller import SignalController
+from config import (BROKER, PORT, TOPIC_SUMMARY, TOPIC_SUMMARY_PREFIX, PUBLISH_INTERVAL,
+                    GREEN_MIN, GREEN_MAX, LEGACY_INTERSECTION, SUMMARY_DELTA_MODE, TOPIC_RESYNC,
+                    CONTROLLER_TICK, YELLOW_TIME, ALL_RED_TIME, GREEN_TIME_STRATEGY, ARRIVAL_ESTIMATOR,
+                    CLOUD_INBOX_SIZE)
+from delta import DeltaPublisher, DeltaTracker
+from intersection import GROUPS, LANES, N_GROUPS, group_counts, group_ir, group_name, group_of_lane
+from lane_store import LaneStore, NO_LANE, lane_index, lane_name
+from metrics import counter, gauge, histogram, start_metrics
+from scoring import confidence_scores
+from sharding import Shard, run_workers, subscribe_in_chunks
+from structured_log import get_logger
+from topics import decision_topic, parse_summary_topic, summary_topic
+from wire_format import decode, encode_for_client
+
+# Store latest summary of every intersection
+store = LaneStore()
+LEGACY_ROW = store.row(LEGACY_INTERSECTION)
+store.set_decision(LEGACY_ROW, GROUPS[0], GREEN_MIN)
+
+# Delta mode: sequence tracking of received summaries, encoder for decisions
+received = DeltaTracker()
+decisions = DeltaPublisher("cloud") if SUMMARY_DELTA_MODE else None
+
+# Worker partition (--workers): which intersections this process decides (sharding.py)
+shard = Shard()
+
+# Green time strategy: "heuristic" or "predictive" (arrival rates in the optimizer)
+GREEN_TIME_STRATEGIES = ("heuristic", "predictive")
+green_time = {
+    "strategy": "heuristic",
+    "optimizer": None
 }
 
+# Raw (topic, payload) from the network thread, drained by ingest() every tick
+inbox = deque(maxlen=CLOUD_INBOX_SIZE)
+subacks = set()     # SUBSCRIBE message ids not acknowledged yet
+
+# Metrics (metrics.py)
+metric = {
+    "summaries": counter("cloud_summaries_received_total", "Gateway summaries ingested"),
+    "dropped": counter("cloud_summaries_dropped_total", "Delta summaries dropped after a sequence gap"),
+    "foreign": counter("cloud_summaries_foreign_total", "Summaries of intersections owned by another worker"),
+    "overflow": counter("cloud_inbox_dropped_total", "Summaries dropped because the inbox was full"),
+    "bad": counter("cloud_bad_messages_total", "Payloads that could not be decoded or applied"),
+    "batches": counter("cloud_ingest_batches_total", "Ticks that ingested at least one summary"),
+    "published": counter("cloud_decisions_published_total", "Decisions published"),
+    "on_message": histogram("cloud_on_message_seconds", "Time to ingest one summary"),
+    "decode": histogram("cloud_decode_seconds", "Time to decode one summary payload"),
+    "decide": histogram("cloud_decide_seconds", "Time to advance every intersection's phases once"),
+    "phase_changes": counter("cloud_phase_changes_total", "Signal phase changes (all intersections)"),
+    "publish": histogram("cloud_publish_seconds", "Time to encode and publish one decision")
+}
+gauge("cloud_intersections", "Intersections known to the cloud logic", lambda: len(store))
+gauge("cloud_inbox", "Summaries waiting to be ingested", lambda: len(inbox))
+
+log = get_logger("cloud")
+
+# Cold start: the first summary carrying sensor data ends the first wait;
+# the first decision made on it is logged as "first_decision"
+first_summary = threading.Event()
+first_decision = threading.Event()
+
 
 def on_connect(client, userdata, flags, rc):
-    print("✅ Connected to MQTT broker (Cloud logic)")
-    client.subscribe(TOPIC_SUMMARY)
+    log.info("connected", "✅ Connected to MQTT broker (Cloud logic)")
+    if shard.intersections is None:
+        subscriptions = [(TOPIC_SUMMARY, 0), (f"{TOPIC_SUMMARY_PREFIX}/+", 0)]
+    else:
+        subscriptions = [(summary_topic(intersection), 0) for intersection in shard.owned()]
+    subscriptions.append((TOPIC_RESYNC, 1))
+
+    # Ready once every SUBSCRIBE is acknowledged
+    subacks.update(subscribe_in_chunks(client, subscriptions))
+
+
+def on_subscribe(client, userdata, mid, granted_qos):
+    subacks.discard(mid)
+    if not subacks:
+        log.info("ready", "✅ Cloud logic ready")
 
 
 def on_message(client, userdata, msg):
-    global latest_summary
-    payload = json.loads(msg.payload.decode())
-    latest_summary.update(payload)
+    """Network thread: queue summaries of this worker's intersections (and resync requests)"""
+    if msg.topic != TOPIC_RESYNC:
+        summary_of = parse_summary_topic(msg.topic)
+        if summary_of is None:
+            return
+        if not shard.owns(summary_of):
+            metric["foreign"].inc()
+            return
+    if len(inbox) == inbox.maxlen:
+        metric["overflow"].inc()
+    inbox.append((msg.topic, msg.payload))
+
+
+def ingest_one(client, topic, raw):
+    """One queued message; returns True if a summary was loaded into the store"""
+    started = time.perf_counter()
+    payload = decode(raw)
+    metric["decode"].record(time.perf_counter() - started)
+
+    if topic == TOPIC_RESYNC:
+        if decisions is not None:
+            decisions.handle_resync(payload)
+        return False
+
+    apply, resync = received.check(topic, payload)
+    if resync is not None:
+        client.publish(TOPIC_RESYNC, encode_for_client(client, TOPIC_RESYNC, resync), qos=1)
+    if not apply:
+        metric["dropped"].inc()
+        return False
+
+    # Deltas only carry "intersection" when it changed: the topic names it
+    row = store.row(payload.get("intersection") or parse_summary_topic(topic))
+    store.update_from_summary(row, payload)
+    if green_time["optimizer"] is not None:
+        reading_time = store.sensor_ts[row]
+        green_time["optimizer"].observe(row, time.time() if np.isnan(reading_time) else reading_time,
+                                        group_counts(store.vehicle_count[row]).tolist(), controller.serving(row))
+    metric["on_message"].record(time.perf_counter() - started)
+    if payload.get("sensor_ts") is not None:
+        first_summary.set()
 
     if payload.get("emergency") == 1:
-        print(f"🚨 EMERGENCY ALERT: {payload.get('emergency_lane')} has emergency vehicle!")
+        controller.preempt(row)
+    if payload.get("emergency") == 1 and row == LEGACY_ROW:
+        log.warning("emergency", f"🚨 EMERGENCY ALERT: {payload.get('emergency_lane')} has emergency vehicle!",
+                    key=f"emergency:{store.ids[row]}", intersection=store.ids[row],
+                    lane=payload.get("emergency_lane"))
+    return True
+
+
+def ingest(client):
+    """Ingest stage: load every queued summary into the store; returns how many were loaded"""
+    loaded = 0
+    while inbox:
+        topic, raw = inbox.popleft()
+        try:
+            loaded += ingest_one(client, topic, raw)
+        except Exception as e:
+            # A malformed payload (or one for another lane layout) is skipped, not fatal
+            metric["bad"].inc()
+            log.error("bad_message", f"Error ingesting message: {e}", key=topic, topic=topic, error=str(e))
+
+    if loaded:
+        metric["summaries"].inc(loaded)
+        metric["batches"].inc()
+    return loaded
 
 
 # NEW: Calculate confidence score
-def calculate_confidence_score(lane_name):
+def calculate_confidence_score(lane_name, row=LEGACY_ROW):
     """
     Calculate confidence in data based on IR and ultrasonic agreement
-    Returns: 0.5 to 1.0 (50% to 100%)
+    Returns: 0.5 to 1.0 (50% to 100%), same rules as the gateway (scoring.py)
     """
-    if lane_name == "Lane 1":
-        ir = latest_summary.get("lane1_ir", 0)
-        count = latest_summary["lane1_vehicles"]
-    else:
-        ir = latest_summary.get("lane2_ir", 0)
-        count = latest_summary["lane2_vehicles"]
-
-    # Perfect agreement cases
-    if ir == 0 and count == 0:
-        return 1.0  # 100% confident: both say no vehicles
-    elif ir == 1 and count > 0:
-        return 1.0  # 100% confident: both say yes vehicles
-    # Disagreement cases
-    elif ir == 1 and count == 0:
-        return 0.5  # 50% confident: IR says yes, count says no
-    else:  # ir == 0 and count > 0
-        return 0.75  # 75% confident: vehicles past IR point
-
-
-def decide_green_light():
+    lane = lane_index(lane_name)
+    return confidence_scores(store.get_ir(row, lane), store.get_count(row, lane))
+
+
+def group_readings(row):
+    """(vehicles, IR) per phase group of one intersection, as lists (intersection.py)"""
+    return group_counts(store.vehicle_count[row]).tolist(), group_ir(store.ir[row]).tolist()
+
+
+def emergency_group(row):
+    """Phase group serving the emergency lane (NO_LANE without emergency)"""
+    if store.emergency[row] != 1:
+        return NO_LANE
+    return int(group_of_lane(store.emergency_lane[row]))
+
+
+def decide_green_light(row=LEGACY_ROW):
     """
-    Decide which lane gets green light
+    Decide which phase group gets green light
     WITH IR validation
     """
-    emergency = latest_summary["emergency"]
-    emergency_lane = latest_summary["emergency_lane"]
-    lane1_count = latest_summary["lane1_vehicles"]
-    lane2_count = latest_summary["lane2_vehicles"]
-
-    # If emergency, give green to that lane
-    if emergency == 1 and emergency_lane:
-        return emergency_lane
-
-    # Otherwise, green to lane with more vehicles
-    if lane1_count >= lane2_count:
-        return "Lane 1"
-    else:
-        return "Lane 2"
+    counts, _ = group_readings(row)
 
+    # If emergency, give green to the group serving that lane
+    emergency = emergency_group(row)
+    if emergency != NO_LANE:
+        return group_name(emergency)
 
-def calculate_green_duration():
+    # Otherwise, green to the group with more vehicles (first one on ties)
+    return group_name(counts.index(max(counts)))
 
-    lane = latest_summary["green_light"]
-    lane1_count = latest_summary["lane1_vehicles"]
-    lane2_count = latest_summary["lane2_vehicles"]
 
-    emergency = latest_summary["emergency"]
-    emergency_lane = latest_summary.get("emergency_lane")
+def next_green(row, current):
+    """
+    Phase group to serve after `current`'s green (decided at the end of GREEN):
+    the emergency lane's group, else the waiting group with most vehicles,
+    else `current` itself (nobody else waiting: keep the green).
+    current = NO_LANE at start-up.
+    """
+    emergency = emergency_group(row)
+    if emergency != NO_LANE:
+        return emergency
+
+    counts, ir = group_readings(row)
+    waiting = [group for group in range(N_GROUPS)
+               if group != current and (counts[group] > 0 or ir[group] == 1)]
+    if not waiting:
+        return current if current != NO_LANE else 0
+    return max(waiting, key=lambda group: counts[group])
+
+
+def calculate_green_duration(row=LEGACY_ROW):
+
+    group = int(store.green_group[row])
+    name = group_name(group)
+    counts, ir = group_readings(row)
 
     # Emergency gets MAXIMUM duration
-    if emergency == 1 and emergency_lane == lane:
+    if emergency_group(row) == group:
         return GREEN_MAX
 
     # Get IR data for validation
-    if lane == "Lane 1":
-        lane_ir = latest_summary.get("lane1_ir", 1)
-        current_count = lane1_count
-    else:
-        lane_ir = latest_summary.get("lane2_ir", 1)
-        current_count = lane2_count
+    lane_ir = ir[group]
+    current_count = counts[group]
 
     # Check if IR and ultrasonic agree
     if lane_ir == 1 and current_count == 0:
         # IR detected vehicle but count is 0
         # Adjust: assume at least 1 vehicle
-        print(f"⚠️  {lane}: IR detected, adjusting count from 0 to 1")
+        log.warning("ir_adjusted", f"⚠️  {name}: IR detected, adjusting count from 0 to 1",
+                    key=f"ir_adjusted:{row}:{name}", intersection=store.ids[row], lane=name)
         current_count = 1
     elif lane_ir == 0 and current_count > 0:
         # Count says vehicles but IR detects nothing
         # These are vehicles past IR detection point - trust ultrasonic
-        print(f"⚠️  {lane}: Vehicles past IR detection, trusting count")
+        log.info("ir_passed", f"⚠️  {name}: Vehicles past IR detection, trusting count",
+                 key=f"ir_passed:{row}:{name}", intersection=store.ids[row], lane=name)
         # Keep current_count as is
 
     # Calculate base duration
-    total_vehicles = lane1_count + lane2_count
+    total_vehicles = sum(counts)
 
     if total_vehicles == 0:
         return GREEN_MIN
 
     congestion_ratio = current_count / max(total_vehicles, 1)
 
-    #  confidence score for this lane
-    confidence = calculate_confidence_score(lane)
+    #  confidence score for this group
+    confidence = confidence_scores(lane_ir, counts[group])
 
     # Base duration
     base_duration = GREEN_MIN + int(congestion_ratio * (GREEN_MAX - GREEN_MIN))
@@ -140,60 +316,274 @@ def calculate_green_duration():
     return adjusted_duration
 
 
-# MQTT setup
-client = mqtt.Client()
-client.on_connect = on_connect
-client.on_message = on_message
-client.connect(BROKER, PORT, 60)
-client.loop_start()
-
-print("\n" + "=" * 70)
-print("🚦 CLOUD TRAFFIC LOGIC STARTED")
-print("=" * 70)
-print("Features:")
-print("  ✅ Emergency vehicle priority")
-print("  ✅ Congestion-based duration")
-print("  ✅ IR SENSOR VALIDATION")
-print("  ✅ Confidence scoring")
-print("=" * 70 + "\n")
-
-iteration = 0
-
-while True:
-    iteration += 1
-
-    # Calculate with IR validation
-    green_light = decide_green_light()
-    green_duration = calculate_green_duration()
+# =====================================================================
+# BATCH FORMS (every intersection at once)
+# =====================================================================
+
+def calculate_confidence_scores():
+    """Batch form of calculate_confidence_score: (rows, lanes) array of 0.5-1.0"""
+    return confidence_scores(store.column("ir"), store.column("vehicle_count"))
+
+
+def group_columns(rows=None):
+    """Decision inputs per phase group of `rows` (default: every row): counts, IR, emergency, emergency group"""
+    rows = slice(0, len(store)) if rows is None else rows
+    return (group_counts(store.vehicle_count[rows]), group_ir(store.ir[rows]),
+            store.emergency[rows], group_of_lane(store.emergency_lane[rows]))
+
+
+def decide_green_lights():
+    """Batch form of decide_green_light: stores and returns the green group of every row"""
+    counts, _, emergency, emergency_groups = group_columns()
+    store.column("green_group")[:] = decision_engine.green_lanes(counts, emergency, emergency_groups)
+    return store.column("green_group")
+
+
+def calculate_green_durations():
+    """Batch form of calculate_green_duration: stores and returns the duration of every row"""
+    store.column("green_duration")[:] = decision_engine.green_durations(
+        store.column("green_group"), *group_columns())
+    return store.column("green_duration")
+
+
+def next_greens(rows, current):
+    """Batch form of next_green for the given rows"""
+    return decision_engine.next_lanes(current, *group_columns(rows))
+
+
+def use_green_time(strategy):
+    """Select the green time strategy (GREEN_TIME_STRATEGIES); arrival rates start from scratch"""
+    if strategy not in GREEN_TIME_STRATEGIES:
+        raise ValueError(f"Unknown green time strategy {strategy!r} (expected one of {GREEN_TIME_STRATEGIES})")
+    green_time["strategy"] = strategy
+    green_time["optimizer"] = GreenOptimizer(N_GROUPS) if strategy == "predictive" else None
+
+
+def green_times(rows):
+    """Batch form of calculate_green_duration for the given rows (legacy one on the scalar path)"""
+    if green_time["optimizer"] is not None:
+        return green_time["optimizer"].green_times(rows, store.green_group[rows], *group_columns(rows))
+    durations = decision_engine.green_durations(store.green_group[rows], *group_columns(rows))
+    if LEGACY_ROW in rows:
+        # Keeps the IR validation log lines of the displayed intersection
+        durations[rows == LEGACY_ROW] = calculate_green_duration(LEGACY_ROW)
+    return durations
+
+
+# =====================================================================
+# SIGNAL PHASES
+# =====================================================================
+
+# One controller (one timer wheel) for every intersection
+controller = SignalController(store, next_greens, green_times)
+use_green_time(GREEN_TIME_STRATEGY)
+
+
+def decide_all(now=None):
+    """Decide stage: run every phase change that is due; returns the rows that changed"""
+    started = time.perf_counter()
+    changed = controller.advance(now)
+    metric["decide"].record(time.perf_counter() - started)
+    metric["phase_changes"].inc(len(changed))
+
+    if LEGACY_ROW in changed:
+        phase = controller.phase_name(LEGACY_ROW)
+        green_light = group_name(int(store.green_group[LEGACY_ROW]))
+        remaining = controller.remaining(LEGACY_ROW)
+        log.info("phase", f"🚦 {phase}: {green_light} ({remaining:.1f}s)",
+                 phase=phase, green_light=green_light, remaining=round(remaining, 1),
+                 cycle=controller.cycle[LEGACY_ROW])
+    return changed
+
+
+def decision_messages(rows, now=None):
+    """What the cloud publishes for each of `rows` (every column read once for all of them)"""
+    now = time.monotonic() if now is None else now
+    rows = list(rows)
+    emergency = store.emergency[rows].tolist()
+    emergency_lane = store.emergency_lane[rows].tolist()
+    green_group = store.green_group[rows].tolist()
+    green_duration = store.green_duration[rows].tolist()
+    sensor_ts = store.sensor_ts[rows].tolist()
+    ir = store.ir[rows].tolist()
+    counts = store.vehicle_count[rows].tolist()
+    confidence = store.confidence[rows].tolist()
+
+    messages = []
+    for i, row in enumerate(rows):
+        message = {
+            "intersection": store.ids[row],
+            "emergency": emergency[i],
+            "emergency_lane": lane_name(emergency_lane[i]),
+            "green_light": group_name(green_group[i]),
+            "green_duration": green_duration[i],
+            "sensor_ts": None if np.isnan(sensor_ts[i]) else sensor_ts[i],
+            "ir": ir[i],
+            "vehicles": counts[i],
+            "confidence": confidence[i]
+        }
+        message["phase"] = controller.phase_name(row)
+        message["phase_remaining"] = round(controller.remaining(row, now), 1)
+        message["cycle"] = controller.cycle[row]
+        messages.append(message)
+    return messages
+
+
+def decision_message(row, now=None):
+    """What the cloud publishes for one intersection"""
+    return decision_messages([row], now)[0]
+
+
+def decided_rows():
+    """Rows this worker publishes: every row, the legacy one only if this worker owns it"""
+    return range(0 if shard.owns(LEGACY_INTERSECTION) else LEGACY_ROW + 1, len(controller))
+
+
+def publish_decisions(client, rows=None):
+    """Publish stage: decisions of `rows` (default: every intersection) in one batch; returns how many were sent"""
+    if rows is None:
+        rows = decided_rows()
+    elif LEGACY_ROW in rows and not shard.owns(LEGACY_INTERSECTION):
+        rows = [row for row in rows if row != LEGACY_ROW]
+
+    published = 0
+    for row, message in zip(rows, decision_messages(rows)):
+        started = time.perf_counter()
+        topic = decision_topic(store.ids[row])
+        if decisions is not None:
+            message = decisions.encode(topic, message)
+            if message is None:
+                continue
+        client.publish(topic, encode_for_client(client, topic, message))
+        metric["publish"].record(time.perf_counter() - started)
+        published += 1
+    metric["published"].inc(published)
+    return published
+
+
+def tick(client):
+    """One controller tick: ingest, publish the intersections whose phase changed; returns decisions sent"""
+    ingest(client)
+    changed = decide_all()
+    return publish_decisions(client, changed) if changed else 0
+
+
+def report_due(next_report):
+    """Time to publish every intersection: each PUBLISH_INTERVAL, and at once on the first sensor data"""
+    return time.monotonic() >= next_report or (first_summary.is_set() and not first_decision.is_set())
+
+
+def decide_and_publish(client, iteration):
+    """One iteration of the cloud logic: ingest, advance, publish every intersection, log; returns decisions sent"""
+    ingest(client)
+    has_data = first_summary.is_set()
+    decide_all()
+    green_light = group_name(int(store.green_group[LEGACY_ROW]))
+    green_duration = int(store.green_duration[LEGACY_ROW])
+    phase = controller.phase_name(LEGACY_ROW)
 
     # Calculate confidence for display
-    lane1_confidence = calculate_confidence_score("Lane 1")
-    lane2_confidence = calculate_confidence_score("Lane 2")
-
-    latest_summary["green_light"] = green_light
-    latest_summary["green_duration"] = green_duration
-
-    # Print detailed status
-    print(f"\n{'=' * 70}")
-    print(f"[ITERATION {iteration}] Traffic Light Control")
-    print(f"{'=' * 70}")
-
-    print(f"\n📊 LANE STATUS:")
-    print(
-        f"  Lane 1: IR={latest_summary.get('lane1_ir', 0)}, Count={latest_summary['lane1_vehicles']}, Confidence={lane1_confidence * 100:.0f}%")
-    print(
-        f"  Lane 2: IR={latest_summary.get('lane2_ir', 0)}, Count={latest_summary['lane2_vehicles']}, Confidence={lane2_confidence * 100:.0f}%")
-
-    if latest_summary["emergency"] == 1:
-        print(f"\n🚨 EMERGENCY: {latest_summary['emergency_lane']}")
-
-    print(f"\n✅ DECISION:")
-    print(f"  Green Light: {green_light}")
-    print(f"  Duration: {green_duration}s (min: {GREEN_MIN}s, max: {GREEN_MAX}s)")
-    print(f"  Confidence: {((lane1_confidence + lane2_confidence) / 2) * 100:.0f}%")
-
-    # Publish
-    client.publish(TOPIC_SUMMARY, json.dumps(latest_summary))
-    print(f"\n📤 Published to MQTT")
-
-    time.sleep(PUBLISH_INTERVAL)
\ No newline at end of file
+    confidence = [calculate_confidence_score(lane) for lane in LANES]
+    lanes = " | ".join(f"{lane} IR={store.get_ir(LEGACY_ROW, index)} Count={store.get_count(LEGACY_ROW, index)} "
+                       f"({confidence[index] * 100:.0f}%)" for index, lane in enumerate(LANES))
+
+    published = publish_decisions(client)
+
+    emergency = ""
+    if store.emergency[LEGACY_ROW] == 1:
+        emergency = f" | 🚨 EMERGENCY: {lane_name(int(store.emergency_lane[LEGACY_ROW]))}"
+    log.info("iteration",
+             f"[ITERATION {iteration}] {lanes}{emergency} | "
+             f"🚦 {phase}: {green_light}, green {green_duration}s | "
+             f"📤 {published}/{len(store)} decisions published",
+             iteration=iteration, phase=phase, green_light=green_light, green_duration=green_duration,
+             emergency=int(store.emergency[LEGACY_ROW]),
+             confidence=round(sum(confidence) / len(confidence), 2),
+             intersections=len(store), published=published)
+
+    if has_data and published and not first_decision.is_set():
+        first_decision.set()
+        log.info("first_decision", f"✅ First decision on sensor data published (iteration {iteration})",
+                 iteration=iteration)
+    return published
+
+
+def setup(args, shard_index=0, shard_count=1):
+    """Intersections decided by this worker, from the command line options"""
+    shard.configure(shard_index, shard_count, args.intersections)
+    if getattr(args, "green_time", None):
+        use_green_time(args.green_time)
+    if args.intersections:
+        for intersection in shard.owned():
+            store.row(intersection)
+
+
+def serve(args, shard_index=0, shard_count=1):
+    """Run one cloud-logic worker (or the only one) until interrupted"""
+    setup(args, shard_index, shard_count)
+    start_metrics("cloud", shard_index)
+
+    # MQTT setup
+    client = mqtt.Client()
+    client.on_connect = on_connect
+    client.on_subscribe = on_subscribe
+    client.on_message = on_message
+    client.connect(BROKER, PORT, 60)
+    client.loop_start()
+
+    print("\n" + "=" * 70)
+    print("🚦 CLOUD TRAFFIC LOGIC STARTED")
+    print("=" * 70)
+    print("Features:")
+    print("  ✅ Emergency vehicle priority")
+    if green_time["strategy"] == "predictive":
+        print(f"  ✅ Predictive green times ({ARRIVAL_ESTIMATOR} arrival rates)")
+    else:
+        print("  ✅ Congestion-based duration")
+    print("  ✅ IR SENSOR VALIDATION")
+    print("  ✅ Confidence scoring")
+    print(f"  ✅ Signal phases: min green {GREEN_MIN}s, yellow {YELLOW_TIME}s, all-red {ALL_RED_TIME}s")
+    if shard_count > 1:
+        print(f"  ✅ Worker {shard_index + 1}/{shard_count}")
+    print("=" * 70 + "\n")
+
+    iteration = 0
+    next_report = time.monotonic()
+
+    try:
+        while True:
+            # Every intersection each PUBLISH_INTERVAL, only the ones whose phase changed in between
+            if report_due(next_report):
+                iteration += 1
+                decide_and_publish(client, iteration)
+                next_report = time.monotonic() + PUBLISH_INTERVAL
+            else:
+                tick(client)
+            time.sleep(CONTROLLER_TICK)
+    except KeyboardInterrupt:
+        print(f"\n⛔ Cloud logic stopped by user ({iteration} iterations)")
+        if shard_count > 1:
+            print(f"   Worker {shard_index + 1}/{shard_count}: {len(store)} intersections, "
+                  f"{int(metric['foreign'].value)} summaries for other workers dropped")
+    finally:
+        client.loop_stop()
+        client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cloud traffic logic")
+    parser.add_argument("--intersections", type=int, default=0,
+                        help="number of declared intersections I0000.. (default: discover via wildcard)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="partition intersections across this many processes")
+    parser.add_argument("--green-time", choices=GREEN_TIME_STRATEGIES, default=GREEN_TIME_STRATEGY,
+                        help="green duration strategy (default: GREEN_TIME_STRATEGY)")
+    parser.add_argument("--shard", type=int, default=None,
+                        help="run only this worker (0-based) of --workers workers")
+    args = parser.parse_args()
+
+    run_workers(serve, args, "cloud")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,51 @@
 
 
-BROKER = "broker.hivemq.com"
-PORT = 1883
+import os
+
+# MQTT broker
+#   "public" -> HiveMQ public broker (needs internet)
+#   "local"  -> broker/local_broker.py on this machine (offline runs, benchmarks)
+# Override with the environment: TRAFFIC_BROKER=local, TRAFFIC_BROKER_HOST, TRAFFIC_BROKER_PORT
+BROKER_PROFILES = {
+    "public": ("broker.hivemq.com", 1883),
+    "local": ("127.0.0.1", 1883)
+}
+BROKER_PROFILE = os.environ.get("TRAFFIC_BROKER", "public")
+BROKER = os.environ.get("TRAFFIC_BROKER_HOST", BROKER_PROFILES[BROKER_PROFILE][0])
+PORT = int(os.environ.get("TRAFFIC_BROKER_PORT", BROKER_PROFILES[BROKER_PROFILE][1]))
 
 # Topics
 TOPIC_LANE_1 = "traffic/lane1"
 TOPIC_LANE_2 = "traffic/lane2"
 TOPIC_RFID = "traffic/emergency"
 TOPIC_SUMMARY = "traffic/summary"
+TOPIC_DECISION = "traffic/decision"      # cloud decisions (never re-read by the cloud)
+
+# Multi-intersection topics
+#   traffic/sensors/<intersection>/lane1 | lane2 | emergency
+#   traffic/summary/<intersection>
+#   traffic/decision/<intersection>
+# The original single intersection keeps the topics above.
+TOPIC_SENSOR_PREFIX = "traffic/sensors"
+TOPIC_SUMMARY_PREFIX = "traffic/summary"
+TOPIC_DECISION_PREFIX = "traffic/decision"
+LEGACY_INTERSECTION = "main"
+
+# Intersection model (intersection.py)
+#   INTERSECTION_LANES       lane names in index order: sensors, summaries and decisions
+#                            refer to lanes by index (lane 1 -> traffic/.../lane1, ...)
+#   INTERSECTION_APPROACHES  approach -> its lanes (grouping on the dashboard)
+#   INTERSECTION_PHASES      phase group -> lanes that may have green together (no conflicts);
+#                            the signal controller gives green to one group at a time
+INTERSECTION_LANES = ("Lane 1", "Lane 2")
+INTERSECTION_APPROACHES = {
+    "North": ("Lane 1",),
+    "East": ("Lane 2",)
+}
+INTERSECTION_PHASES = {
+    "Lane 1": ("Lane 1",),
+    "Lane 2": ("Lane 2",)
+}
 
 # Sensor & Traffic settings
 PUBLISH_INTERVAL = 2   # seconds
@@ -17,8 +55,105 @@ MAX_VEHICLES = 20
 
 EMERGENCY_PROBABILITY = 0.05  # 5% chance per sensor read
 
+# Signal phases (cloud/signal_controller.py)
+#   MIN_GREEN (GREEN_MIN, held) -> GREEN -> YELLOW -> ALL_RED -> next lane
+YELLOW_TIME = 3        # seconds
+ALL_RED_TIME = 2       # seconds
+CONTROLLER_TICK = 0.1  # seconds, timer wheel resolution (cloud loop tick)
+CLOUD_INBOX_SIZE = 100000  # summaries queued for the cloud loop; the oldest go when full
+
+# Green time (cloud)
+#   "heuristic"  -> congestion ratio x confidence (calculate_green_duration)
+#   "predictive" -> cloud/green_optimizer.py: per-lane arrival-rate estimates, green that
+#                   minimizes the predicted queue delay over the next cycle
+GREEN_TIME_STRATEGY = "heuristic"
+ARRIVAL_ESTIMATOR = "ewma"     # "ewma" or "kalman", arrival rate per lane from successive counts
+ARRIVAL_EWMA_TAU = 30          # seconds, EWMA time constant
+ARRIVAL_KALMAN_Q = 0.0005      # (vehicles/s)^2 per second the true rate may drift
+ARRIVAL_KALMAN_R = 0.1         # (vehicles/s)^2 noise of a rate measured over 1 s (scaled by 1/dt)
+SATURATION_FLOW = 0.5          # vehicles/s leaving a lane that has green
+
 
 # New settings for better visualization
 DASHBOARD_UPDATE_INTERVAL = 2000  # milliseconds
 LANE_1_PRIORITY = "Lane 1"  # Which lane gets priority for emergency
-LANE_2_PRIORITY = "Lane 2"
\ No newline at end of file
+LANE_2_PRIORITY = "Lane 2"
+
+# Dashboard message intake (dashboard.py)
+DASHBOARD_INBOX_SIZE = 10000      # messages queued for the UI thread; the oldest go when full
+DASHBOARD_DRAIN_BATCH = 1000      # messages applied per frame at most (the rest next frame)
+
+# City dashboard (city_dashboard.py)
+CITY_TILE_SIZES = (72, 110, 170)  # tile widths in pixels, "+" / "-" zoom through them
+CITY_DETAIL_TILE_WIDTH = 150      # tiles at least this wide also list every lane
+CITY_SUBSCRIBE_MARGIN = 1         # screens above / below the view also subscribed
+CITY_SUBSCRIBE_DELAY = 0.3        # seconds the view must stay put before resubscribing
+CITY_STALE_AFTER = 10             # seconds without news before a tile is dimmed
+
+# Dashboard history (history.py): raw samples, then (bucket seconds, buckets kept) tiers
+HISTORY_RAW_SIZE = 600                    # ~5-10 minutes of summaries
+HISTORY_TIERS = ((60, 1440), (900, 672))  # 1-minute buckets for a day, 15-minute for a week
+
+# Recorder (recorder/traffic_recorder.py): every sensor reading, summary and decision on disk,
+# in columnar segment files (recorder/segments.py)
+RECORDER_DIR = "recordings"               # relative to the project root
+RECORDER_INBOX_SIZE = 100000              # messages queued for the writer; the oldest go when full
+RECORDER_BLOCK_ROWS = 4096                # rows per block (one stream, column by column)
+RECORDER_FSYNC_INTERVAL = 1.0             # seconds between fsyncs (at most this much is lost on a crash)
+RECORDER_SEGMENT_BYTES = 64 * 2**20       # a segment is sealed at this size ...
+RECORDER_SEGMENT_SECONDS = 3600           # ... or this age, then compacted (sorted + compressed)
+RECORDER_MAINTAIN_INTERVAL = 60           # seconds between rotation / compaction / retention checks
+RECORDER_SENSOR_RETENTION = 24 * 3600     # seconds raw sensor readings are kept (summaries stay longer)
+RECORDER_RETENTION = 30 * 24 * 3600       # seconds anything is kept
+RECORDER_MAX_BYTES = 2 * 2**30            # disk budget for sealed segments: the oldest go beyond it
+
+# Wire format per topic ("json" or "binary")
+# Receivers understand both (binary payloads start with a magic byte),
+# so topics can be switched one at a time; anything not listed uses WIRE_FORMAT.
+WIRE_FORMAT = "json"
+WIRE_FORMAT_TOPICS = {
+    # "traffic/sensors/#": "binary",
+    # "traffic/summary/#": "binary",
+}
+
+# Gateway publishing mode
+#   "polling" -> publish a summary every PUBLISH_INTERVAL
+#   "event"   -> publish on change (coalesced), immediately on emergency
+GATEWAY_MODE = "polling"
+GATEWAY_COALESCE_WINDOW = 0.2      # seconds to batch ordinary changes (event mode)
+GATEWAY_HEARTBEAT_INTERVAL = 10    # seconds, re-publish even if nothing changed (event mode)
+# Delta-encoded summaries / decisions (delta.py)
+#   only changed fields are published; a full keyframe every DELTA_KEYFRAME_INTERVAL
+#   messages per topic, or when a subscriber spots a sequence gap and asks on TOPIC_RESYNC
+SUMMARY_DELTA_MODE = False
+DELTA_KEYFRAME_INTERVAL = 30       # messages per topic
+DELTA_RESYNC_INTERVAL = 1.0        # seconds between resync requests for the same stream
+TOPIC_RESYNC = "traffic/resync"
+
+# Metrics (metrics.py): /metrics (Prometheus text) and /metrics.json per component,
+# plus a JSON snapshot file per component every METRICS_SNAPSHOT_INTERVAL seconds
+METRICS_ENABLED = True
+#   shard / worker k of a component uses its port + k, so ports are METRICS_PORT_SPACING apart
+METRICS_PORTS = {"gateway": 9100, "cloud": 9200, "dashboard": 9300, "all_in_one": 9400, "city_dashboard": 9500,
+                 "recorder": 9600}   # None/0 = no endpoint
+METRICS_PORT_SPACING = 100            # endpoints per component (shards beyond it get none)
+METRICS_SNAPSHOT_DIR = "metrics"      # "" = no snapshot files
+METRICS_SNAPSHOT_INTERVAL = 10        # seconds
+
+# Logging (structured_log.py)
+#   LOG_FORMAT "pretty" prints the human-readable message, "json" one JSON object per line
+# Override with the environment: TRAFFIC_LOG_LEVEL, TRAFFIC_LOG_FORMAT, TRAFFIC_LOG_FILE
+LOG_LEVEL = os.environ.get("TRAFFIC_LOG_LEVEL", "INFO")
+LOG_FORMAT = os.environ.get("TRAFFIC_LOG_FORMAT", "pretty")
+LOG_FILE = os.environ.get("TRAFFIC_LOG_FILE") or None   # None = stdout
+LOG_QUEUE_SIZE = 10000             # records; more are dropped (and counted)
+LOG_RATE_LIMIT = 20                # records/s per key (0 = unlimited)
+
+# Supervisor (supervisor.py): starts the components listed in SUPERVISOR_MANIFEST
+SUPERVISOR_MANIFEST = "components.json"   # relative to the project root
+SUPERVISOR_READY_TIMEOUT = 15      # seconds a component gets to pass its readiness probe
+SUPERVISOR_BACKOFF_MIN = 0.5       # seconds before the first restart, doubled per crash
+SUPERVISOR_BACKOFF_MAX = 30        # seconds, longest restart delay
+SUPERVISOR_STABLE_AFTER = 30       # seconds up after which a crash counts as the first again
+SUPERVISOR_MAX_RESTARTS = 10       # consecutive crashes before giving up on a component
+SUPERVISOR_STOP_TIMEOUT = 5        # seconds between the stop signal and kill on shutdown
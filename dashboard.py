@@ -2,11 +2,22 @@
 
 import tkinter as tk
 from tkinter import ttk
-import json
 import paho.mqtt.client as mqtt
 from datetime import datetime
+import re
 import time
-from config import BROKER, PORT, TOPIC_SUMMARY, DASHBOARD_UPDATE_INTERVAL
+from collections import deque
+from config import (BROKER, PORT, TOPIC_SUMMARY, TOPIC_DECISION, DASHBOARD_UPDATE_INTERVAL,
+                    LEGACY_INTERSECTION, TOPIC_RESYNC, YELLOW_TIME, ALL_RED_TIME,
+                    DASHBOARD_INBOX_SIZE, DASHBOARD_DRAIN_BATCH, MAX_VEHICLES, GREEN_MAX, HISTORY_TIERS)
+from delta import DeltaTracker
+from history import History
+from intersection import APPROACHES, GROUP_LANES, GROUPS, LANES, N_LANES, group_index, group_name, group_of_lane
+from lane_store import LaneStore, lane_name
+from metrics import counter, expose_dict, gauge, histogram, start_metrics
+from render import Renderer, Sparkline, TrafficLight
+from structured_log import get_logger
+from wire_format import decode, encode_for_client
 
 # Try to play ambulance sound on Windows
 try:
@@ -24,49 +35,200 @@ except ImportError:
         pass
 
 
-latest_data = {
-    "lane1_vehicles": 0,
-    "lane2_vehicles": 0,
-    "emergency": 0,
-    "emergency_lane": None,
-    "green_light": "Lane 1",
-    "green_duration": 0
-}
+# Latest state of the displayed intersection
+store = LaneStore(capacity=1)
+ROW = store.row(LEGACY_INTERSECTION)
+store.set_decision(ROW, GROUPS[0], 0)
+
+# Sequence tracking for delta-encoded summaries
+deltas = DeltaTracker()
+
+# Raw (topic, payload, received at) from the network thread, drained by the
+# UI thread every frame (deque append / popleft need no lock). When full the
+# oldest message goes: a frame only shows the latest state anyway, and in
+# delta mode the gap is caught by the sequence numbers (resync)
+inbox = deque(maxlen=DASHBOARD_INBOX_SIZE)
+
+# Total green seconds per phase group, by group index ("Lane 1" -> lane1_total_green)
+GREEN_STAT_KEYS = tuple(re.sub(r"[^a-z0-9]", "", name.lower()) + "_total_green" for name in GROUPS)
 
 stats = {
     "total_cycles": 0,
     "emergency_events": 0,
-    "lane1_total_green": 0,
-    "lane2_total_green": 0
+    **{key: 0 for key in GREEN_STAT_KEYS}
 }
 
+# History for the trend charts (history.py): a sample per summary, one per new green.
+# Channels: vehicles of every lane, then confidence of every lane, then emergency
+lane_history = History([f"{lane} vehicles" for lane in LANES] + [f"{lane} confidence" for lane in LANES]
+                       + ["emergency"])
+green_history = History(("green_duration",))
+EMERGENCY_CHANNEL = 2 * N_LANES
+
+# Metrics (metrics.py)
+expose_dict(stats, "dashboard_")
+metric = {
+    "on_message": histogram("dashboard_on_message_seconds", "Time to handle one summary / decision"),
+    "received": counter("dashboard_messages_received_total", "Summaries / decisions received"),
+    "overflow": counter("dashboard_inbox_dropped_total", "Messages dropped because the inbox was full"),
+    "batch": histogram("dashboard_ingest_seconds", "Time to drain the inbox once"),
+    "decode": histogram("dashboard_decode_seconds", "Time to decode one payload"),
+    "render": histogram("dashboard_render_seconds", "Time to update every widget once"),
+    "flush": histogram("dashboard_flush_seconds", "Time to configure the widgets that changed in one frame"),
+    "updates": counter("dashboard_widget_updates_total", "Widget / canvas item configure calls"),
+    "frame_updates": gauge("dashboard_frame_widget_updates", "Widgets configured in the last frame")
+}
+
+gauge("dashboard_inbox", "Messages waiting for the UI thread", lambda: len(inbox))
+
+log = get_logger("dashboard")
+
 #  Track green light timing
 green_light_start_time = None
 current_green_duration = 0
 last_green_light = None
 last_emergency_status = 0
+last_cycle = None
+
+# Emergency lane of the last 0 -> 1 edge not rendered yet
+emergency_flash = {"lane": None}
+
+# Signal phase from the cloud decisions (cloud/signal_controller.py);
+# stays None with a cloud that does not send phases
+signal = {"phase": None, "ends_at": None, "cycle": None}
 
 
 
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
-        print("✓ Connected to MQTT broker")
-        client.subscribe(TOPIC_SUMMARY)
+        log.info("connected", "✓ Connected to MQTT broker")
+        # Sensor state from the gateway, green light + duration from the cloud
+        client.subscribe([(TOPIC_SUMMARY, 0), (TOPIC_DECISION, 0)])
     else:
-        print(f"✗ Connection failed: {rc}")
+        log.error("connect_failed", f"✗ Connection failed: {rc}", rc=rc)
+
+
+def on_subscribe(client, userdata, mid, granted_qos):
+    log.info("ready", "✓ Dashboard subscribed")
 
 
 def on_message(client, userdata, msg):
-    global latest_data
-    try:
-        payload = json.loads(msg.payload.decode())
-        latest_data.update(payload)
-    except Exception as e:
-        print(f"Error parsing message: {e}")
+    # Network thread: queue the raw payload, the UI thread does the rest
+    if len(inbox) == inbox.maxlen:
+        metric["overflow"].inc()
+    inbox.append((msg.topic, msg.payload, time.time()))
+    metric["received"].inc()
+
+
+def apply_message(topic, payload, received_at):
+    """One decoded summary / decision into the displayed state (UI thread)"""
+    # Delta mode: drop messages after a gap and ask for a keyframe
+    apply, resync = deltas.check(topic, payload)
+    if resync is not None:
+        client.publish(TOPIC_RESYNC, encode_for_client(client, TOPIC_RESYNC, resync), qos=1)
+    if not apply:
+        return
+
+    if topic == TOPIC_SUMMARY:
+        store.update_from_summary(ROW, payload)
+        lane_history.append(received_at, [*store.vehicle_count[ROW], *store.confidence[ROW], store.emergency[ROW]])
+    elif topic == TOPIC_DECISION:
+        if "green_light" in payload:
+            store.green_group[ROW] = group_index(payload["green_light"])
+        if "green_duration" in payload:
+            store.green_duration[ROW] = payload["green_duration"]
+        if "phase" in payload:
+            signal["phase"] = payload["phase"]
+        if "phase_remaining" in payload:
+            signal["ends_at"] = received_at + payload["phase_remaining"]
+        if "cycle" in payload:
+            signal["cycle"] = payload["cycle"]
+    track_events(received_at)
+
+
+def ingest():
+    """
+    Drain the inbox (at most DASHBOARD_DRAIN_BATCH messages, the rest waits
+    for the next frame); returns how many were handled. Every message is
+    applied in order, so no cycle or emergency edge is missed, but the
+    widgets are only rendered once for the whole batch.
+    """
+    batch_started = time.perf_counter()
+    handled = 0
+    while inbox and handled < DASHBOARD_DRAIN_BATCH:
+        topic, raw, received_at = inbox.popleft()
+        handled += 1
+        started = time.perf_counter()
+        try:
+            payload = decode(raw)
+            metric["decode"].record(time.perf_counter() - started)
+            apply_message(topic, payload, received_at)
+        except Exception as e:
+            log.error("bad_message", f"Error parsing message: {e}", topic=topic, error=str(e))
+        metric["on_message"].record(time.perf_counter() - started)
+    if handled:
+        metric["batch"].record(time.perf_counter() - batch_started)
+    return handled
+
+
+def track_events(now):
+    """
+    Cycles and emergencies, checked after every message (not every frame)
+
+    1. Total cycles counted when a new green starts (the cloud's cycle
+       counter moves on), not on every decision
+    2. Emergency counted ONCE per event (when it changes from 0 to 1)
+    """
+    global green_light_start_time, current_green_duration
+    global last_green_light, last_emergency_status, last_cycle
+
+    green_group = int(store.green_group[ROW])
+    green_light = group_name(green_group)
+
+    # ===== DETECT NEW CYCLE =====
+    # With signal phases only a real phase change (a new green) is a cycle;
+    # older clouds without phases: every group change
+    if signal["cycle"] is not None:
+        new_cycle = signal["cycle"] != last_cycle
+    else:
+        new_cycle = green_light != last_green_light
 
+    if new_cycle:
+        stats["total_cycles"] += 1
+
+        # Record start time of new green light
+        green_light_start_time = now
+        current_green_duration = int(store.green_duration[ROW])
+        green_history.append(now, (current_green_duration,))
+
+        # Add to total green time for that group
+        if green_light is not None:
+            stats[GREEN_STAT_KEYS[green_group]] += current_green_duration
+
+        last_green_light = green_light
+        last_cycle = signal["cycle"]
+
+        log.info("new_cycle", f"🔄 NEW CYCLE {stats['total_cycles']}: {green_light} gets {current_green_duration}s",
+                 cycle=stats["total_cycles"], green_light=green_light, green_duration=current_green_duration)
+
+    # ===== EMERGENCY EDGE =====
+    emergency = int(store.emergency[ROW])
+    if emergency == 1 and last_emergency_status == 0:
+        emergency_lane = lane_name(int(store.emergency_lane[ROW]))
+        stats["emergency_events"] += 1
+        emergency_flash["lane"] = int(store.emergency_lane[ROW])
+        play_ambulance_sound()
+        log.warning("emergency", f"🚨 EMERGENCY EVENT #{stats['emergency_events']}: {emergency_lane}",
+                    event_number=stats["emergency_events"], lane=emergency_lane)
+
+    last_emergency_status = emergency
+
+
+start_metrics("dashboard")
 
 client = mqtt.Client()
 client.on_connect = on_connect
+client.on_subscribe = on_subscribe
 client.on_message = on_message
 client.connect(BROKER, PORT, 60)
 client.loop_start()
@@ -75,7 +237,7 @@ client.loop_start()
 
 root = tk.Tk()
 root.title("🚦 Smart Traffic Control System")
-root.geometry("1200x700")
+root.geometry("1200x880")
 root.configure(bg="#1e1e1e")
 
 style = ttk.Style()
@@ -116,11 +278,25 @@ lane_section = tk.Frame(main_frame, bg="#2d2d2d", relief=tk.RAISED, bd=2)
 lane_section.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5)
 tk.Label(lane_section, text="🛣️  LANE STATUS", font=("Arial", 12, "bold"), bg="#2d2d2d", fg="#00ff00").pack(pady=10)
 
-lane1_frame, lane1_vehicles_label, lane1_light_canvas = create_lane_frame(lane_section, "LANE 1", "#1a3a1a", "#00ff00")
-lane1_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
-
-lane2_frame, lane2_vehicles_label, lane2_light_canvas = create_lane_frame(lane_section, "LANE 2", "#3a1a1a", "#ff6b6b")
-lane2_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+# One frame per configured lane (intersection.py), by lane index; two
+# columns once there are more than two lanes
+lane_grid = tk.Frame(lane_section, bg="#2d2d2d")
+lane_grid.pack(fill=tk.BOTH, expand=True)
+lane_columns = 1 if N_LANES <= 2 else 2
+for column in range(lane_columns):
+    lane_grid.columnconfigure(column, weight=1)
+
+lane_approach = {lane: name for name, lanes in APPROACHES for lane in lanes}
+lane_frames, lane_vehicles_labels, lane_light_canvases = [], [], []
+for lane, name in enumerate(LANES):
+    title = name.upper() if lane not in lane_approach else f"{name.upper()} · {lane_approach[lane]}"
+    colors = ("#1a3a1a", "#00ff00") if lane % 2 == 0 else ("#3a1a1a", "#ff6b6b")
+    frame, vehicles_label, light_canvas = create_lane_frame(lane_grid, title, *colors)
+    frame.grid(row=lane // lane_columns, column=lane % lane_columns, sticky="nsew", padx=10, pady=5)
+    lane_grid.rowconfigure(lane // lane_columns, weight=1)
+    lane_frames.append(frame)
+    lane_vehicles_labels.append(vehicles_label)
+    lane_light_canvases.append(light_canvas)
 
 # =====================================================================
 # CONTROL & EMERGENCY (MIDDLE)
@@ -135,7 +311,7 @@ tk.Label(control_section, text="⚙️  TRAFFIC CONTROL", font=("Arial", 12, "bo
 green_frame = tk.Frame(control_section, bg="#1a3a1a", relief=tk.SUNKEN, bd=2)
 green_frame.pack(fill=tk.X, padx=10, pady=5)
 tk.Label(green_frame, text="✅ GREEN LIGHT", font=("Arial", 10, "bold"), bg="#1a3a1a", fg="#00ff00").pack(pady=5)
-green_light_label = tk.Label(green_frame, text="Lane 1", font=("Arial", 16, "bold"), bg="#1a3a1a", fg="#00ff00")
+green_light_label = tk.Label(green_frame, text=GROUPS[0], font=("Arial", 16, "bold"), bg="#1a3a1a", fg="#00ff00")
 green_light_label.pack(pady=5)
 
 # DURATION - UPDATED TO SHOW COUNTDOWN
@@ -182,12 +358,58 @@ def create_stat_frame(parent, label_text, fg_color="#00ff00"):
 
 cycle_count_label = create_stat_frame(stats_section, "Total Cycles")
 emergency_count_label = create_stat_frame(stats_section, "Emergencies", fg_color="#ff0000")
-lane1_green_label = create_stat_frame(stats_section, "Lane 1 Green")
-lane2_green_label = create_stat_frame(stats_section, "Lane 2 Green")
+group_green_labels = [create_stat_frame(stats_section, f"{name} Green") for name in GROUPS]
 
 time_label = tk.Label(stats_section, text="Last Update: --:--:--", font=("Arial", 9), bg="#2d2d2d", fg="#888888")
 time_label.pack(pady=10)
 
+# =====================================================================
+# TRENDS (BOTTOM)
+# =====================================================================
+
+LANE_COLORS = ("#00ff00", "#ff6b6b", "#4da6ff", "#ffd700", "#cc66ff", "#ff9933")
+
+trend_section = tk.Frame(root, bg="#2d2d2d", relief=tk.RAISED, bd=2)
+trend_section.pack(fill=tk.X, padx=15, pady=(0, 10))
+trend_header = tk.Frame(trend_section, bg="#2d2d2d")
+trend_header.pack(fill=tk.X)
+tk.Label(trend_header, text="📈 TRENDS", font=("Arial", 12, "bold"), bg="#2d2d2d", fg="#00ff00").pack(
+    side=tk.LEFT, padx=10, pady=5)
+
+# Raw samples or one of the downsampled tiers (bars show min-max per bucket)
+trend_level = tk.IntVar(value=0)
+for level, text in enumerate(["Raw"] + [f"{seconds // 60} min" for seconds, _ in HISTORY_TIERS]):
+    tk.Radiobutton(trend_header, text=text, variable=trend_level, value=level, bg="#2d2d2d", fg="#ffffff",
+                   selectcolor="#1a1a2e", activebackground="#2d2d2d").pack(side=tk.LEFT, padx=5)
+tk.Label(trend_header, text=f"history {(lane_history.nbytes() + green_history.nbytes()) // 1024} KB (fixed)",
+         font=("Arial", 9), bg="#2d2d2d", fg="#888888").pack(side=tk.RIGHT, padx=10)
+
+trend_charts = tk.Frame(trend_section, bg="#2d2d2d")
+trend_charts.pack(fill=tk.X, padx=5, pady=5)
+
+
+def create_chart(title, top):
+    canvas = tk.Canvas(trend_charts, width=370, height=120, bg="#1a1a2e", highlightthickness=0)
+    canvas.pack(side=tk.LEFT, padx=5)
+    canvas.create_text(6, 4, anchor="nw", text=title, font=("Arial", 9, "bold"), fill="#ffffff")
+    canvas.create_text(6, 20, anchor="nw", text=str(top), font=("Arial", 8), fill="#888888")
+    canvas.create_text(6, 104, anchor="nw", text="0", font=("Arial", 8), fill="#888888")
+    return canvas
+
+
+# (sparkline, history, channel)
+vehicles_chart = create_chart("🚗 Vehicles per lane", MAX_VEHICLES)
+confidence_chart = create_chart("🎯 Confidence per lane (%)", 100)
+green_chart = create_chart("✅ Green (s) / 🚨 emergency", GREEN_MAX)
+sparklines = []
+for lane in range(N_LANES):
+    color = LANE_COLORS[lane % len(LANE_COLORS)]
+    sparklines.append((Sparkline(vehicles_chart, 30, 22, 334, 90, 0, MAX_VEHICLES, color), lane_history, lane))
+    sparklines.append((Sparkline(confidence_chart, 30, 22, 334, 90, 0, 100, color), lane_history, N_LANES + lane))
+sparklines.append((Sparkline(green_chart, 30, 22, 334, 70, 0, GREEN_MAX, "#00ff00"), green_history, 0))
+sparklines.append((Sparkline(green_chart, 30, 98, 334, 14, 0, 1, "#ff0000", band_color="#661a1a"),
+                   lane_history, EMERGENCY_CHANNEL))
+
 # FOOTER
 footer_frame = tk.Frame(root, bg="#2d2d2d", height=40)
 footer_frame.pack(fill=tk.X)
@@ -197,21 +419,14 @@ tk.Label(footer_frame, text="Developed by: Reem, Maryam, Sourour", font=("Arial"
 
 
 # =====================================================================
-# TRAFFIC LIGHT DRAWING
+# RENDERING (render.py)
 # =====================================================================
 
-def draw_traffic_light(canvas, color):
-    canvas.delete("all")
-    radius = 40
-    x, y = 75, 50
-    canvas.create_oval(x - radius, y - radius, x + radius, y + radius, outline="#444444", width=3, fill="#111111")
-
-    if color == "green":
-        canvas.create_oval(x - 30, y - 30, x + 30, y + 30, fill="#00ff00", outline="#00aa00", width=2)
-    elif color == "red":
-        canvas.create_oval(x - 30, y - 30, x + 30, y + 30, fill="#ff0000", outline="#aa0000", width=2)
-    else:
-        canvas.create_oval(x - 30, y - 30, x + 30, y + 30, fill="#333333", outline="#555555", width=2)
+# Widgets are only configured when what they show changes; the traffic
+# lights are drawn once and recolored
+render = Renderer()
+lane_lights = [TrafficLight(canvas, render) for canvas in lane_light_canvases]
+frame_time = {"seconds": 0.0, "updates": 0}    # last update_dashboard(), shown in the next frame
 
 
 
@@ -220,53 +435,75 @@ def update_dashboard():
     """
     Update dashboard with real-time countdown
 
+    Messages queued since the last frame are applied first (ingest()), then
+    the widgets are rendered once. Widgets go through render.set() and are
+    only configured at the end of the frame, and only if what they show
+    changed (render.py).
 
     1. Countdown timer counts down every second (accurate)
     2. Synchronized with actual green light duration
-    3. Total cycles counted when lane changes
     """
-    global green_light_start_time, current_green_duration
-    global last_green_light, last_emergency_status, stats
+    render_started = time.perf_counter()
+    ingest()
+
+    green_group = int(store.green_group[ROW])
+    green_light = group_name(green_group)
+    phase = signal["phase"]
+    emergency = int(store.emergency[ROW])
+    emergency_lane_index = int(store.emergency_lane[ROW])
+
+    # An emergency that started and ended between two frames is still shown once
+    if emergency == 0 and emergency_flash["lane"] is not None:
+        emergency, emergency_lane_index = 1, emergency_flash["lane"]
+    emergency_flash["lane"] = None
+    emergency_lane = lane_name(emergency_lane_index)
+    emergency_group = group_name(int(group_of_lane(emergency_lane_index)))
 
     # ===== UPDATE VEHICLE COUNTS =====
-    lane1_vehicles_label.config(text=f"🚗 Vehicles: {latest_data['lane1_vehicles']}")
-    lane2_vehicles_label.config(text=f"🚗 Vehicles: {latest_data['lane2_vehicles']}")
-
-    # ===== DETECT LANE CHANGE (New Cycle) =====
-    if latest_data["green_light"] != last_green_light:
-        # LANE CHANGED = NEW CYCLE
-        stats["total_cycles"] += 1
+    for lane, label in enumerate(lane_vehicles_labels):
+        render.set(label, text=f"🚗 Vehicles: {store.get_count(ROW, lane)}")
 
-        # Record start time of new green light
-        green_light_start_time = time.time()
-        current_green_duration = latest_data["green_duration"]
+    # ===== TRAFFIC LIGHTS =====
+    # green_light is the group being cleared during YELLOW, the next one during ALL_RED
+    if phase == "YELLOW":
+        color, frame_bg = "yellow", "#3a3a1a"
+    elif phase == "ALL_RED":
+        color, frame_bg = "red", "#3a1a1a"
+    else:
+        color, frame_bg = "green", "#1a3a1a"
 
-        # Add to total green time for that lane
-        if latest_data["green_light"] == "Lane 1":
-            stats["lane1_total_green"] += current_green_duration
+    lit = GROUP_LANES[green_group] if green_light is not None else ()
+    for lane, (light, frame) in enumerate(zip(lane_lights, lane_frames)):
+        if lane in lit:
+            light.show(color)
+            render.set(frame, bg=frame_bg)
         else:
-            stats["lane2_total_green"] += current_green_duration
+            light.show("red")
+            render.set(frame, bg="#3a1a1a")
 
-        last_green_light = latest_data["green_light"]
-
-        print(f"🔄 NEW CYCLE {stats['total_cycles']}: {latest_data['green_light']} gets {current_green_duration}s")
-
-    # ===== TRAFFIC LIGHTS =====
-    if latest_data["green_light"] == "Lane 1":
-        draw_traffic_light(lane1_light_canvas, "green")
-        draw_traffic_light(lane2_light_canvas, "red")
-        lane1_frame.config(bg="#1a3a1a")
-        lane2_frame.config(bg="#3a1a1a")
+    if phase == "YELLOW":
+        render.set(green_light_label, text=f"{green_light} (yellow)")
+    elif phase == "ALL_RED":
+        render.set(green_light_label, text=f"All red → {green_light}")
     else:
-        draw_traffic_light(lane1_light_canvas, "red")
-        draw_traffic_light(lane2_light_canvas, "green")
-        lane1_frame.config(bg="#3a1a1a")
-        lane2_frame.config(bg="#1a3a1a")
-
-    green_light_label.config(text=latest_data["green_light"])
+        render.set(green_light_label, text=green_light)
 
     # ===== ACCURATE COUNTDOWN TIMER =====
-    if green_light_start_time is not None:
+    if signal["ends_at"] is not None:
+        # The cloud sends what is left of the green (or of the yellow / all-red)
+        remaining_time = max(0, signal["ends_at"] - time.time())
+        if phase == "YELLOW":
+            render.set(duration_label, text=f"🟡 Yellow {remaining_time:.1f} s")
+            total = YELLOW_TIME
+        elif phase == "ALL_RED":
+            render.set(duration_label, text=f"🔴 All red {remaining_time:.1f} s")
+            total = ALL_RED_TIME
+        else:
+            render.set(duration_label, text=f"{remaining_time:.1f} / {current_green_duration} seconds")
+            total = current_green_duration
+        render.set(duration_progress, value=min(100, round(remaining_time / total * 100)) if total > 0 else 0)
+
+    elif green_light_start_time is not None:
         # Calculate how much time has ELAPSED since green light started
         elapsed_time = time.time() - green_light_start_time
 
@@ -277,44 +514,55 @@ def update_dashboard():
         remaining_time = max(0, remaining_time)
 
         # Display countdown
-        duration_label.config(text=f"{remaining_time:.1f} / {current_green_duration} seconds")
+        render.set(duration_label, text=f"{remaining_time:.1f} / {current_green_duration} seconds")
 
         # Update progress bar
         if current_green_duration > 0:
-            progress = (remaining_time / current_green_duration) * 100
-            duration_progress['value'] = progress
+            progress = round(remaining_time / current_green_duration * 100)
+            render.set(duration_progress, value=progress)
         else:
-            duration_progress['value'] = 0
+            render.set(duration_progress, value=0)
 
     # ===== EMERGENCY HANDLING =====
-    # Only count emergency ONCE per event (when it changes from 0 to 1)
-    if latest_data["emergency"] == 1 and last_emergency_status == 0:
-        stats["emergency_events"] += 1
-        play_ambulance_sound()
-        print(f"🚨 EMERGENCY EVENT #{stats['emergency_events']}: {latest_data['emergency_lane']}")
-
-    last_emergency_status = latest_data["emergency"]
-
-    if latest_data["emergency"] == 1:
-        emergency_status_label.config(text="🚨 ACTIVE", fg="#ff0000")
-        emergency_action_label.config(text=f"→ Green given to {latest_data['emergency_lane']}")
-        emergency_frame.config(bg="#661a1a")
+    # (events are counted in track_events())
+    if emergency == 1:
+        render.set(emergency_status_label, text="🚨 ACTIVE", fg="#ff0000")
+        render.set(emergency_action_label, text=f"→ Green given to {emergency_group}" if emergency_group == emergency_lane
+                   else f"→ Green given to {emergency_group} ({emergency_lane})")
+        render.set(emergency_frame, bg="#661a1a")
     else:
-        emergency_status_label.config(text="✓ NONE", fg="#00ff00")
-        emergency_action_label.config(text="No emergency vehicles")
-        emergency_frame.config(bg="#3a1a1a")
+        render.set(emergency_status_label, text="✓ NONE", fg="#00ff00")
+        render.set(emergency_action_label, text="No emergency vehicles")
+        render.set(emergency_frame, bg="#3a1a1a")
 
     # ===== UPDATE STATISTICS LABELS =====
-    cycle_count_label.config(text=str(stats["total_cycles"]))
-    emergency_count_label.config(text=str(stats["emergency_events"]))
-    lane1_green_label.config(text=f"{stats['lane1_total_green']}s")
-    lane2_green_label.config(text=f"{stats['lane2_total_green']}s")
+    render.set(cycle_count_label, text=str(stats["total_cycles"]))
+    render.set(emergency_count_label, text=str(stats["emergency_events"]))
+    for key, label in zip(GREEN_STAT_KEYS, group_green_labels):
+        render.set(label, text=f"{stats[key]}s")
 
     # ===== TIMESTAMP =====
-    time_label.config(text=f"Last Update: {datetime.now().strftime('%H:%M:%S')}")
+    # (with the previous frame's time and widget updates)
+    render.set(time_label, text=f"Last Update: {datetime.now().strftime('%H:%M:%S')} · "
+                                f"frame {frame_time['seconds'] * 1000:.1f} ms, {frame_time['updates']} updates")
+
+    # ===== TREND CHARTS =====
+    # Only the points added since the last frame (everything after a tier change)
+    level = trend_level.get()
+    chart_calls = sum(spark.update(history.level(level), channel) for spark, history, channel in sparklines)
+
+    # ===== APPLY CHANGES =====
+    updates = render.flush() + chart_calls
+    frame_time["updates"] = updates
+    metric["flush"].record(render.frame_seconds)
+    metric["updates"].inc(updates)
+    metric["frame_updates"].set(updates)
+    frame_time["seconds"] = time.perf_counter() - render_started
+    metric["render"].record(frame_time["seconds"])
 
     # Schedule next update (fast refresh for smooth countdown)
-    root.after(500, update_dashboard)  # Update every 500ms for smooth countdown
+    # (sooner while a burst is still queued)
+    root.after(10 if inbox else 500, update_dashboard)  # Update every 500ms for smooth countdown
 
 
 
@@ -324,8 +572,9 @@ print("Dashboard started...")
 print("\nDASHBOARD FEATURES:")
 print("  ✓ Real-time countdown timer (accurate)")
 print("  ✓ Synchronized with actual green light duration")
-print("  ✓ Total cycles = number of lane changes")
+print("  ✓ Total cycles = number of new greens (real phase changes)")
 print("  ✓ Emergency event tracking")
-print("  ✓ Total green time per lane")
+print("  ✓ Total green time per phase group")
+print("  ✓ Trend charts (raw / downsampled history, constant memory)")
 print()
 root.mainloop()
\ No newline at end of file
@@ -0,0 +1,149 @@
+# delta.py - DELTA-ENCODED PUBLISHING WITH KEYFRAMES AND RESYNC
+
+"""
+Delta mode for summaries / decisions (SUMMARY_DELTA_MODE in config.py)
+
+Publisher side (DeltaPublisher), per topic:
+- a KEYFRAME carries every field, plus "seq", "src" and "kf": 1
+- a DELTA carries only the fields that changed since the previous message,
+  plus "seq" and "src"
+- nothing is published when only volatile fields (timestamps, counters)
+  changed; they ride along with the next real change or keyframe
+- a keyframe is sent every DELTA_KEYFRAME_INTERVAL messages, or on request
+
+Subscriber side (DeltaTracker), per (topic, src):
+- applies keyframes, and deltas whose seq is exactly last seq + 1
+- on a gap (or a delta before any keyframe) drops the message and returns a
+  resync request to publish on TOPIC_RESYNC; the publisher answers with a
+  keyframe on that topic
+- messages without "seq" (delta mode off) are always applied
+
+Deltas are partial dicts: apply them with LaneStore.update_from_summary(),
+which only touches the fields present.
+"""
+
+import time
+
+from config import DELTA_KEYFRAME_INTERVAL, DELTA_RESYNC_INTERVAL
+
+SEQ = "seq"
+KEYFRAME = "kf"
+SOURCE = "src"
+
+# Change every message but carry no state of their own
+VOLATILE_FIELDS = ("timestamp", "sensor_ts", "messages_processed", "sensor_mismatches_detected")
+
+
+class DeltaPublisher:
+
+    def __init__(self, source, keyframe_interval=DELTA_KEYFRAME_INTERVAL, volatile=VOLATILE_FIELDS):
+        self.source = source
+        self.keyframe_interval = keyframe_interval
+        self.volatile = frozenset(volatile)
+        self._streams = {}      # topic -> {"seq", "last", "since_keyframe", "keyframe_due"}
+        self.stats = {
+            "keyframes": 0,
+            "deltas": 0,
+            "unchanged": 0,
+            "fields_sent": 0,
+            "fields_total": 0
+        }
+
+    def encode(self, topic, message):
+        """Message to publish on `topic` (keyframe or delta), or None if nothing changed"""
+        stream = self._streams.get(topic)
+        if stream is None:
+            stream = {"seq": 0, "last": None, "since_keyframe": 0, "keyframe_due": True}
+            self._streams[topic] = stream
+
+        self.stats["fields_total"] += len(message)
+
+        if stream["keyframe_due"] or stream["since_keyframe"] >= self.keyframe_interval:
+            out = dict(message)
+            out[KEYFRAME] = 1
+            stream["since_keyframe"] = 0
+            stream["keyframe_due"] = False
+            self.stats["keyframes"] += 1
+        else:
+            last = stream["last"]
+            out = {key: value for key, value in message.items()
+                   if key not in last or last[key] != value}
+            if all(key in self.volatile for key in out):
+                self.stats["unchanged"] += 1
+                return None
+            self.stats["deltas"] += 1
+
+        self.stats["fields_sent"] += len(out)
+        stream["seq"] += 1
+        stream["since_keyframe"] += 1
+        stream["last"] = message
+        out[SEQ] = stream["seq"]
+        out[SOURCE] = self.source
+        return out
+
+    def request_keyframe(self, topic):
+        """Next message on `topic` will be a keyframe (answer to a resync request)"""
+        stream = self._streams.get(topic)
+        if stream is not None:
+            stream["keyframe_due"] = True
+
+    def handle_resync(self, request):
+        """Apply a resync request received on TOPIC_RESYNC; True if it was for us"""
+        if request.get(SOURCE) != self.source:
+            return False
+        self.request_keyframe(request.get("topic"))
+        return True
+
+    def savings(self):
+        """Share of fields not sent thanks to delta encoding (0-1)"""
+        if self.stats["fields_total"] == 0:
+            return 0.0
+        return 1 - self.stats["fields_sent"] / self.stats["fields_total"]
+
+
+class DeltaTracker:
+
+    def __init__(self, resync_interval=DELTA_RESYNC_INTERVAL):
+        self.resync_interval = resync_interval
+        self._last_seq = {}         # (topic, src) -> seq, None = waiting for a keyframe
+        self._last_request = {}     # (topic, src) -> monotonic time of the last resync request
+        self.gaps = 0
+
+    def check(self, topic, message):
+        """
+        (apply?, resync request or None) for a received message
+
+        The caller applies the message if apply? is True, and publishes the
+        resync request (if any) to TOPIC_RESYNC.
+        """
+        seq = message.get(SEQ)
+        if seq is None:
+            return True, None
+
+        stream = (topic, message.get(SOURCE))
+        last = self._last_seq.get(stream)
+
+        if message.get(KEYFRAME):
+            self._last_seq[stream] = seq
+            return True, None
+
+        if last is not None and seq == last + 1:
+            self._last_seq[stream] = seq
+            return True, None
+
+        if last is not None and seq <= last:
+            return False, None    # duplicate / redelivered
+
+        # Gap (or no keyframe yet): wait for a keyframe
+        if last is not None:
+            self.gaps += 1
+        self._last_seq[stream] = None
+        return False, self._resync_request(stream)
+
+    def _resync_request(self, stream):
+        now = time.monotonic()
+        if now - self._last_request.get(stream, -self.resync_interval) < self.resync_interval:
+            return None
+        self._last_request[stream] = now
+        topic, source = stream
+        return {"topic": topic, SOURCE: source}
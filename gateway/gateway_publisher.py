@@ -1,4 +1,3 @@
-
 """
 
 This gateway:
@@ -6,9 +5,35 @@ This gateway:
 2. Validates data between the two sensors
 3. Calculates confidence scores
 4. Publishes enhanced summary with both sensor types
+
+Publishing modes (GATEWAY_MODE in config.py, or --mode):
+- polling: validate and publish every PUBLISH_INTERVAL
+- event:   publish as soon as something changes (ordinary changes are
+           coalesced for GATEWAY_COALESCE_WINDOW), emergencies immediately
+
+Many intersections:
+- sensors publish to traffic/sensors/<intersection>/<lane1|lane2|...|emergency>
+  and the gateway subscribes with wildcards (or per owned intersection)
+- state for every intersection lives in one indexed LaneStore, and
+  validation / confidence scoring have batch forms over its columns
+- --workers N shards intersections across N processes by consistent hashing
+
+Lanes come from the intersection model (intersection.py): readings are
+stored by lane index and summaries carry one array entry per lane
+("ir", "vehicles", "confidence").
+
+Synthetic load (--generate SECONDS, with --intersections):
+- every SECONDS a tick of sensors/traffic_generator.py is loaded into the
+  store as arrays (LaneStore.load_tick), without per-message decoding
+
+Delta mode (SUMMARY_DELTA_MODE in config.py, or --delta):
+- only the fields that changed are published, with periodic keyframes and
+  sequence numbers (delta.py); resync requests on TOPIC_RESYNC are answered
+  with a keyframe
 """
 
-import json
+import argparse
+import threading
 import time
 import paho.mqtt.client as mqtt
 import sys
@@ -17,314 +42,650 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 try:
-    from config import (BROKER, PORT, TOPIC_LANE_1, TOPIC_LANE_2, TOPIC_RFID,
-                        TOPIC_SUMMARY, PUBLISH_INTERVAL)
+    from config import (BROKER, PORT, TOPIC_SUMMARY, PUBLISH_INTERVAL, GATEWAY_MODE,
+                        GATEWAY_COALESCE_WINDOW, GATEWAY_HEARTBEAT_INTERVAL,
+                        LEGACY_INTERSECTION, SUMMARY_DELTA_MODE, TOPIC_RESYNC)
 except ImportError:
     BROKER = "broker.hivemq.com"
     PORT = 1883
-    TOPIC_LANE_1 = "traffic/lane1"
-    TOPIC_LANE_2 = "traffic/lane2"
-    TOPIC_RFID = "traffic/emergency"
     TOPIC_SUMMARY = "traffic/summary"
     PUBLISH_INTERVAL = 1
-
-# Store latest sensor data
-lane_data = {
-    "Lane 1": {
-        "IR": 0,   #0 or 1 (vehicle presence)
-        "Ultrasonic": 0  # 0-20 (vehicle count)
-    },
-    "Lane 2": {
-        "IR": 0,  #  0 or 1 (vehicle presence)
-        "Ultrasonic": 0  # 0-20 (vehicle count)
-    },
-    "Emergency": 0,
-    "Emergency_Lane": None
-}
+    GATEWAY_MODE = "polling"
+    GATEWAY_COALESCE_WINDOW = 0.2
+    GATEWAY_HEARTBEAT_INTERVAL = 10
+    LEGACY_INTERSECTION = "main"
+    SUMMARY_DELTA_MODE = False
+    TOPIC_RESYNC = "traffic/resync"
+
+from delta import DeltaPublisher
+from metrics import expose_dict, gauge, histogram, start_metrics
+from structured_log import DEBUG, INFO, flush as flush_log, get_logger
+from intersection import LANES, group_counts, group_name, group_of_lane
+from lane_store import LaneStore, lane_index, lane_name
+from scoring import confidence_percent, count_warnings, describe_warnings, validate
+from sharding import Shard, run_workers, subscribe_in_chunks
+from sensors.traffic_generator import TrafficGenerator
+from wire_format import decode, encode_for_client
+from topics import (CHANNEL_EMERGENCY, CHANNEL_LANE, LEGACY_SENSOR_TOPICS,
+                    parse_sensor_topic, sensor_subscriptions, summary_topic)
+
+# Store latest sensor data (one row per intersection)
+store = LaneStore()
+LEGACY_ROW = store.row(LEGACY_INTERSECTION)
+
+# Which intersections this process serves (sharding.py)
+shard = Shard()
+foreign = set()     # intersections seen on a wildcard but owned by another shard
 
 # Statistics
 stats = {
     "messages_received": 0,
     "sensor_mismatches": 0,
-    "data_validations": 0
+    "data_validations": 0,
+    "summaries_published": 0,
+    "foreign_dropped": 0
+}
+
+# Rows with readings not yet published in a summary (event mode)
+pending = {
+    "dirty": {},            # row -> (monotonic time of oldest change, its sensor send time)
+    "urgent": False         # emergency -> publish without waiting
+}
+state_changed = threading.Condition()
+
+# Start-up: ready once every SUBSCRIBE is acknowledged (the supervisor waits for
+# the "ready" log event); the first sensor change ends the first polling wait
+startup = {
+    "subacks": set(),
+    "ready": threading.Event(),
+    "first_reading": threading.Event()
+}
+
+# Metrics (metrics.py): stats above plus hot-path timings
+expose_dict(stats, "gateway_")
+metric = {
+    "on_message": histogram("gateway_on_message_seconds", "Time to handle one sensor message"),
+    "decode": histogram("gateway_decode_seconds", "Time to decode one sensor payload"),
+    "summary": histogram("gateway_summary_seconds", "Time to validate, score and build one summary"),
+    "publish": histogram("gateway_publish_seconds", "Time to encode and publish one summary"),
+    "latency": histogram("gateway_sensor_to_summary_seconds", "Sensor reading -> summary published")
 }
+gauge("gateway_intersections", "Intersections served by this process", lambda: len(store))
+gauge("gateway_pending_changes", "Intersections with unpublished changes", lambda: len(pending["dirty"]))
+
+# Delta encoder per summary topic (None = publish full summaries)
+deltas = {"publisher": None}
 
 client = mqtt.Client(client_id="smart_traffic_gateway")
+log = get_logger("gateway")
 
 
 def on_connect(client, userdata, flags, rc):
     """Connect to broker and subscribe to all topics"""
     if rc == 0:
-        print("✅ Gateway connected to MQTT broker")
-        # Subscribe to all sensor topics
-        client.subscribe([(TOPIC_LANE_1, 0),
-                          (TOPIC_LANE_2, 0),
-                          (TOPIC_RFID, 1)])
-        print(f"   Subscribed to: {TOPIC_LANE_1}")
-        print(f"   Subscribed to: {TOPIC_LANE_2}")
-        print(f"   Subscribed to: {TOPIC_RFID}")
-    else:
-        print(f"❌ Connection failed: {rc}")
+        log.info("connected", "✅ Gateway connected to MQTT broker")
 
+        subscriptions = []
+        if shard.owns(LEGACY_INTERSECTION):
+            subscriptions += sensor_subscriptions(LEGACY_INTERSECTION)
 
-def calculate_confidence_score(lane_name):
-    """
-    Calculate confidence in data based on IR and Ultrasonic agreement
+        if shard.intersections is None:
+            subscriptions += sensor_subscriptions("+")
+        else:
+            for intersection in shard.owned():
+                if intersection != LEGACY_INTERSECTION:
+                    subscriptions += sensor_subscriptions(intersection)
 
-    Returns confidence score 0-100%
-    """
-    ir = lane_data[lane_name]["IR"]
-    us = lane_data[lane_name]["Ultrasonic"]
+        if deltas["publisher"] is not None:
+            subscriptions.append((TOPIC_RESYNC, 1))
 
-    # Perfect agreement: both say no vehicles
-    if ir == 0 and us == 0:
-        return 100  # 100% confident
+        startup["subacks"].update(subscribe_in_chunks(client, subscriptions))
 
-    # Perfect agreement: both say yes vehicles
-    elif ir == 1 and us > 0:
-        return 100  # 100% confident
+        shown = ", ".join(topic for topic, _ in subscriptions[:6])
+        more = f" ... and {len(subscriptions) - 6} more topics" if len(subscriptions) > 6 else ""
+        log.info("subscribed", f"   Subscribed to: {shown}{more}", topics=len(subscriptions))
+        if not subscriptions:
+            on_subscribe(client, userdata, None, ())
+    else:
+        log.error("connect_failed", f"❌ Connection failed: {rc}", rc=rc)
 
-    # Mismatch: IR says yes, count says no
-    elif ir == 1 and us == 0:
-        # Could be a single vehicle at detection point
-        # Confidence: medium
-        return 50  # 50% confident
 
-    # Mismatch: IR says no, count says yes
-    elif ir == 0 and us > 0:
-        # Could be vehicles past IR detection point
-        # Confidence: high (trust ultrasonic)
-        return 75  # 75% confident
+def on_subscribe(client, userdata, mid, granted_qos):
+    """Ready once the broker has acknowledged every subscription"""
+    startup["subacks"].discard(mid)
+    if not startup["subacks"]:
+        startup["ready"].set()
+        log.info("ready", "✅ Gateway ready", intersections=len(store))
 
+
+def wait_for_interval():
+    """Sleep PUBLISH_INTERVAL, but wake on the first sensor change (faster cold start)"""
+    if startup["first_reading"].is_set():
+        time.sleep(PUBLISH_INTERVAL)
     else:
-        return 50  # Default
+        startup["first_reading"].wait(PUBLISH_INTERVAL)
+
+
+def calculate_confidence_score(lane_name, row=LEGACY_ROW):
+    """
+    Calculate confidence in data based on IR and Ultrasonic agreement
+
+    Returns confidence score 0-100% (rules in scoring.py)
+    """
+    lane = lane_index(lane_name)
+    return confidence_percent(store.get_ir(row, lane), store.get_count(row, lane))
 
 
-def validate_sensor_data(lane_name):
+def validate_sensor_data(lane_name, row=LEGACY_ROW):
     """
     Validate IR and Ultrasonic data match
-    Returns validation status and any warnings
+    Returns printable warnings (use validate_all_sensor_data for codes)
     """
-    ir = lane_data[lane_name]["IR"]
-    us = lane_data[lane_name]["Ultrasonic"]
-    warnings = []
+    lane = lane_index(lane_name)
+    us = store.get_count(row, lane)
+    code = validate(store.get_ir(row, lane), us)
+    return [f"⚠️  {warning}" for warning in describe_warnings(code, lane_name, us)]
 
-    # Check for mismatches
-    if ir == 1 and us == 0:
-        warnings.append(f"⚠️  {lane_name}: IR detects vehicle but count=0")
-        # Likely 1 vehicle at detection point
 
-    if ir == 0 and us > 0:
-        warnings.append(f"⚠️  {lane_name}: Count={us} but IR detects nothing")
-        # Vehicles past detection point
+def calculate_confidence_scores():
+    """
+    Batch form of calculate_confidence_score for every lane of every intersection
 
-    if us > 20:
-        warnings.append(f"⚠️  {lane_name}: Ultrasonic count exceeds max (20)")
+    Stores the scores in the store's confidence column and returns it
+    """
+    confidence = store.column("confidence")
+    confidence[:] = confidence_percent(store.column("ir"), store.column("vehicle_count"))
+    return confidence
 
-    return warnings
+
+def validate_all_sensor_data():
+    """
+    Batch form of validate_sensor_data
+
+    Returns the warning codes of every lane of every intersection
+    """
+    return validate(store.column("ir"), store.column("vehicle_count"))
+
+
+def mark_changed(row, sent_at, urgent=False):
+    """Record an unpublished change and wake the event-driven loop"""
+    with state_changed:
+        if row not in pending["dirty"]:
+            pending["dirty"][row] = (time.monotonic(), sent_at)
+        pending["urgent"] = pending["urgent"] or urgent
+        state_changed.notify()
+    startup["first_reading"].set()
+
+
+def load_tick(tick, rows):
+    """Readings of a whole TrafficTick (traffic_generator.py) for the given rows at once"""
+    store.load_tick(tick, rows)
+    now = time.monotonic()
+    with state_changed:
+        for row in rows:
+            if row not in pending["dirty"]:
+                pending["dirty"][row] = (now, tick.timestamp)
+        pending["urgent"] = pending["urgent"] or bool(tick.emergency.any())
+        state_changed.notify()
+    startup["first_reading"].set()
+
+
+def run_generator(interval, seed=None):
+    """--generate: a generator tick for every owned declared intersection every `interval` seconds"""
+    rows = [store.index[intersection] for intersection in shard.owned()
+            if intersection != LEGACY_INTERSECTION]
+    generator = TrafficGenerator(len(rows), store.n_lanes, seed=seed, interval=interval)
+    next_tick = time.monotonic()
+    while True:
+        load_tick(generator.tick(), rows)
+        next_tick += interval
+        time.sleep(max(0.0, next_tick - time.monotonic()))
 
 
 def on_message(client, userdata, msg):
     """Process incoming MQTT messages from sensors"""
-    global lane_data, stats
+    if msg.topic == TOPIC_RESYNC:
+        if deltas["publisher"] is not None:
+            deltas["publisher"].handle_resync(decode(msg.payload))
+        return
 
     stats["messages_received"] += 1
+    started = time.perf_counter()
 
     try:
-        payload = json.loads(msg.payload.decode())
+        located = parse_sensor_topic(msg.topic)
+        if located is None:
+            return
+        intersection, channel = located
+
+        # ===== FIND THE INTERSECTION'S ROW =====
+        row = store.index.get(intersection)
+        if row is None:
+            if intersection in foreign or not shard.owns(intersection):
+                foreign.add(intersection)
+                stats["foreign_dropped"] += 1
+                return
+            row = store.row(intersection)
+
+        decode_started = time.perf_counter()
+        payload = decode(msg.payload)
+        metric["decode"].record(time.perf_counter() - decode_started)
+        sent_at = payload.get("sent_at", time.time())
+        # Readings of the original intersection at INFO, the others at DEBUG
+        level = INFO if msg.topic in LEGACY_SENSOR_TOPICS else DEBUG
+        verbose = log.enabled(level)
+
+        # ===== UPDATE LANE DATA =====
+        lane = CHANNEL_LANE.get(channel)
+        if lane is not None:
 
-        # ===== UPDATE LANE 1 DATA =====
-        if msg.topic == TOPIC_LANE_1:
             if payload["sensor"] == "IR":
-                lane_data["Lane 1"]["IR"] = payload["vehicle_detected"]
-                print(f"   📡 Lane 1 IR: {payload['vehicle_detected']}")
+                changed = store.set_ir(row, lane, payload["vehicle_detected"], sent_at)
+                if verbose:
+                    log.log(level, "sensor_reading", f"   📡 {lane_name(lane)} IR: {payload['vehicle_detected']}",
+                            key=msg.topic + "/ir", intersection=intersection, lane=lane_name(lane),
+                            sensor="IR", value=payload["vehicle_detected"])
 
             elif payload["sensor"] == "Ultrasonic":
-                lane_data["Lane 1"]["Ultrasonic"] = payload["vehicle_count"]
-                print(f"   📊 Lane 1 Count: {payload['vehicle_count']}")
+                changed = store.set_count(row, lane, payload["vehicle_count"], sent_at)
+                if verbose:
+                    log.log(level, "sensor_reading", f"   📊 {lane_name(lane)} Count: {payload['vehicle_count']}",
+                            key=msg.topic + "/ultrasonic", intersection=intersection, lane=lane_name(lane),
+                            sensor="Ultrasonic", value=payload["vehicle_count"])
 
+            else:
+                changed = False
 
-        elif msg.topic == TOPIC_LANE_2:
-            if payload["sensor"] == "IR":
-                lane_data["Lane 2"]["IR"] = payload["vehicle_detected"]
-                print(f"   📡 Lane 2 IR: {payload['vehicle_detected']}")
+            if changed:
+                mark_changed(row, sent_at)
 
-            elif payload["sensor"] == "Ultrasonic":
-                lane_data["Lane 2"]["Ultrasonic"] = payload["vehicle_count"]
-                print(f"   📊 Lane 2 Count: {payload['vehicle_count']}")
 
+        elif channel == CHANNEL_EMERGENCY:
+            changed = store.set_emergency(row, payload["emergency"],
+                                          lane_index(payload.get("emergency_lane")))
 
-        elif msg.topic == TOPIC_RFID:
-            lane_data["Emergency"] = payload["emergency"]
-            lane_data["Emergency_Lane"] = payload.get("emergency_lane")
+            if payload["emergency"] == 1 and verbose:
+                log.log(level, "emergency", f"   🚨 EMERGENCY in {payload.get('emergency_lane')}!",
+                        key=msg.topic, intersection=intersection, lane=payload.get("emergency_lane"))
 
-            if payload["emergency"] == 1:
-                print(f"   🚨 EMERGENCY in {payload.get('emergency_lane')}!")
+            # Emergencies (and their end) never wait for the coalescing window
+            if changed or payload["emergency"] == 1:
+                mark_changed(row, sent_at, urgent=True)
 
     except Exception as e:
-        print(f"❌ Error parsing message: {e}")
-
-
-def calculate_green_light():
-    """Decide which lane gets green light (preliminary decision at gateway)"""
-    if lane_data["Emergency"] == 1 and lane_data["Emergency_Lane"]:
-        return lane_data["Emergency_Lane"]
-
-    if lane_data["Lane 1"]["Ultrasonic"] >= lane_data["Lane 2"]["Ultrasonic"]:
-        return "Lane 1"
-    else:
-        return "Lane 2"
-
-
-# Set callbacks
-client.on_connect = on_connect
-client.on_message = on_message
-
-# Connect
-try:
-    client.connect(BROKER, PORT, 60)
-    client.loop_start()
-except Exception as e:
-    print(f"❌ Failed to connect: {e}")
-    sys.exit(1)
-
-print("\n" + "=" * 70)
-print("🌐 SMART TRAFFIC GATEWAY STARTED")
-print("=" * 70)
-print("Features:")
-print("  ✅ IR Sensor Integration")
-print("  ✅ Ultrasonic Sensor Integration")
-print("  ✅ Data Validation")
-print("  ✅ Confidence Scoring")
-print("  ✅ Sensor Mismatch Detection")
-print("=" * 70 + "\n")
-
-# Wait for initial connection
-time.sleep(2)
-
-# Main gateway loop
-iteration = 0
-
-while True:
-    iteration += 1
-
-    try:
-        # ===== VALIDATE SENSOR DATA =====
-
-        print(f"\n{'=' * 70}")
-        print(f"📊 GATEWAY ITERATION {iteration}")
-        print(f"{'=' * 70}")
-
-        # Check Lane 1
-        lane1_warnings = validate_sensor_data("Lane 1")
-        if lane1_warnings:
-            for warning in lane1_warnings:
-                print(warning)
-                stats["sensor_mismatches"] += 1
-        else:
-            print("✅ Lane 1: Data validated successfully")
-
-        # Check Lane 2
-        lane2_warnings = validate_sensor_data("Lane 2")
-        if lane2_warnings:
-            for warning in lane2_warnings:
-                print(warning)
-                stats["sensor_mismatches"] += 1
-        else:
-            print("✅ Lane 2: Data validated successfully")
-
-        # ===== CALCULATE CONFIDENCE SCORES =====
-
-        print(f"\n{'─' * 70}")
-        print("📈 CONFIDENCE SCORES")
-        print(f"{'─' * 70}")
+        log.error("bad_message", f"❌ Error parsing message: {e}", key="bad_message", topic=msg.topic, error=str(e))
 
-        lane1_confidence = calculate_confidence_score("Lane 1")
-        lane2_confidence = calculate_confidence_score("Lane 2")
+    metric["on_message"].record(time.perf_counter() - started)
 
-        print(f"  Lane 1: {lane1_confidence}% confident")
-        print(f"    → IR={lane_data['Lane 1']['IR']}, Count={lane_data['Lane 1']['Ultrasonic']}")
 
-        print(f"  Lane 2: {lane2_confidence}% confident")
-        print(f"    → IR={lane_data['Lane 2']['IR']}, Count={lane_data['Lane 2']['Ultrasonic']}")
+def calculate_green_light(row=LEGACY_ROW):
+    """Decide which phase group gets green light (preliminary decision at gateway)"""
+    emergency_lane = int(store.emergency_lane[row])
+    if store.emergency[row] == 1 and emergency_lane >= 0:
+        return group_name(int(group_of_lane(emergency_lane)))
 
-        # ===== PREPARE ENHANCED SUMMARY =====
+    # Most vehicles waiting, first group on ties
+    waiting = group_counts(store.vehicle_count[row]).tolist()
+    return group_name(waiting.index(max(waiting)))
 
-        green_light = calculate_green_light()
 
-        summary = {
-            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+def build_summary(confidence, sensor_ts=None, row=LEGACY_ROW):
+    """Enhanced summary published to the intersection's summary topic (confidence: % per lane)"""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "intersection": store.ids[row],
 
-            # IR Sensor Data (NEW)
-            "lane1_ir": lane_data["Lane 1"]["IR"],
-            "lane2_ir": lane_data["Lane 2"]["IR"],
+        # Per lane, by lane index: IR, Ultrasonic and confidence
+        "ir": store.ir[row].tolist(),
+        "vehicles": store.vehicle_count[row].tolist(),
+        "confidence": confidence,
+        "average_confidence": sum(confidence) / len(confidence),
 
-            # Ultrasonic Sensor Data
-            "lane1_vehicles": lane_data["Lane 1"]["Ultrasonic"],
-            "lane2_vehicles": lane_data["Lane 2"]["Ultrasonic"],
+        # Emergency Data
+        "emergency": int(store.emergency[row]),
+        "emergency_lane": lane_name(int(store.emergency_lane[row])),
 
-            # Confidence Scores (NEW)
-            "lane1_confidence": lane1_confidence,
-            "lane2_confidence": lane2_confidence,
-            "average_confidence": (lane1_confidence + lane2_confidence) / 2,
+        # Preliminary Decision
+        "green_light": calculate_green_light(row),
 
-            # Emergency Data
-            "emergency": lane_data["Emergency"],
-            "emergency_lane": lane_data["Emergency_Lane"],
+        # Send time of the oldest sensor reading in this summary
+        "sensor_ts": sensor_ts,
 
-            # Preliminary Decision
-            "green_light": green_light,
+        "messages_processed": stats["messages_received"],
+        "sensor_mismatches_detected": stats["sensor_mismatches"]
+    }
 
 
-            "messages_processed": stats["messages_received"],
-            "sensor_mismatches_detected": stats["sensor_mismatches"]
-        }
+def summarize(row):
+    """Validate, score and build the summary of one intersection"""
+    started = time.perf_counter()
+    ir = store.ir[row]
+    us = store.vehicle_count[row]
+    stats["sensor_mismatches"] += count_warnings(validate(ir, us))
 
+    summary = build_summary(confidence_percent(ir, us).tolist(), latest_sensor_ts(row), row)
+    metric["summary"].record(time.perf_counter() - started)
+    return summary
 
 
-        print(f"\n{'─' * 70}")
-        print("📤 PUBLISHING SUMMARY")
-        print(f"{'─' * 70}")
-
-        result = client.publish(TOPIC_SUMMARY, json.dumps(summary), qos=1)
-
-        if result.rc == mqtt.MQTT_ERR_SUCCESS:
-            print(f"✅ Summary published successfully")
-            print(f"   Green Light (preliminary): {green_light}")
-            print(f"   Confidence: {summary['average_confidence']:.0f}%")
-        else:
-            print(f"❌ Failed to publish: {result.rc}")
-
-        # ===== STATISTICS =====
-
-        print(f"\n{'─' * 70}")
-        print("📊 GATEWAY STATISTICS")
-        print(f"{'─' * 70}")
-        print(f"  Iterations: {iteration}")
-        print(f"  Messages Processed: {stats['messages_received']}")
-        print(f"  Sensor Mismatches Detected: {stats['sensor_mismatches']}")
+def publish_summary(summary, fresh=True):
+    """
+    Publish a summary and record the sensor -> summary latency
 
-        time.sleep(PUBLISH_INTERVAL)
+    fresh = the summary carries a new reading (heartbeats and unchanged rows
+    keep their last sensor_ts and are not counted in the latency).
+    Returns None in delta mode when nothing changed (nothing is published).
+    """
+    started = time.perf_counter()
+    topic = summary_topic(summary["intersection"])
+    message = summary
+    if deltas["publisher"] is not None:
+        message = deltas["publisher"].encode(topic, summary)
+        if message is None:
+            return None
+    result = client.publish(topic, encode_for_client(client, topic, message), qos=1)
+    metric["publish"].record(time.perf_counter() - started)
+
+    if result.rc == mqtt.MQTT_ERR_SUCCESS:
+        stats["summaries_published"] += 1
+        if fresh and summary["sensor_ts"] is not None:
+            metric["latency"].record(max(0.0, time.time() - summary["sensor_ts"]))
+    return result
+
+
+def take_pending():
+    """{row: sensor_ts} of every unpublished change, clearing them (the send times stay in store.sensor_ts)"""
+    with state_changed:
+        dirty = pending["dirty"]
+        pending["dirty"] = {}
+        pending["urgent"] = False
+    for row, (_, sensor_ts) in dirty.items():
+        store.sensor_ts[row] = sensor_ts
+    return {row: sensor_ts for row, (_, sensor_ts) in dirty.items()}
+
+
+def latest_sensor_ts(row):
+    """Send time behind the latest change of a row taken by take_pending() (None before the first)"""
+    sensor_ts = float(store.sensor_ts[row])
+    return None if sensor_ts != sensor_ts else sensor_ts
+
+
+def latency_report():
+    """avg / p95 / max of sensor -> summary latencies (ms)"""
+    latency = metric["latency"]
+    if latency.count == 0:
+        return "no samples yet"
+    return (f"avg {latency.mean() * 1000:.1f} ms, p95 {latency.percentile(0.95) * 1000:.1f} ms, "
+            f"max {latency.max * 1000:.1f} ms ({latency.count} summaries)")
+
+
+def poll_once(iteration):
+    """One polling iteration: validate and publish a summary for every intersection"""
+    changed = take_pending()
+
+    # Many intersections: score all lanes at once, one line per iteration
+    if len(store) > 1:
+        stats["sensor_mismatches"] += count_warnings(validate_all_sensor_data())
+        confidence = calculate_confidence_scores()
+
+        published = 0
+        for row in range(len(store)):
+            started = time.perf_counter()
+            summary = build_summary(confidence[row].tolist(), latest_sensor_ts(row), row)
+            metric["summary"].record(time.perf_counter() - started)
+            result = publish_summary(summary, fresh=row in changed)
+            if result is not None and result.rc == mqtt.MQTT_ERR_SUCCESS:
+                published += 1
+        log.info("iteration", f"📤 Iteration {iteration}: {published}/{len(store)} summaries published | "
+                              f"messages {stats['messages_received']} | latency {latency_report()}",
+                 iteration=iteration, published=published, intersections=len(store),
+                 messages=stats["messages_received"])
+        return
+
+    # ===== VALIDATE SENSOR DATA =====
+
+    for lane in LANES:
+        for warning in validate_sensor_data(lane):
+            log.warning("sensor_mismatch", warning, key=f"mismatch:{lane}", lane=lane)
+            stats["sensor_mismatches"] += 1
+
+    # ===== CALCULATE CONFIDENCE SCORES =====
+
+    confidence = [calculate_confidence_score(lane) for lane in LANES]
+
+    # ===== PREPARE AND PUBLISH ENHANCED SUMMARY =====
+
+    summary = build_summary(confidence, latest_sensor_ts(LEGACY_ROW))
+    result = publish_summary(summary, fresh=LEGACY_ROW in changed)
+
+    if result is not None and result.rc != mqtt.MQTT_ERR_SUCCESS:
+        log.error("publish_failed", f"❌ Failed to publish: {result.rc}", rc=result.rc)
+    else:
+        status = "no change (delta mode)" if result is None else "published"
+        log.info("iteration",
+                 f"📊 Iteration {iteration}: summary {status} | "
+                 + "".join(f"{lane} IR={ir} Count={count} ({score}%) | " for lane, ir, count, score
+                           in zip(LANES, summary["ir"], summary["vehicles"], confidence)) +
+                 f"green (preliminary) {summary['green_light']} | "
+                 f"messages {stats['messages_received']}, mismatches {stats['sensor_mismatches']} | "
+                 f"latency {latency_report()}",
+                 iteration=iteration, published=result is not None,
+                 confidence=confidence,
+                 green_light=summary["green_light"], messages=stats["messages_received"],
+                 mismatches=stats["sensor_mismatches"])
+
+
+def run_polling():
+    """Validate and publish a summary for every intersection every PUBLISH_INTERVAL"""
+    iteration = 0
+
+    while True:
+        iteration += 1
+
+        try:
+            poll_once(iteration)
+            wait_for_interval()
+
+        except KeyboardInterrupt:
+            log.info("stopped", "⛔ Gateway stopped by user")
+            break
+        except Exception as e:
+            log.error("iteration_failed", f"❌ Error in iteration {iteration}: {e}", error=str(e))
+            time.sleep(PUBLISH_INTERVAL)
+
+    return iteration
+
+
+def check_due(window, heartbeat_at):
+    """
+    (due, wait) of event mode, without blocking
 
-    except KeyboardInterrupt:
-        print(f"\n\n⛔ Gateway stopped by user")
-        break
+    due  = {row: sensor_ts} to publish now, or None: an urgent change, an
+           ordinary change older than the coalescing window, or every row
+           once `heartbeat_at` (monotonic) has passed (sensor_ts None for
+           rows without a new reading)
+    wait = seconds until something can be due (when due is None)
+    """
+    now = time.monotonic()
+    with state_changed:
+        if pending["urgent"]:
+            return take_pending(), 0.0
+        oldest = min((since for since, _ in pending["dirty"].values()), default=None)
+        if oldest is not None and now - oldest >= window:
+            return take_pending(), 0.0
+        if now >= heartbeat_at:
+            changed = take_pending()
+            return {row: changed.get(row) for row in range(len(store))}, 0.0
+    return None, heartbeat_at - now if oldest is None else min(heartbeat_at, oldest + window) - now
+
+
+def wait_for_change(window):
+    """Block until summaries are due (event mode); returns {row: sensor_ts} of the intersections to publish"""
+    heartbeat_at = time.monotonic() + GATEWAY_HEARTBEAT_INTERVAL
+
+    with state_changed:
+        while True:
+            due, wait = check_due(window, heartbeat_at)
+            if due is not None:
+                return due
+            state_changed.wait(wait)
+
+
+def publish_due(due):
+    """Summaries of the rows wait_for_change() / check_due() returned"""
+    for row, sensor_ts in due.items():
+        summary = summarize(row)
+        result = publish_summary(summary, fresh=sensor_ts is not None)
+
+        if result is None:
+            continue
+        if result.rc != mqtt.MQTT_ERR_SUCCESS:
+            log.error("publish_failed", f"❌ Failed to publish: {result.rc}", key="publish_failed",
+                      intersection=summary["intersection"], rc=result.rc)
+        elif row == LEGACY_ROW or summary["emergency"] == 1:
+            log.info("summary_published",
+                     f"📤 Summary {summary['intersection']}: green={summary['green_light']}, "
+                     f"emergency={summary['emergency']}, "
+                     f"confidence={summary['average_confidence']:.0f}% | latency {latency_report()}",
+                     key=f"summary:{summary['intersection']}", intersection=summary["intersection"],
+                     green_light=summary["green_light"], emergency=summary["emergency"])
+
+
+def run_event_driven(window=GATEWAY_COALESCE_WINDOW):
+    """Publish summaries on change instead of on a fixed interval"""
+    iteration = 0
+
+    while True:
+        try:
+            due = wait_for_change(window)
+            iteration += 1
+            publish_due(due)
+
+        except KeyboardInterrupt:
+            log.info("stopped", "⛔ Gateway stopped by user")
+            break
+        except Exception as e:
+            log.error("iteration_failed", f"❌ Error in summary {iteration}: {e}", error=str(e))
+            time.sleep(window)
+
+    return iteration
+
+
+def attach(new_client):
+    """Subscribe and publish through `new_client`: paho, or the in-memory bus (all_in_one.py)"""
+    global client
+    client = new_client
+    client.on_connect = on_connect
+    client.on_subscribe = on_subscribe
+    client.on_message = on_message
+
+
+def setup(args, shard_index=0, shard_count=1):
+    """Intersections served and summary encoding, from the command line options"""
+    shard.configure(shard_index, shard_count, args.intersections)
+    if args.intersections:
+        for intersection in shard.owned():
+            store.row(intersection)
+    if args.delta:
+        deltas["publisher"] = DeltaPublisher("gateway")
+
+
+def serve(args, shard_index=0, shard_count=1):
+    """Run one gateway (or one shard of a sharded gateway) until interrupted"""
+    setup(args, shard_index, shard_count)
+    start_metrics("gateway", shard_index)
+
+    if shard_count > 1:
+        client.reinitialise(client_id=f"smart_traffic_gateway-{shard_index}")
+    attach(client)
+
+    # Connect
+    try:
+        client.connect(BROKER, PORT, 60)
+        client.loop_start()
     except Exception as e:
-        print(f"❌ Error in iteration {iteration}: {e}")
-        time.sleep(PUBLISH_INTERVAL)
-
-# Cleanup
-print("\n" + "=" * 70)
-print("📊 FINAL GATEWAY STATISTICS")
-print("=" * 70)
-print(f"Total iterations: {iteration}")
-print(f"Total messages processed: {stats['messages_received']}")
-print(f"Sensor mismatches detected: {stats['sensor_mismatches']}")
-if stats['messages_received'] > 0:
-    mismatch_rate = (stats['sensor_mismatches'] / stats['messages_received']) * 100
-    print(f"Mismatch rate: {mismatch_rate:.1f}%")
-print("=" * 70 + "\n")
-
-client.loop_stop()
-client.disconnect()
-print("✅ Gateway disconnected\n")
\ No newline at end of file
+        print(f"❌ Failed to connect: {e}")
+        sys.exit(1)
+
+    print("\n" + "=" * 70)
+    print("🌐 SMART TRAFFIC GATEWAY STARTED")
+    print("=" * 70)
+    print("Features:")
+    print("  ✅ IR Sensor Integration")
+    print("  ✅ Ultrasonic Sensor Integration")
+    print("  ✅ Data Validation")
+    print("  ✅ Confidence Scoring")
+    print("  ✅ Sensor Mismatch Detection")
+    if args.mode == "event":
+        print(f"  ✅ Event-driven publishing (window {args.window * 1000:.0f} ms)")
+    if args.delta:
+        print("  ✅ Delta-encoded summaries")
+    if shard_count > 1:
+        print(f"  ✅ Shard {shard_index + 1}/{shard_count}")
+    if args.generate:
+        print(f"  ✅ Synthetic readings every {args.generate:g} s (traffic_generator.py)")
+    print("=" * 70 + "\n")
+
+    # Wait for the initial connection and subscriptions (at most 2 s)
+    startup["ready"].wait(2)
+
+    if args.generate:
+        threading.Thread(target=run_generator, args=(args.generate, shard_index),
+                         name="generator", daemon=True).start()
+
+    if args.mode == "event":
+        iteration = run_event_driven(args.window)
+    else:
+        iteration = run_polling()
+
+    # Cleanup
+    flush_log()
+    print("\n" + "=" * 70)
+    print("📊 FINAL GATEWAY STATISTICS")
+    print("=" * 70)
+    print(f"Total iterations: {iteration}")
+    print(f"Intersections served: {len(store)}")
+    print(f"Total messages processed: {stats['messages_received']}")
+    print(f"Sensor mismatches detected: {stats['sensor_mismatches']}")
+    if stats['messages_received'] > 0:
+        mismatch_rate = (stats['sensor_mismatches'] / stats['messages_received']) * 100
+        print(f"Mismatch rate: {mismatch_rate:.1f}%")
+    if shard_count > 1:
+        print(f"Messages for other shards dropped: {stats['foreign_dropped']}")
+    print(f"Latency (sensor → summary): {latency_report()}")
+    if deltas["publisher"] is not None:
+        delta_stats = deltas["publisher"].stats
+        print(f"Delta summaries: {delta_stats['keyframes']} keyframes, {delta_stats['deltas']} deltas, "
+              f"{delta_stats['unchanged']} skipped ({deltas['publisher'].savings() * 100:.0f}% of fields saved)")
+    print("=" * 70 + "\n")
+
+    client.loop_stop()
+    client.disconnect()
+    print("✅ Gateway disconnected\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Smart traffic gateway")
+    parser.add_argument("--mode", choices=["polling", "event"], default=GATEWAY_MODE)
+    parser.add_argument("--window", type=float, default=GATEWAY_COALESCE_WINDOW,
+                        help="coalescing window in seconds (event mode)")
+    parser.add_argument("--intersections", type=int, default=0,
+                        help="number of declared intersections I0000.. (default: discover via wildcard)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="shard intersections across this many processes")
+    parser.add_argument("--shard", type=int, default=None,
+                        help="run only this shard (0-based) of --workers shards")
+    parser.add_argument("--delta", action=argparse.BooleanOptionalAction, default=SUMMARY_DELTA_MODE,
+                        help="publish delta-encoded summaries")
+    parser.add_argument("--generate", type=float, default=None, metavar="SECONDS",
+                        help="load synthetic readings for the declared intersections every SECONDS")
+    args = parser.parse_args()
+
+    if args.generate and not args.intersections:
+        parser.error("--generate needs --intersections")
+
+    run_workers(serve, args, "gateway")
+
+
+if __name__ == "__main__":
+    main()
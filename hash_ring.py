@@ -0,0 +1,41 @@
+# hash_ring.py - CONSISTENT HASHING OF INTERSECTIONS ONTO WORKERS
+
+"""
+Consistent hash ring
+
+Every node (worker) is placed on the ring many times ("virtual nodes"), and
+a key (intersection id) belongs to the first node clockwise from its hash.
+Adding or removing a worker only moves ~1/N of the intersections.
+"""
+
+import bisect
+import hashlib
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(str(value).encode()).digest()[:8], "big")
+
+
+class HashRing:
+
+    def __init__(self, nodes, vnodes=64):
+        self.nodes = list(nodes)
+        if not self.nodes:
+            raise ValueError("HashRing needs at least one node")
+
+        points = sorted((_hash(f"{node}#{v}"), node)
+                        for node in self.nodes for v in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key):
+        """Node that owns `key`"""
+        position = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[position]
+
+    def partition(self, keys):
+        """{node: [keys it owns]}"""
+        parts = {node: [] for node in self.nodes}
+        for key in keys:
+            parts[self.node_for(key)].append(key)
+        return parts
@@ -0,0 +1,121 @@
+# history.py - FIXED-SIZE TIME SERIES WITH DOWNSAMPLED TIERS
+
+"""
+History of a few numeric channels (vehicles per lane, confidence, ...) in
+constant memory, however long it runs
+
+    raw     the last HISTORY_RAW_SIZE samples as they came
+    tiers   one per (seconds, size) in HISTORY_TIERS, e.g. 1-minute and
+            15-minute buckets: min / max / mean of every channel per bucket
+
+Every level is a ring of preallocated NumPy rows (Ring); appending a sample
+is O(channels) and never allocates. The bucket being filled is kept aside
+and goes into its ring when the next bucket starts (empty buckets are
+skipped, not stored). Readers ask for the last n rows of a level and use
+Ring.count (rows ever appended) to know what is new since they last looked:
+
+    history = History(("Lane 1", "Lane 2"))
+    history.append(time.time(), [12, 7])
+    ring = history.level(1)                             # 1-minute buckets
+    times, low, high, mean = ring.last(30, channel=0)
+"""
+
+import numpy as np
+
+from config import HISTORY_RAW_SIZE, HISTORY_TIERS
+
+
+class Ring:
+    """(time, min, max, mean) rows for `channels` values; the oldest row is overwritten"""
+
+    def __init__(self, capacity, channels, single=False):
+        self.capacity = capacity
+        self.time = np.zeros(capacity)
+        self.mean = np.zeros((capacity, channels))
+        # Raw samples: min = max = mean, one array for all three
+        self.low = self.mean if single else np.zeros((capacity, channels))
+        self.high = self.mean if single else np.zeros((capacity, channels))
+        self.count = 0      # rows ever appended; row i is in slot i % capacity
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp, low, high, mean):
+        slot = self.count % self.capacity
+        self.time[slot] = timestamp
+        self.low[slot] = low
+        self.high[slot] = high
+        self.mean[slot] = mean
+        self.count += 1
+
+    def last(self, n, channel):
+        """The last n rows (at most len(self)), oldest first: (times, min, max, mean)"""
+        n = min(n, len(self))
+        slots = np.arange(self.count - n, self.count) % self.capacity
+        return self.time[slots], self.low[slots, channel], self.high[slots, channel], self.mean[slots, channel]
+
+    def nbytes(self):
+        arrays = {id(array): array for array in (self.time, self.low, self.high, self.mean)}
+        return sum(array.nbytes for array in arrays.values())
+
+
+class Tier:
+    """Buckets of `seconds`: min / max / mean of every channel, closed into a Ring"""
+
+    def __init__(self, seconds, capacity, channels):
+        self.seconds = seconds
+        self.ring = Ring(capacity, channels)
+        self.bucket = None
+        self.low = np.zeros(channels)
+        self.high = np.zeros(channels)
+        self.total = np.zeros(channels)
+        self.samples = 0
+
+    def add(self, timestamp, values):
+        bucket = int(timestamp // self.seconds)
+        # Late samples (an older bucket) count in the open one
+        if self.bucket is None or bucket > self.bucket:
+            self.close()
+            self.bucket = bucket
+            self.low[:] = values
+            self.high[:] = values
+            self.total[:] = values
+            self.samples = 1
+            return
+        np.minimum(self.low, values, out=self.low)
+        np.maximum(self.high, values, out=self.high)
+        self.total += values
+        self.samples += 1
+
+    def close(self):
+        """Move the open bucket (if any) into the ring"""
+        if self.samples:
+            self.ring.append(self.bucket * self.seconds, self.low, self.high, self.total / self.samples)
+            self.samples = 0
+
+
+class History:
+    """Raw ring + one downsampled Tier per (seconds, size) in `tiers`"""
+
+    def __init__(self, channels, raw_size=HISTORY_RAW_SIZE, tiers=HISTORY_TIERS):
+        self.channels = tuple(channels)
+        self.channel = {name: index for index, name in enumerate(self.channels)}
+        self.raw = Ring(raw_size, len(self.channels), single=True)
+        self.tiers = [Tier(seconds, size, len(self.channels)) for seconds, size in tiers]
+        self._sample = np.zeros(len(self.channels))
+
+    def append(self, timestamp, values):
+        """One sample of every channel (in `channels` order)"""
+        sample = self._sample
+        sample[:] = values
+        self.raw.append(timestamp, sample, sample, sample)
+        for tier in self.tiers:
+            tier.add(timestamp, sample)
+
+    def level(self, level):
+        """Ring of a level: 0 = raw, 1.. = HISTORY_TIERS in order"""
+        return self.raw if level == 0 else self.tiers[level - 1].ring
+
+    def nbytes(self):
+        """Memory held by the rings (fixed at creation)"""
+        return self.raw.nbytes() + sum(tier.ring.nbytes() for tier in self.tiers)
@@ -0,0 +1,88 @@
+# intersection.py - LANES, APPROACHES AND PHASE GROUPS OF AN INTERSECTION
+
+"""
+Intersection model declared in config.py, resolved once to indexes
+
+    LANES           lane names; everything else refers to a lane by its index
+    LANE_CHANNELS   sensor topic level of each lane ("lane1", "lane2", ...)
+    APPROACHES      (approach name, lane indexes) pairs
+    GROUPS          phase group names (what "green_light" names)
+    GROUP_LANES     lane indexes of each group
+    GROUP_MASK      (groups, lanes) 0 / 1: which lanes each group gives green to
+    GROUP_OF_LANE   group that serves each lane (the first one listing it), with a
+                    trailing NO_LANE so that GROUP_OF_LANE[NO_LANE] is NO_LANE
+
+Sensors, the gateway and the cloud logic work on per-lane arrays (one entry
+per lane); the signal controller and the decision rules work per group:
+group_counts() / group_ir() turn lane columns into group columns. With one
+group per lane (the default two-lane layout) they are the lane columns.
+"""
+
+import numpy as np
+
+from config import INTERSECTION_LANES, INTERSECTION_APPROACHES, INTERSECTION_PHASES
+
+NO_LANE = -1
+
+LANES = tuple(INTERSECTION_LANES)
+LANE_INDEX = {name: index for index, name in enumerate(LANES)}
+N_LANES = len(LANES)
+LANE_CHANNELS = tuple(f"lane{lane + 1}" for lane in range(N_LANES))
+
+
+def _lane_indexes(owner, names):
+    unknown = [name for name in names if name not in LANE_INDEX]
+    if unknown:
+        raise ValueError(f"{owner}: unknown lanes {unknown} (INTERSECTION_LANES is {LANES})")
+    return tuple(LANE_INDEX[name] for name in names)
+
+
+APPROACHES = tuple((name, _lane_indexes(f"Approach {name!r}", lanes))
+                   for name, lanes in INTERSECTION_APPROACHES.items())
+
+GROUPS = tuple(INTERSECTION_PHASES)
+GROUP_INDEX = {name: index for index, name in enumerate(GROUPS)}
+GROUP_LANES = tuple(_lane_indexes(f"Phase group {name!r}", lanes) for name, lanes in INTERSECTION_PHASES.items())
+N_GROUPS = len(GROUPS)
+
+GROUP_MASK = np.zeros((N_GROUPS, N_LANES), dtype=np.int64)
+for _group, _lanes in enumerate(GROUP_LANES):
+    GROUP_MASK[_group, list(_lanes)] = 1
+
+_unserved = [LANES[lane] for lane in range(N_LANES) if not GROUP_MASK[:, lane].any()]
+if _unserved:
+    raise ValueError(f"Lanes {_unserved} are in no phase group (INTERSECTION_PHASES)")
+
+GROUP_OF_LANE = np.append(np.argmax(GROUP_MASK, axis=0), NO_LANE).astype(np.intp)
+
+# One group per lane, in lane order: group columns are the lane columns
+GROUPS_ARE_LANES = N_GROUPS == N_LANES and bool((GROUP_MASK == np.eye(N_LANES, dtype=np.int64)).all())
+
+
+def group_name(index):
+    """1 -> "Lane 2" (default groups), NO_LANE -> None"""
+    return GROUPS[index] if 0 <= index < N_GROUPS else None
+
+
+def group_index(name):
+    """"Lane 2" -> 1, None -> NO_LANE"""
+    return GROUP_INDEX.get(name, NO_LANE)
+
+
+def group_counts(counts):
+    """(..., lanes) vehicle counts -> (..., groups) vehicles waiting for each group"""
+    if GROUPS_ARE_LANES:
+        return counts
+    return np.asarray(counts) @ GROUP_MASK.T
+
+
+def group_ir(ir):
+    """(..., lanes) IR flags -> (..., groups): 1 if any lane of the group detects a vehicle"""
+    if GROUPS_ARE_LANES:
+        return ir
+    return ((np.asarray(ir) @ GROUP_MASK.T) > 0).astype(np.uint8)
+
+
+def group_of_lane(lane):
+    """Group serving a lane index (or an array of them); NO_LANE stays NO_LANE"""
+    return GROUP_OF_LANE[lane]
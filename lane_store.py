@@ -0,0 +1,180 @@
+# lane_store.py - COMPACT ARRAY-BACKED LANE STATE
+
+"""
+Shared lane-state store (gateway, cloud logic and dashboard)
+
+Each intersection gets a row number the first time it is seen. Readings and
+decisions live in preallocated NumPy columns indexed by (row, lane) or row,
+so batch code can work on whole columns instead of nested string-keyed dicts:
+
+    ir              (rows, lanes) uint8    0 / 1
+    vehicle_count   (rows, lanes) int16    0..MAX_VEHICLES
+    confidence      (rows, lanes) uint8    0..100 %
+    updated_at      (rows, lanes) float64  sensor time of the last reading
+    emergency       (rows,)       uint8    0 / 1
+    emergency_lane  (rows,)       int8     lane index or NO_LANE
+    green_group     (rows,)       int8     phase group of the current decision (intersection.py)
+    green_duration  (rows,)       int16    seconds
+    sensor_ts       (rows,)       float64  sensor time behind the latest summary (NaN = unknown)
+
+Lanes and phase groups come from the intersection model (intersection.py):
+per-lane columns have one entry per configured lane.
+
+Columns grow (doubling) when more intersections arrive than were allocated;
+always go through column() / the accessors rather than keeping old views.
+"""
+
+import numpy as np
+
+from intersection import LANES, LANE_INDEX, NO_LANE, group_index
+
+# Per-lane array fields of summaries / decisions -> column
+ARRAY_FIELDS = (("ir", "ir"), ("vehicles", "vehicle_count"), ("confidence", "confidence"))
+# Older producers: one "lane<n>_<field>" key per lane
+LEGACY_LANE_KEYS = tuple((f"lane{lane + 1}_ir", f"lane{lane + 1}_vehicles", f"lane{lane + 1}_confidence")
+                         for lane in range(len(LANES)))
+
+# name -> (dtype, per lane?, fill value)
+COLUMNS = {
+    "ir": (np.uint8, True, 0),
+    "vehicle_count": (np.int16, True, 0),
+    "confidence": (np.uint8, True, 100),
+    "updated_at": (np.float64, True, 0.0),
+    "emergency": (np.uint8, False, 0),
+    "emergency_lane": (np.int8, False, NO_LANE),
+    "green_group": (np.int8, False, 0),
+    "green_duration": (np.int16, False, 0),
+    "sensor_ts": (np.float64, False, np.nan)
+}
+
+
+def lane_index(name):
+    """"Lane 2" -> 1, None -> NO_LANE"""
+    return LANE_INDEX.get(name, NO_LANE)
+
+
+def lane_name(index):
+    """1 -> "Lane 2", NO_LANE -> None"""
+    return LANES[index] if 0 <= index < len(LANES) else None
+
+
+class LaneStore:
+
+    def __init__(self, n_lanes=len(LANES), capacity=64):
+        self.n_lanes = n_lanes
+        self.index = {}     # intersection id -> row
+        self.ids = []       # row -> intersection id
+        self.capacity = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        """(Re)allocate every column with room for `capacity` rows"""
+        for name, (dtype, per_lane, fill) in COLUMNS.items():
+            shape = (capacity, self.n_lanes) if per_lane else (capacity,)
+            column = np.full(shape, fill, dtype=dtype)
+            if self.capacity:
+                column[:self.capacity] = getattr(self, name)
+            setattr(self, name, column)
+        self.capacity = capacity
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row(self, intersection):
+        """Row of an intersection (allocated on first use)"""
+        row = self.index.get(intersection)
+        if row is None:
+            row = len(self.ids)
+            if row == self.capacity:
+                self._allocate(self.capacity * 2)
+            self.index[intersection] = row
+            self.ids.append(intersection)
+        return row
+
+    def column(self, name):
+        """View of a column restricted to the rows in use"""
+        return getattr(self, name)[:len(self.ids)]
+
+    # ===== LANE READINGS =====
+
+    def get_ir(self, row, lane):
+        return int(self.ir[row, lane])
+
+    def get_count(self, row, lane):
+        return int(self.vehicle_count[row, lane])
+
+    def set_ir(self, row, lane, value, timestamp=None):
+        """Store an IR reading; returns True if it changed"""
+        changed = self.ir[row, lane] != value
+        self.ir[row, lane] = value
+        if timestamp is not None:
+            self.updated_at[row, lane] = timestamp
+        return bool(changed)
+
+    def set_count(self, row, lane, value, timestamp=None):
+        """Store an Ultrasonic count; returns True if it changed"""
+        changed = self.vehicle_count[row, lane] != value
+        self.vehicle_count[row, lane] = value
+        if timestamp is not None:
+            self.updated_at[row, lane] = timestamp
+        return bool(changed)
+
+    def set_emergency(self, row, emergency, lane):
+        """Store an RFID reading; returns True if it changed"""
+        changed = self.emergency[row] != emergency or self.emergency_lane[row] != lane
+        self.emergency[row] = emergency
+        self.emergency_lane[row] = lane
+        return bool(changed)
+
+    def set_decision(self, row, green_light, green_duration):
+        """green_light = phase group name"""
+        self.green_group[row] = group_index(green_light)
+        self.green_duration[row] = green_duration
+
+    # ===== SUMMARIES =====
+
+    def update_from_summary(self, row, summary):
+        """
+        Load the sensor fields of a gateway summary (or a delta of one) into a row
+
+        Lane readings are arrays ("ir": [...], one entry per lane); summaries
+        of older gateways with lane1_* / lane2_* keys are read as well.
+        """
+        legacy = True
+        for field, column in ARRAY_FIELDS:
+            values = summary.get(field)
+            if values is not None:
+                getattr(self, column)[row, :len(values)] = values
+                legacy = False
+        if legacy:
+            for lane, (ir_key, vehicles_key, confidence_key) in enumerate(LEGACY_LANE_KEYS[:self.n_lanes]):
+                self.ir[row, lane] = summary.get(ir_key, self.ir[row, lane])
+                self.vehicle_count[row, lane] = summary.get(vehicles_key, self.vehicle_count[row, lane])
+                self.confidence[row, lane] = summary.get(confidence_key, self.confidence[row, lane])
+
+        self.emergency[row] = summary.get("emergency", self.emergency[row])
+        if "emergency_lane" in summary:
+            self.emergency_lane[row] = lane_index(summary["emergency_lane"])
+        if "sensor_ts" in summary:
+            sensor_ts = summary["sensor_ts"]
+            self.sensor_ts[row] = np.nan if sensor_ts is None else sensor_ts
+
+    def load_tick(self, tick, rows):
+        """Load a TrafficTick (sensors/traffic_generator.py) into the given rows at once"""
+        self.ir[rows] = tick.ir
+        self.vehicle_count[rows] = tick.vehicle_count
+        self.updated_at[rows] = tick.timestamp
+        self.emergency[rows] = tick.emergency
+        self.emergency_lane[rows] = tick.emergency_lane
+
+    def lane_data(self, row):
+        """One intersection in the gateway's original lane_data layout"""
+        data = {}
+        for lane in range(self.n_lanes):
+            data[lane_name(lane)] = {
+                "IR": self.get_ir(row, lane),
+                "Ultrasonic": self.get_count(row, lane)
+            }
+        data["Emergency"] = int(self.emergency[row])
+        data["Emergency_Lane"] = lane_name(self.emergency_lane[row])
+        return data
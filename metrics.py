@@ -0,0 +1,345 @@
+# metrics.py - COUNTERS, GAUGES AND LATENCY HISTOGRAMS
+
+"""
+Metrics shared by the gateway, the cloud logic and the dashboard
+
+- Counter:   only goes up (messages received, summaries published, ...)
+- Gauge:     current value (intersections served, pending changes, ...),
+             set directly or read from a function when scraped
+- Histogram: log-linear (HDR-style) buckets, 16 per power of two, so any
+             value from 1 µs to ~4 min is recorded in O(1) with ~6% error
+             and p50 / p95 / p99 come from bucket counts, not from samples
+
+Recording is a few list / attribute updates (no locks, no allocation) so it
+stays on in production. Updates from two threads at the same instant may
+very rarely lose one increment; nothing else is affected.
+
+Existing stats dicts are exported as they are with expose_dict(), read only
+when scraped (no double bookkeeping on the hot path).
+
+Exposed through:
+- an HTTP endpoint: /metrics (Prometheus text) and /metrics.json
+- a snapshot file rewritten every METRICS_SNAPSHOT_INTERVAL seconds
+
+    from metrics import counter, histogram, start_metrics
+    received = counter("gateway_messages_received_total", "Sensor messages received")
+    handling = histogram("gateway_on_message_seconds", "Time to handle one sensor message")
+    start_metrics("gateway")
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import (METRICS_ENABLED, METRICS_PORTS, METRICS_PORT_SPACING, METRICS_SNAPSHOT_DIR,
+                    METRICS_SNAPSHOT_INTERVAL)
+
+# Histogram layout: values in seconds, 2^MIN_EXPONENT (~1 µs) .. 2^MAX_EXPONENT (~256 s)
+SUB_BUCKETS = 16
+MIN_EXPONENT = -20
+MAX_EXPONENT = 8
+N_BUCKETS = (MAX_EXPONENT - MIN_EXPONENT) * SUB_BUCKETS
+
+EXPORTED_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Counter:
+
+    kind = "counter"
+
+    def __init__(self, name, help_text=""):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text="", function=None):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self.function = function
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def snapshot(self):
+        return self.function() if self.function is not None else self.value
+
+
+def _bucket(value):
+    """Bucket index of a value in seconds"""
+    if value <= 0:
+        return 0
+    mantissa, exponent = math.frexp(value)     # value = mantissa * 2**exponent, 0.5 <= mantissa < 1
+    if exponent <= MIN_EXPONENT:
+        return 0
+    if exponent > MAX_EXPONENT:
+        return N_BUCKETS - 1
+    return (exponent - MIN_EXPONENT - 1) * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS)
+
+
+def _bucket_upper(index):
+    """Upper edge (seconds) of a bucket"""
+    exponent, sub = divmod(index, SUB_BUCKETS)
+    return math.ldexp(0.5 + (sub + 1) / (2 * SUB_BUCKETS), exponent + MIN_EXPONENT + 1)
+
+
+class Histogram:
+
+    kind = "summary"    # exported as a Prometheus summary (quantiles + sum + count)
+
+    def __init__(self, name, help_text=""):
+        self.name = name
+        self.help = help_text
+        self.counts = [0] * N_BUCKETS
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        """Record one value in seconds (NaN / infinite values, e.g. from a missing sensor_ts, are skipped)"""
+        if not math.isfinite(value):
+            return
+        # _bucket() inlined: this runs for every message
+        mantissa, exponent = math.frexp(value)
+        if MIN_EXPONENT < exponent <= MAX_EXPONENT:
+            index = (exponent - MIN_EXPONENT - 1) * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS)
+        else:
+            index = _bucket(value)
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def time(self):
+        """with histogram.time(): ...  (records the block's duration)"""
+        return _Timer(self)
+
+    def percentile(self, q):
+        """Value (seconds) below which a fraction q of the recorded values fall"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if bucket_count and seen >= rank:
+                return min(_bucket_upper(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def snapshot(self):
+        snapshot = {"count": self.count, "sum": self.sum, "max": self.max, "mean": self.mean()}
+        for q in EXPORTED_QUANTILES:
+            snapshot[f"p{q * 100:g}"] = self.percentile(q)
+        return snapshot
+
+
+class _Timer:
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter() - self.start)
+        return False
+
+
+# =====================================================================
+# REGISTRY
+# =====================================================================
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = {}
+        self.dicts = []         # (prefix, dict, kind) exported with expose_dict()
+
+    def _get(self, cls, name, help_text, **options):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = cls(name, help_text, **options)
+            self.metrics[name] = metric
+        return metric
+
+    def counter(self, name, help_text=""):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text="", function=None):
+        return self._get(Gauge, name, help_text, function=function)
+
+    def histogram(self, name, help_text=""):
+        return self._get(Histogram, name, help_text)
+
+    def expose_dict(self, source, prefix, kind="counter"):
+        """Export every numeric entry of `source` as <prefix><key> (counters get _total)"""
+        self.dicts.append((prefix, source, kind))
+
+    def _dict_values(self):
+        for prefix, source, kind in self.dicts:
+            for key, value in list(source.items()):
+                if isinstance(value, (int, float)):
+                    name = prefix + key + ("_total" if kind == "counter" else "")
+                    yield name, kind, value
+
+    def snapshot(self):
+        """{name: value or histogram summary}"""
+        snapshot = {name: metric.snapshot() for name, metric in self.metrics.items()}
+        for name, _, value in self._dict_values():
+            snapshot[name] = value
+        return snapshot
+
+    def render_prometheus(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for name, metric in self.metrics.items():
+            if metric.help:
+                lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            if isinstance(metric, Histogram):
+                for q in EXPORTED_QUANTILES:
+                    lines.append(f'{name}{{quantile="{q}"}} {metric.percentile(q):.9g}')
+                lines.append(f"{name}_sum {metric.sum:.9g}")
+                lines.append(f"{name}_count {metric.count}")
+            else:
+                lines.append(f"{name} {metric.snapshot()}")
+        for name, kind, value in self._dict_values():
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help_text=""):
+    return REGISTRY.counter(name, help_text)
+
+
+def gauge(name, help_text="", function=None):
+    return REGISTRY.gauge(name, help_text, function)
+
+
+def histogram(name, help_text=""):
+    return REGISTRY.histogram(name, help_text)
+
+
+def expose_dict(source, prefix, kind="counter"):
+    REGISTRY.expose_dict(source, prefix, kind)
+
+
+# =====================================================================
+# EXPORT (HTTP endpoint, snapshot file)
+# =====================================================================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = self.registry.render_prometheus().encode()
+            content_type = "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body = json.dumps(self.registry.snapshot()).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve /metrics and /metrics.json on a daemon thread"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_snapshot(path, registry=REGISTRY):
+    """Write the registry as JSON (atomically: readers never see half a file)"""
+    snapshot = {"timestamp": time.time(), "metrics": registry.snapshot()}
+    temporary = path + ".tmp"
+    with open(temporary, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(temporary, path)
+
+
+def start_snapshot_writer(path, interval=METRICS_SNAPSHOT_INTERVAL, registry=REGISTRY):
+    """Rewrite the snapshot file every `interval` seconds on a daemon thread"""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                write_snapshot(path, registry)
+            except OSError as e:
+                print(f"⚠️  Could not write metrics snapshot {path}: {e}")
+
+    threading.Thread(target=run, name="metrics-snapshot", daemon=True).start()
+
+
+def start_metrics(component, port_offset=0):
+    """
+    HTTP endpoint (METRICS_PORTS[component] + port_offset) and snapshot file
+    (METRICS_SNAPSHOT_DIR/<component>.json) for one component
+
+    port_offset separates processes of the same component (gateway shards,
+    cloud workers); it must stay below METRICS_PORT_SPACING, or the port
+    would be the next component's.
+    """
+    if not METRICS_ENABLED:
+        return
+
+    port = METRICS_PORTS.get(component)
+    if port and port_offset >= METRICS_PORT_SPACING:
+        print(f"⚠️  No metrics endpoint for {component} {port_offset}: "
+              f"only {METRICS_PORT_SPACING} ports per component (METRICS_PORT_SPACING)")
+    elif port:
+        try:
+            start_http_server(port + port_offset)
+            print(f"📈 Metrics on http://127.0.0.1:{port + port_offset}/metrics")
+        except OSError as e:
+            print(f"⚠️  Metrics endpoint unavailable on port {port + port_offset}: {e}")
+
+    if METRICS_SNAPSHOT_DIR:
+        # Relative to the project root, wherever the component was started from
+        directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), METRICS_SNAPSHOT_DIR)
+        os.makedirs(directory, exist_ok=True)
+        name = component if port_offset == 0 else f"{component}-{port_offset}"
+        start_snapshot_writer(os.path.join(directory, f"{name}.json"))
@@ -0,0 +1,137 @@
+# query.py - READ BACK WHAT THE RECORDER WROTE
+
+"""
+Range queries on the recordings of traffic_recorder.py (works while it runs)
+
+    python recorder/query.py info
+    python recorder/query.py summary --intersection I0003 --last 600
+    python recorder/query.py sensor --intersection main --lane "Lane 1" --start 2026-10-18T08:00 --end 2026-10-18T09:00
+    python recorder/query.py decision --intersection I0003 --format csv > decisions.csv
+
+Only the blocks whose time and intersection spans cover the query are read
+(segments.py). Times are seconds since the epoch or local ISO dates.
+"""
+
+import argparse
+import csv
+import json
+import math
+import time
+from datetime import datetime
+import sys
+import os
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+
+from config import RECORDER_DIR
+from cloud.signal_controller import PHASES
+from intersection import LANE_INDEX, LANES, group_name
+from lane_store import lane_name
+from recorder.segments import STREAMS, SegmentStore
+from wire_format import SENSORS
+
+# Column -> readable value
+LABELS = {
+    "lane": lane_name,
+    "emergency_lane": lane_name,
+    "sensor": lambda index: SENSORS[index] if index < len(SENSORS) else None,
+    "green_group": group_name,
+    "phase": lambda index: PHASES[index] if index < len(PHASES) else None
+}
+
+
+def parse_time(text):
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+
+def format_time(seconds):
+    return datetime.fromtimestamp(seconds).isoformat(sep=" ", timespec="milliseconds")
+
+
+def plain(value):
+    """NumPy scalar -> JSON-friendly Python value (NaN -> None)"""
+    value = value.item() if hasattr(value, "item") else value
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+def rows_of(store, columns, per_lane):
+    """Column arrays -> one dict per row, codes turned into names"""
+    names = list(columns)
+    for at in range(len(columns["time"])):
+        row = {}
+        for name in names:
+            value = columns[name][at]
+            if name == "time":
+                row[name] = format_time(value)
+            elif name == "intersection":
+                row[name] = store.name(int(value))
+            elif name in per_lane and getattr(value, "ndim", 0):
+                row[name] = [plain(lane_value) for lane_value in value]
+            elif name in LABELS:
+                row[name] = LABELS[name](int(value))
+            else:
+                row[name] = plain(value)
+        yield row
+
+
+def show_info(store):
+    print(f"{'segment':>8} {'bytes':>12} {'state':<10} {'from':<24} {'to':<24} rows (sensor / summary / decision)")
+    print("─" * 120)
+    for segment in store.info():
+        state = "open" if segment["open"] else "compacted" if segment["compacted"] else "sealed"
+        span = [format_time(t) if t is not None else "-" for t in (segment["start"], segment["end"])]
+        rows = " / ".join(str(segment["rows"][stream]) for stream in STREAMS)
+        print(f"{segment['segment']:>8} {segment['bytes']:>12,} {state:<10} {span[0]:<24} {span[1]:<24} {rows}")
+    print("─" * 120)
+    print(f"{len(store.segments)} segments, {store.nbytes() / 2**20:.1f} MB, {len(store.ids)} intersections")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the traffic recordings")
+    parser.add_argument("stream", choices=list(STREAMS) + ["info"])
+    parser.add_argument("--dir", default=RECORDER_DIR, help="recordings directory (relative to the project root)")
+    parser.add_argument("--intersection", default=None, help="intersection id (default: all)")
+    parser.add_argument("--lane", default=None, choices=LANES, help="one lane only")
+    parser.add_argument("--start", type=parse_time, default=None, help="epoch seconds or ISO date")
+    parser.add_argument("--end", type=parse_time, default=None, help="epoch seconds or ISO date")
+    parser.add_argument("--last", type=float, default=None, help="the last N seconds (instead of --start)")
+    parser.add_argument("--format", choices=["table", "csv", "json"], default="table")
+    parser.add_argument("--limit", type=int, default=0, help="print only the last N rows (0 = all)")
+    args = parser.parse_args()
+
+    store = SegmentStore(os.path.join(ROOT, args.dir), writable=False)
+    if args.stream == "info":
+        show_info(store)
+        return
+
+    start = time.time() - args.last if args.last is not None else args.start
+    lane = LANE_INDEX[args.lane] if args.lane is not None else None
+    started = time.perf_counter()
+    columns = store.query(args.stream, start, args.end, args.intersection, lane)
+    seconds = time.perf_counter() - started
+    if args.limit:
+        columns = {name: column[-args.limit:] for name, column in columns.items()}
+
+    per_lane = {name for name, _, is_per_lane in STREAMS[args.stream][1] if is_per_lane}
+    rows = rows_of(store, columns, per_lane)
+    if args.format == "json":
+        for row in rows:
+            print(json.dumps(row))
+    elif args.format == "csv":
+        writer = csv.DictWriter(sys.stdout, fieldnames=list(columns))
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        print("  ".join(columns))
+        for row in rows:
+            print("  ".join(str(value) for value in row.values()))
+        print(f"\n{len(columns['time'])} rows, {store.stats['blocks_read']} blocks read in {seconds * 1000:.1f} ms",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,583 @@
+# segments.py - COLUMNAR APPEND-ONLY SEGMENT FILES
+
+"""
+On-disk store of the recorder (traffic_recorder.py): rows of three streams
+
+    sensor      one raw reading: lane, sensor (wire_format.SENSORS), value
+                (vehicle_detected / vehicle_count / emergency), sent_at
+    summary     a gateway summary: ir / vehicles / confidence per lane,
+                emergency, emergency_lane, sensor_ts
+    decision    a cloud decision: the same lane columns, green_group,
+                green_duration, phase (signal_controller.PHASES), phase_remaining, cycle
+
+Every row starts with "time" (when it was recorded) and "intersection" (a
+code; codes -> ids in intersections.txt, one id per line, append-only).
+
+Files in the store's directory:
+
+    00000001.seg    segment: header, then blocks; only ever appended to
+    00000001.idx    time index of a sealed segment (one entry per block)
+
+A block holds up to RECORDER_BLOCK_ROWS rows of one stream, column by column
+(each column one contiguous array), followed by a CRC32. Rows are buffered
+in preallocated columns and written as a block when a buffer fills or on
+flush(); flush() fsyncs everything written since the last one, so fsyncs
+come every RECORDER_FSYNC_INTERVAL seconds, not per message. After a crash
+the last segment is read up to its last intact block.
+
+Time index: per block (stream, rows, first / last time, lowest / highest
+intersection code). A range query for one intersection (and lane) only
+reads the blocks of its stream whose time span and code span cover it.
+
+Segments are sealed (index written, new segment started) once
+RECORDER_SEGMENT_BYTES big or RECORDER_SEGMENT_SECONDS old. maintain()
+then compacts sealed segments: rows sorted by (intersection, time) into
+compressed blocks (byte-shuffled + zlib), so each block covers a few
+intersections and per-intersection queries skip the rest; sensor rows older
+than RECORDER_SENSOR_RETENTION are dropped. Segments older than
+RECORDER_RETENTION, and the oldest beyond RECORDER_MAX_BYTES, are deleted
+(the open segment, at most RECORDER_SEGMENT_BYTES, comes on top of that).
+
+    store = SegmentStore("recordings")
+    store.append("sensor", time.time(), store.code("I0003"), lane, sensor, value, sent_at)
+    store.maybe_flush(time.time())
+    rows = store.query("summary", start, end, intersection="I0003", lane=0)
+"""
+
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from config import (RECORDER_BLOCK_ROWS, RECORDER_FSYNC_INTERVAL, RECORDER_SEGMENT_BYTES,
+                    RECORDER_SEGMENT_SECONDS, RECORDER_SENSOR_RETENTION, RECORDER_RETENTION,
+                    RECORDER_MAX_BYTES)
+from intersection import N_LANES
+
+# stream -> (code, [(column, dtype, per lane?)])
+_ROW_START = [("time", "<f8", False), ("intersection", "<u4", False)]
+_LANE_COLUMNS = [("ir", "u1", True), ("vehicles", "<i2", True), ("confidence", "u1", True),
+                 ("emergency", "u1", False), ("emergency_lane", "i1", False), ("sensor_ts", "<f8", False)]
+STREAMS = {
+    "sensor": (0, _ROW_START + [("lane", "i1", False), ("sensor", "u1", False), ("value", "<i2", False),
+                                ("sent_at", "<f8", False)]),
+    "summary": (1, _ROW_START + _LANE_COLUMNS),
+    "decision": (2, _ROW_START + _LANE_COLUMNS + [("green_group", "i1", False), ("green_duration", "<i2", False),
+                                                  ("phase", "u1", False), ("phase_remaining", "<f8", False),
+                                                  ("cycle", "<u4", False)])
+}
+STREAM_NAMES = {code: name for name, (code, _) in STREAMS.items()}
+
+FLAG_ZLIB = 1           # block columns compressed
+FLAG_SHUFFLE = 2        # ... after grouping the bytes of each value by position
+SEGMENT_COMPACTED = 1
+
+_SEGMENT = struct.Struct("<4sBBBx")          # magic, version, lanes, flags
+_SEGMENT_MAGIC = b"TSEG"
+_BLOCK = struct.Struct("<BBxxIIIIdd")        # stream, flags, rows, payload bytes, code min / max, time min / max
+_LENGTH = struct.Struct("<I")
+_INDEX = struct.Struct("<4sQ")               # magic, segment bytes it describes
+_INDEX_MAGIC = b"TIDX"
+VERSION = 1
+
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("stream", "u1"), ("flags", "u1"), ("rows", "<u4"),
+                        ("size", "<u4"), ("code_min", "<u4"), ("code_max", "<u4"),
+                        ("t_min", "<f8"), ("t_max", "<f8")])
+
+DICTIONARY = "intersections.txt"
+
+
+def _shuffle(data, itemsize):
+    return np.frombuffer(data, np.uint8).reshape(-1, itemsize).T.tobytes() if itemsize > 1 else data
+
+
+def _unshuffle(data, itemsize):
+    return np.frombuffer(data, np.uint8).reshape(itemsize, -1).T.tobytes() if itemsize > 1 else data
+
+
+class Buffer:
+    """Rows of one stream waiting to be written: preallocated columns filled in place"""
+
+    def __init__(self, stream, n_lanes, rows):
+        self.code, self.schema = STREAMS[stream]
+        self.arrays = [np.zeros((rows, n_lanes) if per_lane else rows, dtype)
+                       for _, dtype, per_lane in self.schema]
+        self.capacity = rows
+        self.rows = 0
+
+    def append(self, values):
+        """One row (values in schema order); returns True when the buffer is full"""
+        at = self.rows
+        for array, value in zip(self.arrays, values):
+            array[at] = value
+        self.rows = at + 1
+        return self.rows == self.capacity
+
+
+def encode_block(code, arrays, flags=0):
+    """Header + columns + CRC of one block; arrays hold exactly its rows"""
+    parts = []
+    for array in arrays:
+        data = np.ascontiguousarray(array).tobytes()
+        if flags & FLAG_SHUFFLE:
+            data = _shuffle(data, array.dtype.itemsize)
+        if flags & FLAG_ZLIB:
+            data = zlib.compress(data, 6)
+        parts += [_LENGTH.pack(len(data)), data]
+    payload = b"".join(parts)
+    times, codes = arrays[0], arrays[1]
+    header = _BLOCK.pack(code, flags, len(times), len(payload), int(codes.min()), int(codes.max()),
+                         float(times.min()), float(times.max()))
+    return header + payload + _LENGTH.pack(zlib.crc32(payload))
+
+
+def decode_columns(payload, entry, n_lanes):
+    """Block payload -> {column: array}"""
+    _, schema = STREAMS[STREAM_NAMES[int(entry["stream"])]]
+    rows, flags = int(entry["rows"]), int(entry["flags"])
+    columns, at = {}, 0
+    for name, dtype, per_lane in schema:
+        length, = _LENGTH.unpack_from(payload, at)
+        data = payload[at + 4:at + 4 + length]
+        at += 4 + length
+        dtype = np.dtype(dtype)
+        if flags & FLAG_ZLIB:
+            data = zlib.decompress(data)
+        if flags & FLAG_SHUFFLE:
+            data = _unshuffle(data, dtype.itemsize)
+        array = np.frombuffer(data, dtype)
+        columns[name] = array.reshape(rows, n_lanes) if per_lane else array
+    return columns
+
+
+class Segment:
+    """One segment file and its block index"""
+
+    def __init__(self, directory, seq):
+        self.seq = seq
+        self.path = os.path.join(directory, f"{seq:08d}.seg")
+        self.index_path = os.path.join(directory, f"{seq:08d}.idx")
+        self.n_lanes = N_LANES
+        self.flags = 0
+        self.size = 0
+        self.sealed = False
+        self.entries = []           # index entries of an open segment, as tuples
+        self._index = np.zeros(0, INDEX_DTYPE)
+
+    @property
+    def index(self):
+        if len(self._index) != len(self.entries) and not self.sealed:
+            self._index = np.array(self.entries, INDEX_DTYPE)
+        return self._index
+
+    @property
+    def compacted(self):
+        return bool(self.flags & SEGMENT_COMPACTED)
+
+    def t_range(self):
+        index = self.index
+        if not len(index):
+            return None, None
+        return float(index["t_min"].min()), float(index["t_max"].max())
+
+    def create(self, n_lanes, flags=0):
+        """Write the header of a new, empty segment; returns the open file"""
+        self.n_lanes, self.flags = n_lanes, flags
+        handle = open(self.path, "wb")
+        handle.write(_SEGMENT.pack(_SEGMENT_MAGIC, VERSION, n_lanes, flags))
+        self.size = _SEGMENT.size
+        return handle
+
+    def add_block(self, handle, block):
+        """Append an encoded block (encode_block) and index it"""
+        code, flags, rows, size, code_min, code_max, t_min, t_max = _BLOCK.unpack_from(block)
+        self.entries.append((self.size, code, flags, rows, size, code_min, code_max, t_min, t_max))
+        handle.write(block)
+        self.size += len(block)
+
+    def load(self, repair=False):
+        """Read the index (or rebuild it from the blocks); repair cuts a torn last block off"""
+        with open(self.path, "rb") as handle:
+            header = handle.read(_SEGMENT.size)
+            if len(header) < _SEGMENT.size or header[:4] != _SEGMENT_MAGIC:
+                raise ValueError(f"{self.path}: not a segment file")
+            _, _, self.n_lanes, self.flags = _SEGMENT.unpack(header)
+            self.size = os.fstat(handle.fileno()).st_size
+            if self._load_index():
+                return
+            end = self._scan(handle)
+        if end < self.size and repair:
+            with open(self.path, "r+b") as handle:
+                handle.truncate(end)
+        self.size = end
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "rb") as handle:
+                data = handle.read()
+        except FileNotFoundError:
+            return False
+        if len(data) < _INDEX.size:
+            return False
+        magic, size = _INDEX.unpack_from(data)
+        if magic != _INDEX_MAGIC or size != self.size or (len(data) - _INDEX.size) % INDEX_DTYPE.itemsize:
+            return False
+        self._index = np.frombuffer(data, INDEX_DTYPE, offset=_INDEX.size)
+        self.sealed = True
+        return True
+
+    def _scan(self, handle):
+        """Index every intact block; returns where the intact part ends"""
+        offset = _SEGMENT.size
+        self.entries = []
+        while True:
+            handle.seek(offset)
+            header = handle.read(_BLOCK.size)
+            if len(header) < _BLOCK.size:
+                break
+            code, flags, rows, size, code_min, code_max, t_min, t_max = _BLOCK.unpack(header)
+            body = handle.read(size + 4)
+            if code not in STREAM_NAMES or len(body) < size + 4 \
+                    or zlib.crc32(body[:size]) != _LENGTH.unpack_from(body, size)[0]:
+                break
+            self.entries.append((offset, code, flags, rows, size, code_min, code_max, t_min, t_max))
+            offset += _BLOCK.size + size + 4
+        return offset
+
+    def seal(self):
+        """Write the index next to the segment; the segment is not appended to any more"""
+        index = self.index
+        temporary = self.index_path + ".tmp"
+        with open(temporary, "wb") as handle:
+            handle.write(_INDEX.pack(_INDEX_MAGIC, self.size))
+            handle.write(index.tobytes())
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, self.index_path)
+        self._index = index
+        self.sealed = True
+
+    def read(self, entries):
+        """Payload of each of the given index entries"""
+        payloads = []
+        with open(self.path, "rb") as handle:
+            for entry in entries:
+                handle.seek(int(entry["offset"]) + _BLOCK.size)
+                payloads.append(handle.read(int(entry["size"])))
+        return payloads
+
+    def delete(self):
+        for path in (self.path, self.index_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class SegmentStore:
+    """
+    Directory of segments. Opened with writable=False it only answers
+    queries (while a recorder may be writing), and the open segment is read
+    up to its last complete block.
+    """
+
+    def __init__(self, directory, writable=True, n_lanes=N_LANES, block_rows=RECORDER_BLOCK_ROWS,
+                 fsync_interval=RECORDER_FSYNC_INTERVAL, segment_bytes=RECORDER_SEGMENT_BYTES,
+                 segment_seconds=RECORDER_SEGMENT_SECONDS, sensor_retention=RECORDER_SENSOR_RETENTION,
+                 retention=RECORDER_RETENTION, max_bytes=RECORDER_MAX_BYTES):
+        self.directory = directory
+        self.writable = writable
+        self.n_lanes = n_lanes
+        self.fsync_interval = fsync_interval
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.sensor_retention = sensor_retention
+        self.retention = retention
+        self.max_bytes = max_bytes
+        self.stats = {"rows": 0, "blocks": 0, "fsyncs": 0, "sealed": 0, "compacted": 0, "deleted": 0,
+                      "bytes_written": 0, "blocks_read": 0, "other_layout": 0}
+
+        if writable:
+            os.makedirs(directory, exist_ok=True)
+        self.ids = []
+        self.codes = {}
+        self._load_dictionary()
+
+        self.segments = []
+        names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+        for name in names:
+            if writable and name.endswith(".tmp"):
+                os.remove(os.path.join(directory, name))        # left by an interrupted compaction
+            elif name.endswith(".seg") and name[:-4].isdigit():
+                segment = Segment(directory, int(name[:-4]))
+                segment.load(repair=writable)
+                if writable and not segment.sealed:
+                    segment.seal()          # the one open when the recorder stopped
+                self.segments.append(segment)
+
+        self.buffers = {stream: Buffer(stream, n_lanes, block_rows) for stream in STREAMS}
+        self.active = None          # open Segment
+        self._handle = None
+        self._dictionary = None
+        self._unsynced = False
+        self.last_sync = None
+
+    # ===== INTERSECTION CODES =====
+
+    def _load_dictionary(self):
+        path = os.path.join(self.directory, DICTIONARY)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as handle:
+                for line in handle:
+                    if line.endswith("\n"):         # a torn last line is written again
+                        self.codes[line[:-1]] = len(self.ids)
+                        self.ids.append(line[:-1])
+            if self.writable:
+                with open(path, "r+", encoding="utf-8") as handle:
+                    handle.truncate(sum(len(name.encode("utf-8")) + 1 for name in self.ids))
+
+    def code(self, intersection):
+        """Code of an intersection id (assigned on first use)"""
+        code = self.codes.get(intersection)
+        if code is None:
+            if self._dictionary is None:
+                self._dictionary = open(os.path.join(self.directory, DICTIONARY), "a", encoding="utf-8")
+            code = self.codes[intersection] = len(self.ids)
+            self.ids.append(intersection)
+            self._dictionary.write(intersection + "\n")
+        return code
+
+    def name(self, code):
+        return self.ids[code] if code < len(self.ids) else f"?{code}"
+
+    # ===== WRITING =====
+
+    def append(self, stream, *values):
+        """One row of a stream: time, intersection code, then its other columns in order"""
+        buffer = self.buffers[stream]
+        if buffer.append(values):
+            self._write(buffer)
+
+    def _write(self, buffer):
+        if not buffer.rows:
+            return
+        if self.active is None:
+            self._open_segment()
+        if self._dictionary is not None:
+            self._dictionary.flush()        # codes reach the file before the rows using them
+        block = encode_block(buffer.code, [array[:buffer.rows] for array in buffer.arrays])
+        self.active.add_block(self._handle, block)
+        self.stats["rows"] += buffer.rows
+        self.stats["blocks"] += 1
+        self.stats["bytes_written"] += len(block)
+        buffer.rows = 0
+        self._unsynced = True
+
+    def _open_segment(self):
+        seq = self.segments[-1].seq + 1 if self.segments else 1
+        self.active = Segment(self.directory, seq)
+        self._handle = self.active.create(self.n_lanes)
+        self.segments.append(self.active)
+
+    def flush(self):
+        """Write every buffered row and fsync; returns True if anything was synced"""
+        for buffer in self.buffers.values():
+            self._write(buffer)
+        if not self._unsynced:
+            return False
+        if self._dictionary is not None:
+            os.fsync(self._dictionary.fileno())
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._unsynced = False
+        self.stats["fsyncs"] += 1
+        return True
+
+    def maybe_flush(self, now):
+        """flush() once RECORDER_FSYNC_INTERVAL has passed since the last one"""
+        if self.last_sync is None:
+            self.last_sync = now
+        if now - self.last_sync < self.fsync_interval:
+            return False
+        self.last_sync = now
+        self.flush()
+        return True
+
+    def rotate(self, now=None):
+        """Seal the open segment if it is big / old enough (always, with now=None)"""
+        active = self.active
+        if active is None:
+            return False
+        if now is not None and active.size < self.segment_bytes:
+            first, _ = active.t_range()
+            if first is None or now - first < self.segment_seconds:
+                return False
+        self.flush()
+        self._handle.close()
+        self._handle = None
+        active.seal()
+        self.active = None
+        self.stats["sealed"] += 1
+        return True
+
+    def close(self):
+        """Flush and seal; the next append starts a new segment"""
+        self.flush()
+        self.rotate()
+        if self._dictionary is not None:
+            self._dictionary.close()
+            self._dictionary = None
+
+    # ===== ROTATION, COMPACTION, RETENTION =====
+
+    def maintain(self, now):
+        """Rotate, compact sealed segments, apply retention; returns what was done"""
+        done = {"sealed": int(self.rotate(now)), "compacted": 0, "deleted": 0}
+
+        sensor_code, _ = STREAMS["sensor"]
+        sensor_cutoff = now - self.sensor_retention
+        for segment in self.sealed():
+            index = segment.index
+            # Sensor rows go once a whole block has expired: recompacted once, not every call
+            expired = (index["stream"] == sensor_code) & (index["t_max"] < sensor_cutoff)
+            if not segment.compacted or expired.any():
+                self.compact(segment, sensor_cutoff)
+                done["compacted"] += 1
+
+        cutoff = now - self.retention
+        for segment in self.sealed():
+            _, last = segment.t_range()
+            if last is None or last < cutoff:
+                self._delete(segment)
+                done["deleted"] += 1
+        while self.nbytes() > self.max_bytes and self.sealed():
+            self._delete(self.sealed()[0])
+            done["deleted"] += 1
+        return done
+
+    def sealed(self):
+        return [segment for segment in self.segments if segment is not self.active]
+
+    def _delete(self, segment):
+        segment.delete()
+        self.segments.remove(segment)
+        self.stats["deleted"] += 1
+
+    def compact(self, segment, sensor_cutoff=None):
+        """
+        Rewrite a sealed segment: rows of each stream sorted by (intersection,
+        time) into full compressed blocks; sensor rows before sensor_cutoff dropped
+        """
+        index = segment.index
+        compacted = Segment(self.directory, segment.seq)
+        compacted.path, compacted.index_path = segment.path + ".tmp", segment.index_path + ".tmp"
+        with compacted.create(segment.n_lanes, SEGMENT_COMPACTED) as handle:
+            for stream, (code, schema) in STREAMS.items():
+                entries = index[index["stream"] == code]
+                if stream == "sensor" and sensor_cutoff is not None:
+                    entries = entries[entries["t_max"] >= sensor_cutoff]
+                if not len(entries):
+                    continue
+                blocks = [decode_columns(payload, entry, segment.n_lanes)
+                          for payload, entry in zip(segment.read(entries), entries)]
+                columns = {name: np.concatenate([block[name] for block in blocks]) for name, _, _ in schema}
+                keep = np.ones(len(columns["time"]), bool)
+                if stream == "sensor" and sensor_cutoff is not None:
+                    keep = columns["time"] >= sensor_cutoff
+                order = np.lexsort((columns["time"][keep], columns["intersection"][keep]))
+                arrays = [columns[name][keep][order] for name, _, _ in schema]
+                for start in range(0, len(order), self.buffers[stream].capacity):
+                    block = encode_block(code, [array[start:start + self.buffers[stream].capacity]
+                                                for array in arrays], FLAG_ZLIB | FLAG_SHUFFLE)
+                    compacted.add_block(handle, block)
+            handle.flush()
+            os.fsync(handle.fileno())
+
+        # Data first, then its index: a crash in between leaves an index that
+        # does not match the segment's size, and the segment is scanned instead
+        os.replace(compacted.path, segment.path)
+        segment.flags, segment.size = SEGMENT_COMPACTED, compacted.size
+        segment.entries = compacted.entries
+        segment._index = compacted.index
+        segment.sealed = False
+        segment.seal()
+        self.stats["compacted"] += 1
+
+    def nbytes(self):
+        """Bytes on disk (segments only)"""
+        return sum(segment.size for segment in self.segments)
+
+    # ===== QUERIES =====
+
+    def query(self, stream, start=None, end=None, intersection=None, lane=None):
+        """
+        Rows of a stream recorded in [start, end] (seconds since the epoch,
+        None = open), optionally of one intersection (id) and one lane
+        (index): {column: array}, in time order. With a lane, per-lane
+        columns become that lane's values and sensor rows of other lanes are
+        left out. Rows still buffered (not flushed yet) are not included.
+        """
+        code, schema = STREAMS[stream]
+        start = -np.inf if start is None else start
+        end = np.inf if end is None else end
+        wanted = None
+        if intersection is not None:
+            wanted = self.codes.get(intersection)
+            if wanted is None:
+                return self._columns(schema, [], lane)
+
+        self.stats["blocks_read"] = 0
+        blocks = []
+        for segment in self.segments:
+            if segment.n_lanes != self.n_lanes:
+                self.stats["other_layout"] += 1
+                continue
+            index = segment.index
+            if not len(index):
+                continue
+            hit = (index["stream"] == code) & (index["t_max"] >= start) & (index["t_min"] <= end)
+            if wanted is not None:
+                hit &= (index["code_min"] <= wanted) & (index["code_max"] >= wanted)
+            entries = index[hit]
+            if not len(entries):
+                continue
+            self.stats["blocks_read"] += len(entries)
+            for payload, entry in zip(segment.read(entries), entries):
+                columns = decode_columns(payload, entry, segment.n_lanes)
+                rows = (columns["time"] >= start) & (columns["time"] <= end)
+                if wanted is not None:
+                    rows &= columns["intersection"] == wanted
+                if lane is not None and stream == "sensor":
+                    rows &= columns["lane"] == lane
+                blocks.append({name: array[rows] for name, array in columns.items()})
+        return self._columns(schema, blocks, lane)
+
+    def _columns(self, schema, blocks, lane):
+        result = {}
+        for name, dtype, per_lane in schema:
+            if blocks:
+                column = np.concatenate([block[name] for block in blocks])
+            else:
+                column = np.zeros((0, self.n_lanes) if per_lane else 0, dtype)
+            result[name] = column[:, lane] if per_lane and lane is not None else column
+        order = np.argsort(result["time"], kind="stable")
+        return {name: column[order] for name, column in result.items()}
+
+    def info(self):
+        """Per segment: number, bytes, compacted?, time span and rows per stream"""
+        rows = []
+        for segment in self.segments:
+            index = segment.index
+            first, last = segment.t_range()
+            rows.append({
+                "segment": segment.seq,
+                "bytes": segment.size,
+                "compacted": segment.compacted,
+                "open": not segment.sealed,
+                "start": first,
+                "end": last,
+                "rows": {stream: int(index["rows"][index["stream"] == code].sum())
+                         for stream, (code, _) in STREAMS.items()}
+            })
+        return rows
@@ -0,0 +1,272 @@
+# traffic_recorder.py - PERSISTENT RECORD OF SENSOR READINGS, SUMMARIES AND DECISIONS
+
+"""
+Subscribes to every traffic topic and writes what it receives to disk, in
+the columnar segment files of segments.py (RECORDER_DIR):
+
+    traffic/sensors/...     -> "sensor" rows (one per raw reading)
+    traffic/summary[/<id>]  -> "summary" rows (one per gateway summary)
+    traffic/decision[/<id>] -> "decision" rows (one per cloud decision)
+
+Delta-encoded summaries / decisions (delta.py) are merged into the last
+full state of their intersection (a LaneStore per stream) and recorded in
+full, so every row stands on its own.
+
+As in the dashboards the MQTT thread only queues raw payloads; the main
+thread decodes them, appends rows (buffered in memory), fsyncs every
+RECORDER_FSYNC_INTERVAL seconds and, every RECORDER_MAINTAIN_INTERVAL,
+seals / compacts / expires segments so disk usage stays bounded.
+
+    python recorder/traffic_recorder.py [--dir recordings] [--no-sensors]
+
+Read the recordings back with recorder/query.py.
+"""
+
+import argparse
+import time
+from collections import deque
+import paho.mqtt.client as mqtt
+import sys
+import os
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+
+from config import (BROKER, PORT, TOPIC_SUMMARY, TOPIC_DECISION, TOPIC_SUMMARY_PREFIX,
+                    TOPIC_DECISION_PREFIX, TOPIC_RESYNC, LEGACY_INTERSECTION, RECORDER_DIR,
+                    RECORDER_INBOX_SIZE, RECORDER_MAINTAIN_INTERVAL)
+from cloud.signal_controller import PHASES
+from delta import DeltaTracker
+from intersection import NO_LANE, group_index
+from lane_store import LaneStore, lane_index
+from metrics import counter, expose_dict, gauge, histogram, start_metrics
+from recorder.segments import SegmentStore
+from structured_log import flush as flush_log, get_logger
+from topics import (CHANNEL_LANE, parse_decision_topic, parse_sensor_topic, parse_summary_topic,
+                    sensor_subscriptions)
+from wire_format import SENSOR_INDEX, SENSOR_VALUE_KEYS, decode, encode_for_client
+
+PHASE_INDEX = {name: index for index, name in enumerate(PHASES)}
+NO_PHASE = 0xFF
+SENSOR_RFID = SENSOR_INDEX["RFID"]
+IDLE_SLEEP = 0.05       # seconds, main loop pause when the inbox is empty
+
+
+# =====================================================================
+# STATE
+# =====================================================================
+
+recording = {"store": None, "sensors": True}
+
+# Raw (topic, payload, received at) from the network thread
+inbox = deque(maxlen=RECORDER_INBOX_SIZE)
+deltas = DeltaTracker()
+
+# Latest full state per intersection, deltas merged in
+summaries = LaneStore()
+decisions = LaneStore()
+phases = {}             # decision row -> [phase index, phase remaining, cycle]
+
+stats = {
+    "sensor_rows": 0,
+    "summary_rows": 0,
+    "decision_rows": 0,
+    "bad_messages": 0,
+    "delta_dropped": 0
+}
+
+metric = {
+    "received": counter("recorder_messages_received_total", "Messages received"),
+    "overflow": counter("recorder_inbox_dropped_total", "Messages dropped because the inbox was full"),
+    "flush": histogram("recorder_flush_seconds", "Time to write the buffered rows and fsync"),
+    "maintain": histogram("recorder_maintain_seconds", "Time to seal / compact / expire segments")
+}
+expose_dict(stats, "recorder_")
+gauge("recorder_inbox", "Messages waiting to be recorded", lambda: len(inbox))
+gauge("recorder_disk_bytes", "Bytes of segment files",
+      lambda: recording["store"].nbytes() if recording["store"] else 0)
+gauge("recorder_segments", "Segment files",
+      lambda: len(recording["store"].segments) if recording["store"] else 0)
+
+log = get_logger("recorder")
+
+
+# =====================================================================
+# MQTT
+# =====================================================================
+
+def on_connect(client, userdata, flags, rc):
+    if rc == 0:
+        subscriptions = [(TOPIC_SUMMARY, 0), (f"{TOPIC_SUMMARY_PREFIX}/+", 0),
+                         (TOPIC_DECISION, 0), (f"{TOPIC_DECISION_PREFIX}/+", 0)]
+        if recording["sensors"]:
+            subscriptions += sensor_subscriptions(LEGACY_INTERSECTION) + sensor_subscriptions("+")
+        client.subscribe(subscriptions)
+        log.info("ready", f"✅ Recorder connected, recording {len(subscriptions)} topic filters")
+    else:
+        log.error("connect_failed", f"❌ Connection failed: {rc}", rc=rc)
+
+
+def on_message(client, userdata, msg):
+    # Network thread: queue the raw payload, the main thread does the rest
+    if len(inbox) == inbox.maxlen:
+        metric["overflow"].inc()
+    inbox.append((msg.topic, msg.payload, time.time()))
+    metric["received"].inc()
+
+
+# =====================================================================
+# RECORDING
+# =====================================================================
+
+def record_sensor(store, intersection, channel, payload, received_at):
+    sensor = SENSOR_INDEX.get(payload.get("sensor"))
+    if sensor is None:
+        stats["bad_messages"] += 1
+        return
+    lane = lane_index(payload.get("emergency_lane" if sensor == SENSOR_RFID else "lane"))
+    if lane == NO_LANE:
+        lane = CHANNEL_LANE.get(channel, NO_LANE)
+    sent_at = payload.get("sent_at")
+    store.append("sensor", received_at, store.code(intersection), lane, sensor,
+                 payload.get(SENSOR_VALUE_KEYS[sensor]) or 0, float("nan") if sent_at is None else sent_at)
+    stats["sensor_rows"] += 1
+
+
+def record_state(client, store, topic, intersection, payload, received_at, is_decision):
+    """A summary / decision (or a delta of one): merged into its row, recorded in full"""
+    apply, resync = deltas.check(topic, payload)
+    if resync is not None:
+        client.publish(TOPIC_RESYNC, encode_for_client(client, TOPIC_RESYNC, resync), qos=1)
+    if not apply:
+        stats["delta_dropped"] += 1
+        return
+
+    lanes = decisions if is_decision else summaries
+    row = lanes.row(intersection)
+    lanes.update_from_summary(row, payload)
+    values = [received_at, store.code(intersection), lanes.ir[row], lanes.vehicle_count[row],
+              lanes.confidence[row], lanes.emergency[row], lanes.emergency_lane[row], lanes.sensor_ts[row]]
+    if not is_decision:
+        store.append("summary", *values)
+        stats["summary_rows"] += 1
+        return
+
+    if "green_light" in payload:
+        lanes.green_group[row] = group_index(payload["green_light"])
+    if "green_duration" in payload:
+        lanes.green_duration[row] = payload["green_duration"]
+    phase = phases.setdefault(row, [NO_PHASE, float("nan"), 0])
+    if "phase" in payload:
+        phase[0] = PHASE_INDEX.get(payload["phase"], NO_PHASE)
+    if "phase_remaining" in payload:
+        phase[1] = payload["phase_remaining"]
+    if "cycle" in payload:
+        phase[2] = payload["cycle"]
+    store.append("decision", *values, lanes.green_group[row], lanes.green_duration[row], *phase)
+    stats["decision_rows"] += 1
+
+
+def record(client, store, topic, payload, received_at):
+    located = parse_sensor_topic(topic)
+    if located is not None:
+        record_sensor(store, located[0], located[1], payload, received_at)
+        return
+    intersection = parse_summary_topic(topic)
+    if intersection is not None:
+        record_state(client, store, topic, intersection, payload, received_at, False)
+        return
+    intersection = parse_decision_topic(topic)
+    if intersection is not None:
+        record_state(client, store, topic, intersection, payload, received_at, True)
+
+
+def drain(client, store):
+    """Record everything in the inbox; returns how many messages were handled"""
+    handled = 0
+    while inbox:
+        topic, raw, received_at = inbox.popleft()
+        handled += 1
+        try:
+            record(client, store, topic, decode(raw), received_at)
+        except Exception as e:
+            stats["bad_messages"] += 1
+            log.error("bad_message", f"Error recording message: {e}", key=topic, topic=topic, error=str(e))
+    return handled
+
+
+def report(store):
+    first = next((segment.t_range()[0] for segment in store.segments if segment.t_range()[0] is not None), None)
+    span = f", since {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(first))}" if first else ""
+    return (f"{stats['sensor_rows']} sensor / {stats['summary_rows']} summary / {stats['decision_rows']} decision "
+            f"rows, {len(store.segments)} segments, {store.nbytes() / 2**20:.1f} MB{span}")
+
+
+def run(client, store):
+    next_maintain = time.time() + RECORDER_MAINTAIN_INTERVAL
+    while True:
+        handled = drain(client, store)
+        now = time.time()
+
+        started = time.perf_counter()
+        if store.maybe_flush(now):
+            metric["flush"].record(time.perf_counter() - started)
+
+        if now >= next_maintain:
+            next_maintain = now + RECORDER_MAINTAIN_INTERVAL
+            started = time.perf_counter()
+            done = store.maintain(now)
+            metric["maintain"].record(time.perf_counter() - started)
+            log.info("maintained", f"💾 {report(store)} (sealed {done['sealed']}, compacted "
+                                   f"{done['compacted']}, deleted {done['deleted']})", **done)
+
+        if not handled:
+            time.sleep(IDLE_SLEEP)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record sensor readings, summaries and decisions to disk")
+    parser.add_argument("--dir", default=RECORDER_DIR, help="recordings directory (relative to the project root)")
+    parser.add_argument("--sensors", action=argparse.BooleanOptionalAction, default=True,
+                        help="record raw sensor readings (summaries and decisions always are)")
+    args = parser.parse_args()
+
+    store = SegmentStore(os.path.join(ROOT, args.dir))
+    recording["store"] = store
+    recording["sensors"] = args.sensors
+    start_metrics("recorder")
+
+    client = mqtt.Client(client_id="traffic_recorder")
+    client.on_connect = on_connect
+    client.on_message = on_message
+    try:
+        client.connect(BROKER, PORT, 60)
+        client.loop_start()
+    except Exception as e:
+        print(f"❌ Failed to connect: {e}")
+        sys.exit(1)
+
+    print("\n" + "=" * 70)
+    print("💾 TRAFFIC RECORDER STARTED")
+    print("=" * 70)
+    print(f"Directory: {store.directory}")
+    print(f"Existing:  {report(store)}")
+    print("=" * 70 + "\n")
+
+    try:
+        run(client, store)
+    except KeyboardInterrupt:
+        print("\n⛔ Recorder stopped by user")
+    finally:
+        client.loop_stop()
+        drain(client, store)
+        store.close()
+        client.disconnect()
+        flush_log()
+        print(f"💾 {report(store)}")
+        print(f"   {store.stats['fsyncs']} fsyncs, {store.stats['blocks']} blocks written, "
+              f"{metric['overflow'].value} messages dropped (inbox full)\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# render.py - INCREMENTAL TK RENDERING (ONLY WHAT CHANGED)
+
+"""
+Render layer of the dashboard
+
+Widgets and canvas items are never configured directly: their options go
+through a Renderer, which remembers what each one shows. An option set to
+the value it already has costs a dict lookup; only changed options mark the
+widget dirty, and flush() configures every dirty widget once per frame.
+
+    render = Renderer()
+    render.set(label, text="🚗 Vehicles: 3", fg="#00ff00")
+    render.item(canvas, oval, fill="#00ff00")
+    light = TrafficLight(canvas, render)        # canvas items created once
+    light.show("yellow")
+    updates = render.flush()                    # Tk calls made this frame
+
+Canvas items are created once and changed with itemconfigure, never
+deleted and redrawn, so a frame costs O(changes), not O(widgets).
+Sparklines (history charts) only draw the points added since the last frame.
+Nothing here imports tkinter: anything with configure() / itemconfigure()
+can be rendered (the benchmarks use stand-ins).
+"""
+
+import time
+from collections import deque
+
+_UNSET = object()
+
+
+class Renderer:
+    """Last applied options of every widget / canvas item, and the pending changes"""
+
+    def __init__(self):
+        self.applied = {}       # (widget, item or None) -> {option: value} last configured
+        self.dirty = {}         # (widget, item or None) -> {option: value} to configure at flush()
+        self.frames = 0
+        self.updates = 0        # configure / itemconfigure calls so far
+        self.frame_seconds = 0.0
+        self.frame_updates = 0
+
+    def set(self, widget, **options):
+        """Widget options for the next flush(); unchanged ones are dropped"""
+        self._stage((widget, None), options)
+
+    def item(self, canvas, item, **options):
+        """Canvas item options for the next flush(); unchanged ones are dropped"""
+        self._stage((canvas, item), options)
+
+    def _stage(self, key, options):
+        applied = self.applied.get(key)
+        pending = self.dirty.get(key)
+        if applied is None:
+            if pending is None:
+                self.dirty[key] = options
+            else:
+                pending.update(options)
+            return
+        for option, value in options.items():
+            if applied.get(option, _UNSET) == value:
+                # What is on screen: nothing to do (drop an earlier change)
+                if pending:
+                    pending.pop(option, None)
+            elif pending is None:
+                pending = self.dirty[key] = {option: value}
+            else:
+                pending[option] = value
+
+    def flush(self):
+        """Configure every dirty widget once; returns how many Tk calls were made"""
+        started = time.perf_counter()
+        updates = 0
+        for (widget, item), options in self.dirty.items():
+            if not options:
+                continue
+            if item is None:
+                widget.configure(**options)
+            else:
+                widget.itemconfigure(item, **options)
+            self.applied.setdefault((widget, item), {}).update(options)
+            updates += 1
+        self.dirty.clear()
+
+        self.frames += 1
+        self.updates += updates
+        self.frame_updates = updates
+        self.frame_seconds = time.perf_counter() - started
+        return updates
+
+    def forget(self, widget):
+        """Drop what is known about a destroyed widget (and its canvas items)"""
+        for store in (self.applied, self.dirty):
+            for key in [key for key in store if key[0] is widget]:
+                del store[key]
+
+
+# =====================================================================
+# CANVAS ITEMS
+# =====================================================================
+
+LIGHT_COLORS = {
+    "green": ("#00ff00", "#00aa00"),
+    "yellow": ("#ffd700", "#aa8800"),
+    "red": ("#ff0000", "#aa0000"),
+    "off": ("#333333", "#555555")
+}
+
+
+class TrafficLight:
+    """One traffic light on a canvas: housing and lamp created once, lamp recolored"""
+
+    def __init__(self, canvas, render, x=75, y=50, radius=40):
+        self.canvas = canvas
+        self.render = render
+        canvas.create_oval(x - radius, y - radius, x + radius, y + radius,
+                           outline="#444444", width=3, fill="#111111")
+        lamp = radius - 10
+        fill, outline = LIGHT_COLORS["off"]
+        self.lamp = canvas.create_oval(x - lamp, y - lamp, x + lamp, y + lamp,
+                                       fill=fill, outline=outline, width=2)
+        render.applied[(canvas, self.lamp)] = {"fill": fill, "outline": outline}
+        self.color = "off"
+
+    def show(self, color):
+        """"green" / "yellow" / "red"; anything else is off"""
+        if color == self.color:
+            return
+        self.color = color
+        fill, outline = LIGHT_COLORS.get(color, LIGHT_COLORS["off"])
+        self.render.item(self.canvas, self.lamp, fill=fill, outline=outline)
+
+
+class Sparkline:
+    """
+    Last points of one channel of a history Ring (history.py) as a line,
+    drawn incrementally: new points move the chart's items left (one call
+    for all of them) and add one segment each, points scrolled out are
+    deleted. Downsampled rows (min != max) also get a min-max bar.
+
+    Drawn straight on the canvas, not through a Renderer; update() returns
+    the Tk calls it made.
+    """
+
+    def __init__(self, canvas, x, y, width, height, low, high, color, band_color="#555555", step=3):
+        self.canvas = canvas
+        self.x, self.y, self.width, self.height = x, y, width, height
+        self.low, self.high = low, high
+        self.color, self.band_color = color, band_color
+        self.step = step
+        self.capacity = width // step + 1       # points that fit
+        self.tag = f"spark{id(self)}"
+        self.points = deque()                   # per point: its item ids
+        self.last_y = None
+        self.ring = None
+        self.drawn = 0                          # ring.count when last drawn
+
+    def _y(self, value):
+        share = (min(max(value, self.low), self.high) - self.low) / ((self.high - self.low) or 1)
+        return self.y + self.height - share * self.height
+
+    def update(self, ring, channel):
+        """Draw what `ring` got since the last call (all of it after a ring change)"""
+        new = ring.count - self.drawn
+        if ring is not self.ring or new > min(self.capacity, ring.capacity):
+            return self.redraw(ring, channel)
+        if new <= 0:
+            return 0
+        self.canvas.move(self.tag, -self.step * new, 0)
+        return 1 + self._add(ring, channel, new)
+
+    def redraw(self, ring, channel):
+        calls = 1
+        self.canvas.delete(self.tag)
+        self.points.clear()
+        self.last_y = None
+        self.ring = ring
+        self.drawn = ring.count
+        return calls + self._add(ring, channel, min(len(ring), self.capacity))
+
+    def _add(self, ring, channel, n):
+        """The last n rows of the ring as new points at the right edge"""
+        calls = 0
+        canvas = self.canvas
+        _, low, high, mean = ring.last(n, channel)
+        right = self.x + self.width
+        for i in range(len(mean)):
+            x = right - self.step * (len(mean) - 1 - i)
+            y = self._y(mean[i])
+            items = []
+            if low[i] != high[i]:
+                items.append(canvas.create_line(x, self._y(low[i]), x, self._y(high[i]),
+                                                fill=self.band_color, tags=self.tag))
+            if self.last_y is not None:
+                items.append(canvas.create_line(x - self.step, self.last_y, x, y, fill=self.color, width=2,
+                                                tags=self.tag))
+            self.points.append(items)
+            self.last_y = y
+            calls += len(items)
+
+        old = []
+        while len(self.points) > self.capacity:
+            old.extend(self.points.popleft())
+        if old:
+            canvas.delete(*old)
+            calls += 1
+        self.drawn = ring.count
+        return calls
@@ -0,0 +1,85 @@
+# scoring.py - SHARED CONFIDENCE SCORING AND SENSOR VALIDATION
+
+"""
+One implementation of IR / Ultrasonic cross-validation for the gateway and
+the cloud logic, so their numbers cannot drift apart.
+
+Confidence (fraction 0.5-1.0, or percent 50-100):
+    IR=0, count=0   -> 1.0   both say no vehicles
+    IR=1, count>0   -> 1.0   both say vehicles
+    IR=1, count=0   -> 0.5   maybe one vehicle at the detection point
+    IR=0, count>0   -> 0.75  vehicles past the IR detection point
+
+Validation produces warning CODES (bit flags), not strings; describe_warnings()
+formats them only when something is actually printed.
+
+Every function takes scalars or NumPy arrays of any shape, so all lanes of
+all intersections are scored in one vectorized pass.
+"""
+
+import numpy as np
+
+from config import MAX_VEHICLES
+
+# Confidence by (IR detects vehicle, count > 0)
+_CONFIDENCE = np.array([1.0,    # IR=0, count=0
+                        0.75,   # IR=0, count>0
+                        0.5,    # IR=1, count=0
+                        1.0])   # IR=1, count>0
+
+# Warning codes (bit flags, combine with |)
+WARN_NONE = 0
+WARN_IR_WITHOUT_COUNT = 1     # IR detects vehicle but count=0
+WARN_COUNT_WITHOUT_IR = 2     # count>0 but IR detects nothing
+WARN_COUNT_OVER_MAX = 4       # Ultrasonic count exceeds MAX_VEHICLES
+
+WARNING_MESSAGES = {
+    WARN_IR_WITHOUT_COUNT: "{lane}: IR detects vehicle but count=0",
+    WARN_COUNT_WITHOUT_IR: "{lane}: Count={count} but IR detects nothing",
+    WARN_COUNT_OVER_MAX: "{lane}: Ultrasonic count exceeds max (" + str(MAX_VEHICLES) + ")"
+}
+
+
+def _agreement_index(ir, count):
+    return (np.asarray(ir) == 1) * 2 + (np.asarray(count) > 0)
+
+
+def confidence_scores(ir, count):
+    """Confidence as a fraction 0.5-1.0 (float array, or float for scalars)"""
+    scores = _CONFIDENCE[_agreement_index(ir, count)]
+    return float(scores) if np.ndim(scores) == 0 else scores
+
+
+def confidence_percent(ir, count):
+    """Confidence as a percentage 50-100 (int array, or int for scalars)"""
+    percent = (_CONFIDENCE * 100).astype(np.uint8)[_agreement_index(ir, count)]
+    return int(percent) if np.ndim(percent) == 0 else percent
+
+
+def validate(ir, count):
+    """Warning codes for every lane (uint8 array, or int for scalars)"""
+    ir = np.asarray(ir)
+    count = np.asarray(count)
+    codes = (((ir == 1) & (count == 0)) * WARN_IR_WITHOUT_COUNT |
+             ((ir == 0) & (count > 0)) * WARN_COUNT_WITHOUT_IR |
+             (count > MAX_VEHICLES) * WARN_COUNT_OVER_MAX).astype(np.uint8)
+    return int(codes) if codes.ndim == 0 else codes
+
+
+def score_and_validate(ir, count):
+    """(confidence fraction, warning codes) of every lane in one pass"""
+    ir = np.asarray(ir)
+    count = np.asarray(count)
+    return confidence_scores(ir, count), validate(ir, count)
+
+
+def count_warnings(codes):
+    """Total number of warnings in an array (or scalar) of codes"""
+    codes = np.asarray(codes, dtype=np.uint8)
+    return int(np.unpackbits(codes.reshape(-1, 1), axis=1).sum())
+
+
+def describe_warnings(code, lane, count=0):
+    """Human-readable messages for one lane's warning code"""
+    return [message.format(lane=lane, count=count)
+            for flag, message in WARNING_MESSAGES.items() if code & flag]
@@ -1,32 +1,10 @@
+# lane2_ultrasonic.py - thin wrapper around the sensor engine
 
-import random
-import time
-import json
-import paho.mqtt.client as mqtt
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from config import BROKER, PORT, TOPIC_LANE_2, PUBLISH_INTERVAL, MAX_VEHICLES
-# MQTT Setup
-client = mqtt.Client()
-client.connect(BROKER, PORT, 60)
-client.loop_start()
+from config import TOPIC_LANE_2
+from sensor_engine import SensorSpec, run_sensors, SENSOR_ULTRASONIC
 
-print("Lane 2 Ultrasonic sensor simulation started...")
-# Simulation Loop
-while True:
-    # Simulate vehicle density (number of vehicles in the lane)
-    vehicle_count = random.randint(0, MAX_VEHICLES)
-
-    # Prepare JSON payload
-    data = {
-        "lane": "Lane 2",
-        "sensor": "Ultrasonic",
-        "vehicle_count": vehicle_count
-    }
-
-    # Publish to MQTT
-    client.publish(TOPIC_LANE_2, json.dumps(data))
-    print(f"Published to {TOPIC_LANE_2}: {data}")
-
-    time.sleep(PUBLISH_INTERVAL)
+run_sensors([SensorSpec(SENSOR_ULTRASONIC, "Lane 2", TOPIC_LANE_2)],
+            banner="Lane 2 Ultrasonic sensor simulation started...")
@@ -0,0 +1,220 @@
+# sensor_engine.py - SINGLE-PROCESS MULTI-SENSOR SIMULATION ENGINE
+
+"""
+
+This engine:
+1. Drives any number of simulated sensors (IR, Ultrasonic, RFID) from ONE loop
+2. Publishes all of them over ONE shared MQTT connection / network thread
+3. Schedules each sensor at its own rate (no sleep loop per sensor)
+
+The per-sensor scripts (lane1_ir.py, rfid.py, ...) are thin wrappers around it.
+"""
+
+import argparse
+import heapq
+import random
+import time
+from collections import namedtuple
+import paho.mqtt.client as mqtt
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import (BROKER, PORT, PUBLISH_INTERVAL, MAX_VEHICLES, EMERGENCY_PROBABILITY,
+                    LEGACY_INTERSECTION)
+from intersection import LANES, LANE_CHANNELS
+from topics import CHANNEL_EMERGENCY, intersection_id, sensor_topic
+from wire_format import encode_for_client
+from structured_log import DEBUG, INFO, WARNING, get_logger
+
+log = get_logger("sensors")
+
+# Sensor types
+SENSOR_IR = "IR"
+SENSOR_ULTRASONIC = "Ultrasonic"
+SENSOR_RFID = "RFID"
+
+# One declared sensor:
+#   sensor   -> SENSOR_IR / SENSOR_ULTRASONIC / SENSOR_RFID
+#   lane     -> "Lane 1" ... (for RFID: tuple of lanes an emergency can appear in)
+#   topic    -> MQTT topic the readings are published to
+#   interval -> seconds between two readings
+SensorSpec = namedtuple("SensorSpec", ["sensor", "lane", "topic", "interval"],
+                        defaults=(PUBLISH_INTERVAL,))
+
+
+# =====================================================================
+# SENSOR READINGS
+# =====================================================================
+
+def read_ir(spec):
+    """IR sensor: 0 = no vehicle, 1 = vehicle detected"""
+    return {
+        "lane": spec.lane,
+        "sensor": SENSOR_IR,
+        "vehicle_detected": random.choice([0, 1])
+    }
+
+
+def read_ultrasonic(spec):
+    """Ultrasonic sensor: vehicle density (number of vehicles in the lane)"""
+    return {
+        "lane": spec.lane,
+        "sensor": SENSOR_ULTRASONIC,
+        "vehicle_count": random.randint(0, MAX_VEHICLES)
+    }
+
+
+def read_rfid(spec):
+    """RFID reader: emergency vehicle in one of the lanes (or none)"""
+    emergency = 1 if random.random() < EMERGENCY_PROBABILITY else 0
+    return {
+        "sensor": SENSOR_RFID,
+        "emergency": emergency,
+        "emergency_lane": random.choice(spec.lane) if emergency == 1 else None  # Which lane has the emergency
+    }
+
+
+READERS = {
+    SENSOR_IR: read_ir,
+    SENSOR_ULTRASONIC: read_ultrasonic,
+    SENSOR_RFID: read_rfid
+}
+
+def intersection_sensors(intersection, interval=PUBLISH_INTERVAL):
+    """IR + Ultrasonic per configured lane and one RFID reader for one intersection"""
+    sensors = []
+    for lane, channel in zip(LANES, LANE_CHANNELS):
+        topic = sensor_topic(intersection, channel)
+        sensors.append(SensorSpec(SENSOR_IR, lane, topic, interval))
+        sensors.append(SensorSpec(SENSOR_ULTRASONIC, lane, topic, interval))
+    sensors.append(SensorSpec(SENSOR_RFID, LANES, sensor_topic(intersection, CHANNEL_EMERGENCY), interval))
+    return sensors
+
+
+# The full original intersection (what the per-sensor scripts simulate, on the legacy topics)
+DEFAULT_SENSORS = intersection_sensors(LEGACY_INTERSECTION)
+
+
+# =====================================================================
+# ENGINE
+# =====================================================================
+
+class SensorEngine:
+    """
+    Event loop for many sensors sharing one publisher
+
+    `client` is anything with an MQTT-style publish(topic, payload) method.
+    Sensors are kept in a heap ordered by their next due time, so one loop
+    serves any number of sensors with any mix of rates.
+    """
+
+    def __init__(self, client, sensors, verbose=True):
+        self.client = client
+        self.sensors = list(sensors)
+        self.verbose = verbose
+        self.published = 0
+        self._due = []
+
+        # Stagger first readings across the interval so a large fleet does
+        # not publish in one burst
+        now = time.monotonic()
+        for index, spec in enumerate(self.sensors):
+            offset = spec.interval * index / len(self.sensors)
+            heapq.heappush(self._due, (now + offset, index))
+
+    def publish_reading(self, spec):
+        """Take one reading from a sensor and publish it"""
+        data = READERS[spec.sensor](spec)
+        data["sent_at"] = time.time()  # lets the gateway measure end-to-end latency
+        self.client.publish(spec.topic, encode_for_client(self.client, spec.topic, data))
+        self.published += 1
+
+        if data.get("emergency") == 1:
+            log.log(WARNING if self.verbose else DEBUG, "emergency_detected",
+                    f"🚨 EMERGENCY DETECTED in {data['emergency_lane']}! Published: {data}",
+                    key=spec.topic, topic=spec.topic, lane=data["emergency_lane"])
+        else:
+            log.log(INFO if self.verbose else DEBUG, "reading_published",
+                    f"Published to {spec.topic}: {data}", key=spec.topic, topic=spec.topic, reading=data)
+        return data
+
+    def poll(self, now=None):
+        """Publish every reading that is due; return when the next one is due"""
+        if now is None:
+            now = time.monotonic()
+
+        while self._due and self._due[0][0] <= now:
+            due, index = heapq.heappop(self._due)
+            spec = self.sensors[index]
+            self.publish_reading(spec)
+
+            # Keep a fixed rate, but never try to catch up on missed readings
+            next_due = due + spec.interval
+            if next_due <= now:
+                next_due = now + spec.interval
+            heapq.heappush(self._due, (next_due, index))
+
+        return self._due[0][0] if self._due else now + PUBLISH_INTERVAL
+
+    def run(self):
+        """Run until interrupted"""
+        while True:
+            delay = self.poll() - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def on_connect(client, userdata, flags, rc):
+    if rc == 0:
+        log.info("ready", "✅ Sensors connected to MQTT broker")
+    else:
+        log.error("connect_failed", f"❌ Connection failed: {rc}", rc=rc)
+
+
+def connect_client():
+    """One MQTT client (and one network thread) shared by every sensor"""
+    client = mqtt.Client()
+    client.on_connect = on_connect
+    client.connect(BROKER, PORT, 60)
+    client.loop_start()
+    return client
+
+
+def run_sensors(sensors, banner=None, verbose=True):
+    """Connect, then drive the given sensors until interrupted"""
+    client = connect_client()
+
+    if banner:
+        print(banner)
+
+    engine = SensorEngine(client, sensors, verbose=verbose)
+    try:
+        engine.run()
+    except KeyboardInterrupt:
+        print(f"\n⛔ Sensor simulation stopped ({engine.published} readings published)")
+    finally:
+        client.loop_stop()
+        client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many sensors over one MQTT connection")
+    parser.add_argument("--intersections", type=int, default=0,
+                        help="also simulate intersections I0000.. on traffic/sensors/<id>/...")
+    parser.add_argument("--interval", type=float, default=PUBLISH_INTERVAL,
+                        help="seconds between readings of each simulated intersection")
+    parser.add_argument("--quiet", action="store_true", help="do not print every reading")
+    args = parser.parse_args()
+
+    sensors = list(DEFAULT_SENSORS)
+    for number in range(args.intersections):
+        sensors += intersection_sensors(intersection_id(number), args.interval)
+
+    run_sensors(sensors,
+                banner=f"Sensor engine started: {len(sensors)} sensors over one MQTT connection...",
+                verbose=not args.quiet)
+
+
+if __name__ == "__main__":
+    main()
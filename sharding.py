@@ -0,0 +1,86 @@
+# sharding.py - INTERSECTIONS PARTITIONED ACROSS WORKER PROCESSES
+
+"""
+Sharding shared by the gateway and the cloud logic (--workers / --shard)
+
+    shard = Shard()
+    shard.configure(index, count, n_intersections)    # from the command line
+    shard.owns("I0042")                                # consistent hashing (hash_ring.py)
+    mids = subscribe_in_chunks(client, subscriptions)
+    run_workers(serve, args, "gateway")                # serve(args, index, count) per worker
+
+Every worker is a process of its own, owns the intersections the hash ring
+gives it and drops messages of the others.
+"""
+
+import multiprocessing
+import os
+import signal
+
+from config import LEGACY_INTERSECTION
+from hash_ring import HashRing
+from topics import intersection_id
+
+# Topics per SUBSCRIBE packet (keeps each packet a reasonable size)
+SUBSCRIBE_CHUNK = 100
+
+
+class Shard:
+    """Which intersections this process serves"""
+
+    def __init__(self):
+        self.index = 0
+        self.count = 1
+        self.ring = None            # HashRing over shard indexes (None = serve everything)
+        self.intersections = None   # declared intersection ids (None = discover via wildcard)
+
+    def configure(self, index=0, count=1, n_intersections=0):
+        """Shard `index` of `count`; n_intersections declares I0000.. (plus the legacy one)"""
+        self.index = index
+        self.count = count
+        self.ring = HashRing(range(count)) if count > 1 else None
+        if n_intersections:
+            self.intersections = [LEGACY_INTERSECTION] + [intersection_id(n) for n in range(n_intersections)]
+
+    def owns(self, intersection):
+        """Is this intersection served by this shard?"""
+        return self.ring is None or self.ring.node_for(intersection) == self.index
+
+    def owned(self):
+        """Declared intersections served by this shard"""
+        return [i for i in self.intersections if self.owns(i)]
+
+
+def subscribe_in_chunks(client, subscriptions):
+    """Subscribe SUBSCRIBE_CHUNK topics at a time; returns the message ids to wait for"""
+    mids = set()
+    for start in range(0, len(subscriptions), SUBSCRIBE_CHUNK):
+        result, mid = client.subscribe(subscriptions[start:start + SUBSCRIBE_CHUNK])
+        mids.add(mid)
+    return mids
+
+
+def run_workers(serve, args, name):
+    """
+    serve(args, index, count) for --shard (or a single worker) in this process,
+    otherwise one process per worker until they all stop
+    """
+    if args.shard is not None or args.workers == 1:
+        serve(args, args.shard or 0, args.workers)
+        return
+
+    workers = [multiprocessing.Process(target=serve, args=(args, k, args.workers), name=f"{name}-{k}")
+               for k in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # Ctrl+C in a terminal reaches every worker; a signal to this process alone does not
+        for worker in workers:
+            worker.join(2)
+            if worker.is_alive():
+                os.kill(worker.pid, signal.SIGINT)
+        for worker in workers:
+            worker.join()
@@ -0,0 +1,243 @@
+# structured_log.py - ASYNCHRONOUS, RATE-LIMITED STRUCTURED LOGGING
+
+"""
+Structured logging for the sensors, gateway, cloud logic and dashboard
+
+- log calls only build a record and put it on a bounded queue; a background
+  thread formats and writes (the MQTT / UI threads never block on stdout)
+- when the queue is full, records are dropped and counted, never waited for
+- levels: DEBUG < INFO < WARNING < ERROR (LOG_LEVEL)
+- per-key rate limiting (token bucket, LOG_RATE_LIMIT records/s per key) and
+  sampling (sample=N keeps one record in N); the next record that gets
+  through carries "suppressed": <count>
+- output: JSON lines (LOG_FORMAT = "json") or the human-readable message
+  ("pretty"), to stdout or LOG_FILE
+
+    from structured_log import get_logger
+    log = get_logger("gateway")
+    log.info("summary_published", "📤 Summary I0001 published", intersection="I0001")
+    log.debug("sensor_reading", f"📡 {lane} IR: {value}", key=f"ir:{lane}", sample=10, value=value)
+
+Start-up banners and final statistics stay as plain prints.
+"""
+
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from config import LOG_FILE, LOG_FORMAT, LOG_LEVEL, LOG_QUEUE_SIZE, LOG_RATE_LIMIT
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+FORMAT_JSON = "json"
+FORMAT_PRETTY = "pretty"
+
+_STOP = object()
+
+
+class LogWriter:
+    """Background thread that formats and writes queued records"""
+
+    def __init__(self, stream=None, fmt=LOG_FORMAT, queue_size=LOG_QUEUE_SIZE, show_component=False):
+        self.stream = stream
+        self.fmt = fmt
+        self.show_component = show_component     # "[gateway ] ..." when several components share a stream
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.written = 0
+        self.start()
+
+    def start(self):
+        """Fresh queue and writer thread (also in a forked child, which inherits neither thread nor locks)"""
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def format(self, record):
+        if self.fmt == FORMAT_JSON:
+            return json.dumps(record, ensure_ascii=False, default=str)
+        text = record.get("msg") or " ".join(
+            [record["event"]] + [f"{k}={v}" for k, v in record.items()
+                                 if k not in ("ts", "level", "component", "event", "msg")])
+        if "suppressed" in record:
+            text += f" (+{record['suppressed']} suppressed)"
+        if self.show_component:
+            text = f"[{record.get('component', '?'):<10}] {text}"
+        return text
+
+    def _run(self):
+        stream = self.stream or sys.stdout
+        while True:
+            records = [self.queue.get()]
+            # Write everything already queued in one go
+            while len(records) < 1000:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = _STOP in records
+            lines = [self.format(record) for record in records if record is not _STOP]
+            if lines:
+                try:
+                    stream.write("\n".join(lines) + "\n")
+                    stream.flush()
+                except (OSError, ValueError):
+                    pass
+                self.written += len(lines)
+            for _ in records:
+                self.queue.task_done()
+            if stop:
+                return
+
+    def close(self, timeout=2.0):
+        """Write what is queued, then stop the thread"""
+        if not self._thread.is_alive():
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+class Logger:
+
+    def __init__(self, component, writer, level=LOG_LEVEL, rate_limit=LOG_RATE_LIMIT):
+        self.component = component
+        self.writer = writer
+        self.level = LEVELS[level] if isinstance(level, str) else level
+        self.rate_limit = rate_limit
+        self._buckets = {}          # key -> [tokens, last refill (monotonic)]
+        self._samples = {}          # key -> records seen
+        self._suppressed = {}       # key -> records dropped by rate limit / sampling
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def _allow(self, key, rate, sample):
+        if sample and sample > 1:
+            seen = self._samples.get(key, 0)
+            self._samples[key] = seen + 1
+            if seen % sample:
+                return False
+
+        rate = self.rate_limit if rate is None else rate
+        if not rate:
+            return True
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [rate, now]
+        else:
+            bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def log(self, level, event, msg=None, key=None, rate=None, sample=None, **fields):
+        """
+        Queue one record
+
+        key    -> rate limiting / sampling key (default: the event name)
+        rate   -> records/s allowed for this key (default LOG_RATE_LIMIT, 0 = unlimited)
+        sample -> keep one record in `sample`
+        """
+        if level < self.level:
+            return
+        key = event if key is None else key
+        if not self._allow(key, rate, sample):
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return
+
+        record = {"ts": time.time(), "level": LEVEL_NAMES.get(level, level),
+                  "component": self.component, "event": event}
+        if msg is not None:
+            record["msg"] = msg
+        record.update(fields)
+        suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record["suppressed"] = suppressed
+        self.writer.submit(record)
+
+    def debug(self, event, msg=None, **fields):
+        self.log(DEBUG, event, msg, **fields)
+
+    def info(self, event, msg=None, **fields):
+        self.log(INFO, event, msg, **fields)
+
+    def warning(self, event, msg=None, **fields):
+        self.log(WARNING, event, msg, **fields)
+
+    def error(self, event, msg=None, **fields):
+        self.log(ERROR, event, msg, **fields)
+
+
+_writer = {"instance": None}
+_writer_lock = threading.Lock()
+
+
+def open_log_file(path):
+    """Append stream for a log file (None -> None, i.e. stdout)"""
+    if not path:
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return open(path, "a", encoding="utf-8", buffering=1)
+
+
+def get_writer():
+    """The process-wide writer (LOG_FILE or stdout), started on first use"""
+    with _writer_lock:
+        if _writer["instance"] is None:
+            _writer["instance"] = LogWriter(open_log_file(LOG_FILE))
+            atexit.register(_writer["instance"].close)
+        return _writer["instance"]
+
+
+def _restart_in_child():
+    """
+    Worker processes forked after the first get_logger() (gateway / cloud
+    --workers) get their own writer thread; records still queued in the
+    parent are written by the parent
+    """
+    global _writer_lock
+    _writer_lock = threading.Lock()
+    if _writer["instance"] is not None:
+        _writer["instance"].start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def get_logger(component):
+    return Logger(component, get_writer())
+
+
+def flush():
+    """Write everything queued so far (call before printing final statistics)"""
+    writer = _writer["instance"]
+    if writer is None:
+        return
+    deadline = time.monotonic() + 2.0
+    # unfinished_tasks also counts records taken off the queue but not written yet
+    while writer.queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
@@ -0,0 +1,438 @@
+# supervisor.py - STARTS, WATCHES AND RESTARTS EVERY COMPONENT
+
+"""
+Process supervisor for the whole system (replaces the fixed sleeps of the
+old launcher)
+
+- components come from a manifest (components.json): script, arguments,
+  which components must be ready first ("after"), readiness probe, restart
+  policy
+- everything whose dependencies are ready starts at once; readiness is
+  probed, not guessed:
+      {"event": "ready"}  -> the component logged that event (structured_log.py)
+      {"tcp": "broker"}   -> the MQTT broker port accepts connections
+- one asyncio loop reads every child's output through its pipe (no thread
+  per child) and writes it through one log writer, prefixed with the
+  component name; children log JSON lines to the supervisor, which shows
+  them as LOG_FORMAT asks
+- crashed children are restarted with exponential backoff
+  (SUPERVISOR_BACKOFF_MIN .. SUPERVISOR_BACKOFF_MAX); after
+  SUPERVISOR_MAX_RESTARTS crashes in a row the supervisor gives up on it
+- Ctrl+C / SIGTERM stops components in reverse dependency order (stop
+  signal, then kill after SUPERVISOR_STOP_TIMEOUT); a second Ctrl+C kills
+- cold start (supervisor start -> first decision published on sensor data)
+  is measured and reported with every component's start and ready times
+
+    python supervisor.py --broker local                  # offline, own broker
+    python supervisor.py --skip dashboard                 # headless
+    python supervisor.py --broker local --skip dashboard --cold-start
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from config import (BROKER_PROFILE, BROKER_PROFILES, LOG_FILE, LOG_FORMAT, LOG_LEVEL,
+                    SUPERVISOR_BACKOFF_MAX, SUPERVISOR_BACKOFF_MIN, SUPERVISOR_MANIFEST,
+                    SUPERVISOR_MAX_RESTARTS, SUPERVISOR_READY_TIMEOUT, SUPERVISOR_STABLE_AFTER,
+                    SUPERVISOR_STOP_TIMEOUT)
+from structured_log import DEBUG, INFO, LEVELS, Logger, LogWriter, open_log_file
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+RESTART_POLICIES = ("always", "on-failure", "never")
+
+# Children get their own process group: Ctrl+C reaches the supervisor only,
+# which then stops them in order
+if os.name == "nt":
+    CHILD_GROUP = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    CHILD_GROUP = {"start_new_session": True}
+
+
+def broker_address(profile):
+    """(host, port) the components will use with this broker profile"""
+    host, port = BROKER_PROFILES[profile]
+    return (os.environ.get("TRAFFIC_BROKER_HOST", host),
+            int(os.environ.get("TRAFFIC_BROKER_PORT", port)))
+
+
+class Component:
+    """One manifest entry and its current process"""
+
+    def __init__(self, spec):
+        self.name = spec["name"]
+        self.script = spec["script"]
+        self.args = [str(arg) for arg in spec.get("args", [])]
+        self.after = list(spec.get("after", []))
+        self.probe = spec.get("ready", {"event": "ready"})
+        self.restart = spec.get("restart", "on-failure")
+        self.stop_signal = getattr(signal, spec.get("stop_signal", "SIGINT"))
+        self.stops_all = spec.get("stops_all", False)
+        self.broker_profile = spec.get("broker_profile")   # only run with this broker profile
+        if self.restart not in RESTART_POLICIES:
+            raise ValueError(f"{self.name}: restart must be one of {RESTART_POLICIES}")
+
+        self.process = None
+        self.task = None
+        self.ready = asyncio.Event()
+        self.depth = 0            # 0 = depends on nothing; stopped last
+        self.spawned_at = None    # seconds since supervisor start (first start)
+        self.ready_at = None
+        self.started = None       # monotonic time of the current process
+        self.crashes = 0          # crashes in a row
+        self.restarts = 0
+
+
+def load_manifest(path):
+    """Components of a manifest file, plus its cold start milestone"""
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    components = [Component(spec) for spec in manifest["components"]]
+    by_name = {component.name: component for component in components}
+    if len(by_name) != len(components):
+        raise ValueError("component names must be unique")
+    for component in components:
+        for name in component.after:
+            if name not in by_name:
+                raise ValueError(f"{component.name}: unknown component in 'after': {name}")
+
+    def depth(component, seen=()):
+        if component.name in seen:
+            raise ValueError(f"dependency cycle through {component.name}")
+        return max((depth(by_name[name], seen + (component.name,)) + 1 for name in component.after),
+                   default=0)
+
+    for component in components:
+        component.depth = depth(component)
+    return components, manifest.get("cold_start")
+
+
+class Supervisor:
+
+    def __init__(self, components, writer, broker_profile=BROKER_PROFILE, level=LOG_LEVEL,
+                 cold_start=None, exit_after_cold_start=False):
+        self.components = {component.name: component for component in components}
+        self.writer = writer
+        self.level = LEVELS[level] if isinstance(level, str) else level
+        self.log = Logger("supervisor", writer, self.level, rate_limit=0)
+        self.broker_profile = broker_profile
+        self.cold_start = cold_start
+        self.exit_after_cold_start = exit_after_cold_start
+        self.cold_start_time = None
+        self.stopping = asyncio.Event()
+        self.forced = False
+        self.started = time.monotonic()
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def child_env(self):
+        env = dict(os.environ)
+        env.update({
+            "PYTHONUNBUFFERED": "1",
+            "PYTHONIOENCODING": "utf-8",
+            "TRAFFIC_BROKER": self.broker_profile,
+            # JSON lines so readiness and milestones can be read reliably; the
+            # supervisor re-applies the level and format the user asked for
+            "TRAFFIC_LOG_FORMAT": "json",
+            "TRAFFIC_LOG_LEVEL": "DEBUG" if self.level <= DEBUG else "INFO"
+        })
+        env.pop("TRAFFIC_LOG_FILE", None)
+        return env
+
+    # ===== OUTPUT =====
+
+    def forward(self, component, line):
+        """Parse one line of child output, react to it and pass it on"""
+        text = line.decode("utf-8", "replace").rstrip()
+        if not text.strip():
+            return
+
+        record = None
+        if text.startswith("{"):
+            try:
+                record = json.loads(text)
+            except ValueError:
+                pass
+        if not isinstance(record, dict) or "event" not in record:
+            record = {"ts": time.time(), "level": "INFO", "event": "output", "msg": text}
+        record["component"] = component.name
+
+        event = record["event"]
+        if event == component.probe.get("event"):
+            self.mark_ready(component)
+        if (self.cold_start and self.cold_start_time is None and event == self.cold_start["event"]
+                and component.name == self.cold_start["component"]):
+            self.cold_start_reached()
+
+        if LEVELS.get(record.get("level"), INFO) >= self.level:
+            self.writer.submit(record)
+
+    async def pump(self, component):
+        """Forward a child's output until it closes, then return its exit code"""
+        stream = component.process.stdout
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:      # line longer than the pipe limit: skip it
+                continue
+            if not line:
+                break
+            self.forward(component, line)
+        return await component.process.wait()
+
+    # ===== READINESS =====
+
+    def mark_ready(self, component):
+        if component.ready.is_set():
+            return
+        component.ready.set()
+        took = time.monotonic() - component.started
+        if component.ready_at is None:
+            component.ready_at = self.elapsed()
+        self.log.info("component_ready", f"✅ {component.name} ready ({took:.2f} s after start)",
+                      target=component.name, seconds=round(took, 3))
+
+    async def wait_for_port(self, host, port):
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+                writer.close()
+                return
+            except OSError:
+                await asyncio.sleep(0.05)
+
+    async def probe(self, component):
+        """Run the component's readiness probe; give up waiting after SUPERVISOR_READY_TIMEOUT"""
+        try:
+            if "tcp" in component.probe:
+                target = component.probe["tcp"]
+                if target == "broker":
+                    host, port = broker_address(self.broker_profile)
+                else:
+                    host, port = target.rsplit(":", 1)
+                await asyncio.wait_for(self.wait_for_port(host, int(port)), SUPERVISOR_READY_TIMEOUT)
+                self.mark_ready(component)
+            else:
+                await asyncio.wait_for(component.ready.wait(), SUPERVISOR_READY_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.log.warning("ready_timeout",
+                             f"⚠️  {component.name} not ready after {SUPERVISOR_READY_TIMEOUT} s, "
+                             f"starting what depends on it anyway", target=component.name)
+            self.mark_ready(component)
+
+    async def first_set(self, *events):
+        """Wait until one of the asyncio events is set"""
+        waiters = [asyncio.ensure_future(event.wait()) for event in events]
+        done, pending = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in pending:
+            waiter.cancel()
+
+    def cold_start_reached(self):
+        self.cold_start_time = self.elapsed()
+        fields = {name: {"started": component.spawned_at, "ready": component.ready_at}
+                  for name, component in self.components.items()}
+        self.log.info("cold_start",
+                      f"⏱️  Cold start: {self.cold_start['event']} from {self.cold_start['component']} "
+                      f"after {self.cold_start_time:.2f} s",
+                      seconds=round(self.cold_start_time, 3), components=fields)
+        if self.exit_after_cold_start:
+            self.request_stop()
+
+    # ===== LIFECYCLE =====
+
+    async def spawn(self, component):
+        component.ready.clear()
+        component.started = time.monotonic()
+        if component.spawned_at is None:
+            component.spawned_at = self.elapsed()
+        component.process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(ROOT, component.script), *component.args,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+            cwd=ROOT, env=self.child_env(), limit=1 << 20, **CHILD_GROUP)
+        self.log.info("component_started", f"🚀 Started {component.name} (pid {component.process.pid})",
+                      target=component.name, pid=component.process.pid)
+
+    async def supervise(self, component):
+        """Start a component once its dependencies are ready; restart it when it crashes"""
+        for name in component.after:
+            dependency = self.components.get(name)
+            if dependency is not None:
+                await self.first_set(dependency.ready, self.stopping)
+
+        while not self.stopping.is_set():
+            try:
+                await self.spawn(component)
+            except OSError as e:
+                self.log.error("component_failed", f"❌ Could not start {component.name}: {e}",
+                               target=component.name, error=str(e))
+                component.ready.set()
+                return
+            probe = asyncio.ensure_future(self.probe(component))
+            code = await self.pump(component)
+            probe.cancel()
+            if self.stopping.is_set():
+                return
+
+            if component.stops_all and code == 0:
+                self.log.info("component_exited", f"⛔ {component.name} closed, stopping everything",
+                              target=component.name)
+                self.request_stop()
+                return
+            if component.restart == "never" or (component.restart == "on-failure" and code == 0):
+                self.log.info("component_exited", f"⛔ {component.name} exited ({code})",
+                              target=component.name, code=code)
+                return
+
+            # A component that ran for a while starts its backoff again
+            uptime = time.monotonic() - component.started
+            component.crashes = 1 if uptime >= SUPERVISOR_STABLE_AFTER else component.crashes + 1
+            if component.crashes > SUPERVISOR_MAX_RESTARTS:
+                self.log.error("component_failed",
+                               f"❌ {component.name} crashed {component.crashes - 1} times in a row, giving up",
+                               target=component.name, code=code)
+                component.ready.set()
+                return
+
+            delay = min(SUPERVISOR_BACKOFF_MAX, SUPERVISOR_BACKOFF_MIN * 2 ** (component.crashes - 1))
+            self.log.warning("component_crashed",
+                             f"❌ {component.name} exited ({code}) after {uptime:.1f} s, "
+                             f"restarting in {delay:.1f} s", target=component.name, code=code, delay=delay)
+            try:
+                await asyncio.wait_for(self.stopping.wait(), delay)
+                return
+            except asyncio.TimeoutError:
+                component.restarts += 1
+
+    def request_stop(self):
+        if self.stopping.is_set():
+            # Second Ctrl+C: do not wait for anyone
+            self.forced = True
+            for component in self.components.values():
+                if component.process is not None and component.process.returncode is None:
+                    component.process.kill()
+            return
+        self.log.info("stopping", "⛔ Stopping all components...")
+        self.stopping.set()
+
+    async def stop(self, component):
+        process = component.process
+        if process is not None and process.returncode is None and not self.forced:
+            try:
+                if os.name == "nt":
+                    process.terminate()
+                else:
+                    process.send_signal(component.stop_signal)
+            except ProcessLookupError:
+                pass
+        if component.task is None:
+            return
+        try:
+            # The task ends once the child has exited and its last output is read
+            await asyncio.wait_for(asyncio.shield(component.task), SUPERVISOR_STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.log.warning("stop_timeout", f"⚠️  {component.name} did not stop, killing it",
+                             target=component.name)
+            if process is not None and process.returncode is None:
+                process.kill()
+            await asyncio.wait([component.task], timeout=SUPERVISOR_STOP_TIMEOUT)
+            component.task.cancel()
+
+    async def shutdown(self):
+        """Stop components in reverse dependency order (dependents first)"""
+        for depth in sorted({component.depth for component in self.components.values()}, reverse=True):
+            await asyncio.gather(*(self.stop(component) for component in self.components.values()
+                                   if component.depth == depth))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.request_stop)
+            except (NotImplementedError, RuntimeError):
+                signal.signal(signum, lambda *_: loop.call_soon_threadsafe(self.request_stop))
+
+        for component in self.components.values():
+            component.task = asyncio.ensure_future(self.supervise(component))
+
+        # Run until asked to stop, or until no component is left running
+        tasks = [component.task for component in self.components.values()]
+        stop = asyncio.ensure_future(self.stopping.wait())
+        pending = set(tasks)
+        while pending and not self.stopping.is_set():
+            done, pending = await asyncio.wait(pending | {stop}, return_when=asyncio.FIRST_COMPLETED)
+            pending.discard(stop)
+
+        self.stopping.set()
+        await self.shutdown()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        stop.cancel()
+
+
+def report(supervisor):
+    """Final statistics"""
+    print("\n" + "=" * 70)
+    print("📊 SUPERVISOR SUMMARY")
+    print("=" * 70)
+    for component in sorted(supervisor.components.values(), key=lambda c: (c.depth, c.name)):
+        started = "-" if component.spawned_at is None else f"{component.spawned_at:.2f} s"
+        ready = "-" if component.ready_at is None else f"{component.ready_at:.2f} s"
+        print(f"  {component.name:<10} started {started:>8}  ready {ready:>8}  restarts {component.restarts}")
+    if supervisor.cold_start_time is not None:
+        print(f"Cold start (→ {supervisor.cold_start['event']}): {supervisor.cold_start_time:.2f} s")
+    elif supervisor.cold_start:
+        print(f"Cold start: {supervisor.cold_start['event']} never seen")
+    print("=" * 70 + "\n")
+
+
+async def run_supervisor(args, writer):
+    components, cold_start = load_manifest(args.manifest)
+    skip = set(args.skip)
+    components = [component for component in components
+                  if component.name not in skip
+                  and component.broker_profile in (None, args.broker)]
+    supervisor = Supervisor(components, writer, args.broker, cold_start=cold_start,
+                            exit_after_cold_start=args.cold_start)
+    if args.cold_start:
+        asyncio.get_running_loop().call_later(args.timeout, supervisor.request_stop)
+    await supervisor.run()
+    return supervisor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Start and supervise every component")
+    parser.add_argument("--manifest", default=os.path.join(ROOT, SUPERVISOR_MANIFEST))
+    parser.add_argument("--broker", choices=sorted(BROKER_PROFILES), default=BROKER_PROFILE,
+                        help="broker profile for every component (local also starts the local broker)")
+    parser.add_argument("--skip", action="append", default=[], metavar="NAME",
+                        help="do not start this component (repeatable), e.g. --skip dashboard")
+    parser.add_argument("--cold-start", action="store_true",
+                        help="stop as soon as the cold start milestone is reached and report it")
+    parser.add_argument("--timeout", type=float, default=60,
+                        help="--cold-start: give up after this many seconds")
+    args = parser.parse_args()
+
+    print("\n" + "=" * 70)
+    print("🚦 SMART TRAFFIC CONTROL SYSTEM - SUPERVISOR")
+    print("=" * 70)
+    print(f"Manifest: {os.path.relpath(args.manifest, ROOT)} | broker: {args.broker}")
+    print("=" * 70 + "\n")
+
+    writer = LogWriter(open_log_file(LOG_FILE), LOG_FORMAT, show_component=True)
+    supervisor = asyncio.run(run_supervisor(args, writer))
+    writer.close()
+
+    report(supervisor)
+    if args.cold_start and supervisor.cold_start_time is None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# topics.py - MQTT TOPIC NAMES FOR ONE OR MANY INTERSECTIONS
+
+"""
+Builds and parses the per-intersection topics declared in config.py:
+
+    traffic/sensors/<intersection>/lane1 | lane2 | ... | emergency   (one per configured lane)
+    traffic/summary/<intersection>
+    traffic/decision/<intersection>
+
+The original single intersection (LEGACY_INTERSECTION) keeps using
+TOPIC_LANE_1 / TOPIC_LANE_2 / TOPIC_RFID / TOPIC_SUMMARY / TOPIC_DECISION
+(lanes beyond the second use traffic/sensors/<LEGACY_INTERSECTION>/lane<n>).
+"""
+
+from config import (TOPIC_LANE_1, TOPIC_LANE_2, TOPIC_RFID, TOPIC_SUMMARY, TOPIC_DECISION,
+                    TOPIC_SENSOR_PREFIX, TOPIC_SUMMARY_PREFIX, TOPIC_DECISION_PREFIX,
+                    LEGACY_INTERSECTION)
+from intersection import LANE_CHANNELS
+
+# Last topic level of each sensor channel (lane channels: one per lane, by index)
+CHANNEL_LANE_1 = "lane1"
+CHANNEL_LANE_2 = "lane2"
+CHANNEL_EMERGENCY = "emergency"
+SENSOR_CHANNELS = LANE_CHANNELS + (CHANNEL_EMERGENCY,)
+CHANNEL_LANE = {channel: lane for lane, channel in enumerate(LANE_CHANNELS)}
+
+LEGACY_SENSOR_TOPICS = {topic: (LEGACY_INTERSECTION, channel)
+                        for topic, channel in zip((TOPIC_LANE_1, TOPIC_LANE_2), LANE_CHANNELS)}
+LEGACY_SENSOR_TOPICS[TOPIC_RFID] = (LEGACY_INTERSECTION, CHANNEL_EMERGENCY)
+
+_SENSOR_PREFIX = TOPIC_SENSOR_PREFIX + "/"
+_SUMMARY_PREFIX = TOPIC_SUMMARY_PREFIX + "/"
+_DECISION_PREFIX = TOPIC_DECISION_PREFIX + "/"
+
+
+def intersection_id(number):
+    """0 -> "I0000", 1 -> "I0001", ..."""
+    return f"I{number:04d}"
+
+
+def sensor_topic(intersection, channel):
+    """Topic a sensor of `intersection` publishes to ("+" works as a wildcard)"""
+    if intersection == LEGACY_INTERSECTION:
+        for topic, located in LEGACY_SENSOR_TOPICS.items():
+            if located[1] == channel:
+                return topic
+    return f"{TOPIC_SENSOR_PREFIX}/{intersection}/{channel}"
+
+
+def summary_topic(intersection):
+    """Topic the gateway publishes the summary of `intersection` to"""
+    if intersection == LEGACY_INTERSECTION:
+        return TOPIC_SUMMARY
+    return f"{TOPIC_SUMMARY_PREFIX}/{intersection}"
+
+
+def decision_topic(intersection):
+    """Topic the cloud publishes the decision for `intersection` to"""
+    if intersection == LEGACY_INTERSECTION:
+        return TOPIC_DECISION
+    return f"{TOPIC_DECISION_PREFIX}/{intersection}"
+
+
+def _parse_intersection_topic(topic, legacy_topic, prefix):
+    if topic == legacy_topic:
+        return LEGACY_INTERSECTION
+    if not topic.startswith(prefix):
+        return None
+    intersection = topic[len(prefix):]
+    return None if "/" in intersection else intersection
+
+
+def parse_summary_topic(topic):
+    """Summary topic -> intersection (None for other topics)"""
+    return _parse_intersection_topic(topic, TOPIC_SUMMARY, _SUMMARY_PREFIX)
+
+
+def parse_decision_topic(topic):
+    """Decision topic -> intersection (None for other topics)"""
+    return _parse_intersection_topic(topic, TOPIC_DECISION, _DECISION_PREFIX)
+
+
+def parse_sensor_topic(topic):
+    """
+    Topic -> (intersection, channel)
+
+    Returns None for topics that are not sensor topics.
+    """
+    located = LEGACY_SENSOR_TOPICS.get(topic)
+    if located is not None:
+        return located
+
+    if not topic.startswith(_SENSOR_PREFIX):
+        return None
+    parts = topic[len(_SENSOR_PREFIX):].split("/")
+    if len(parts) != 2 or parts[1] not in SENSOR_CHANNELS:
+        return None
+    return parts[0], parts[1]
+
+
+def sensor_subscriptions(intersection="+"):
+    """(topic, qos) pairs for the sensors of one (or, with "+", every) intersection"""
+    return ([(sensor_topic(intersection, channel), 0) for channel in LANE_CHANNELS]
+            + [(sensor_topic(intersection, CHANNEL_EMERGENCY), 1)])
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT filter matching ("+" = one level, "#" = this level and everything below)"""
+    filter_parts = topic_filter.split("/")
+    topic_parts = topic.split("/")
+
+    # Wildcards at the first level never match $SYS-style topics
+    if topic.startswith("$") and filter_parts[0] in ("+", "#"):
+        return False
+
+    for position, part in enumerate(filter_parts):
+        if part == "#":
+            return True
+        if position >= len(topic_parts):
+            return False
+        if part != "+" and part != topic_parts[position]:
+            return False
+    return len(filter_parts) == len(topic_parts)
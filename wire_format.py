@@ -0,0 +1,502 @@
+# wire_format.py - COMPACT BINARY / JSON MESSAGE ENCODING
+
+"""
+Versioned wire format shared by sensors, gateway, cloud logic and dashboard
+
+Two encodings:
+- json:   the original JSON dicts
+- binary: struct-packed, starts with MAGIC (never "{"), so decode() can tell
+          the two apart and receivers accept both
+
+Binary layouts (little-endian):
+
+  header    magic u8 | version u8 | type u8
+
+  SENSOR    header | sensor u8 | lane u8 | value i16 | sent_at f64     (15 bytes)
+            sensor = IR / Ultrasonic / RFID, lane = lane enum (0xFF = none),
+            value  = vehicle_detected / vehicle_count / emergency
+
+  SCHEMA    header | schema id u8 | values packed with that schema's struct
+            for the known message shapes (gateway summary, cloud decision):
+            one struct call per message, no per-field tags
+            schemas with per-lane arrays: header | schema id u8 | lanes u8 | values
+            (every array of the message has `lanes` entries)
+
+  FIELDS    header | n u8 | n x (key u8 | tag u8 | value)
+            any other flat dict; keys come from KEYS (0xFF = inline name),
+            values are type-tagged (lists of ints: T_ARRAY | n u8 | int tag u8 | n values)
+
+Which encoding a publisher uses is chosen per topic (WIRE_FORMAT_TOPICS in
+config.py, falling back to WIRE_FORMAT); JSON stays the fallback.
+KEYS / SENSORS / LANES / SCHEMAS are append-only: new entries get new ids so
+older decoders keep working within a version. A message whose keys do not
+exactly match a schema (or whose values do not fit it) uses FIELDS.
+"""
+
+import calendar
+import json
+import math
+import struct
+import time
+
+from config import WIRE_FORMAT, WIRE_FORMAT_TOPICS
+from intersection import GROUPS, GROUP_INDEX, LANES, LANE_INDEX
+from topics import topic_matches
+
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+
+MAGIC = 0xA7
+VERSION = 1
+
+MSG_SENSOR = 1
+MSG_FIELDS = 2
+MSG_SCHEMA = 3
+
+SENSORS = ("IR", "Ultrasonic", "RFID")
+SENSOR_INDEX = {name: index for index, name in enumerate(SENSORS)}
+SENSOR_VALUE_KEYS = ("vehicle_detected", "vehicle_count", "emergency")
+NO_LANE = 0xFF
+
+KEYS = (
+    "timestamp", "intersection",
+    "lane1_ir", "lane2_ir", "lane1_vehicles", "lane2_vehicles",
+    "lane1_confidence", "lane2_confidence", "average_confidence",
+    "emergency", "emergency_lane", "green_light", "green_duration",
+    "sensor_ts", "messages_processed", "sensor_mismatches_detected",
+    "lane", "sensor", "vehicle_detected", "vehicle_count", "sent_at",
+    "seq", "src", "kf", "topic",
+    "phase", "phase_remaining", "cycle",
+    "ir", "vehicles", "confidence"
+)
+KEY_INDEX = {name: index for index, name in enumerate(KEYS)}
+INLINE_KEY = 0xFF
+
+# Value tags
+T_NONE = 0
+T_INT8 = 1
+T_INT16 = 2
+T_INT32 = 3
+T_INT64 = 4
+T_FLOAT64 = 5
+T_STR = 6
+T_LANE = 7      # "Lane 1" ... as a lane enum
+T_UTC = 8       # "%Y-%m-%dT%H:%M:%SZ" timestamp as u32 epoch seconds
+T_TRUE = 9
+T_FALSE = 10
+T_ARRAY = 11    # list of ints, one int tag for all entries
+
+UTC_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+_HEADER = struct.Struct("<BBB")
+_SENSOR = struct.Struct("<BBBBBhd")
+_FIXED = {
+    T_INT8: struct.Struct("<b"),
+    T_INT16: struct.Struct("<h"),
+    T_INT32: struct.Struct("<i"),
+    T_INT64: struct.Struct("<q"),
+    T_FLOAT64: struct.Struct("<d"),
+    T_LANE: struct.Struct("<B"),
+    T_UTC: struct.Struct("<I")
+}
+_U8 = struct.Struct("<B")
+_ARRAY = struct.Struct("<BB")
+
+_format_cache = {}
+
+# Single-entry caches: consecutive summaries share the same second
+_utc_cache = {"text": None, "seconds": None}
+
+
+def _utc_to_seconds(text):
+    if _utc_cache["text"] != text:
+        _utc_cache["seconds"] = calendar.timegm(time.strptime(text, UTC_FORMAT))
+        _utc_cache["text"] = text
+    return _utc_cache["seconds"]
+
+
+def _seconds_to_utc(seconds):
+    if _utc_cache["seconds"] != seconds:
+        _utc_cache["text"] = time.strftime(UTC_FORMAT, time.gmtime(seconds))
+        _utc_cache["seconds"] = seconds
+    return _utc_cache["text"]
+
+
+# =====================================================================
+# SCHEMAS (fixed layouts for the hot message shapes)
+# =====================================================================
+
+# kind -> struct code
+_KIND_CODES = {
+    "u8": "B", "i16": "h", "u32": "I", "f64": "d",
+    "lane": "B",        # lane enum, 0xFF = None
+    "group": "B",       # phase group enum (intersection.py), 0xFF = None
+    "u8[]": "B",        # one entry per lane
+    "i16[]": "h",
+    "utc": "I",         # UTC timestamp string as epoch seconds
+    "id": "16p",        # short string (intersection id, signal phase)
+    "opt_f64": "d"      # float or None (NaN)
+}
+
+
+class Schema:
+
+    def __init__(self, schema_id, fields):
+        self.schema_id = schema_id
+        self.keys = tuple(key for key, _ in fields)
+        self.kinds = tuple(kind for _, kind in fields)
+        self.converted = [index for index, kind in enumerate(self.kinds)
+                          if kind in ("lane", "group", "utc", "id", "opt_f64")]
+        self.arrays = frozenset(index for index, kind in enumerate(self.kinds) if kind.endswith("[]"))
+        self._first_array = min(self.arrays, default=None)
+        self._structs = {}      # lanes -> (struct, slice of each field in the unpacked values)
+        self.struct = None if self.arrays else self._struct_for(0)[0]
+
+    def _struct_for(self, lanes):
+        cached = self._structs.get(lanes)
+        if cached is None:
+            codes = [f"{lanes}{_KIND_CODES[kind]}" if kind.endswith("[]") else _KIND_CODES[kind]
+                     for kind in self.kinds]
+            layout = []
+            position = 5
+            for index in range(len(self.kinds)):
+                if index in self.arrays:
+                    layout.append(slice(position, position + lanes))
+                    position += lanes
+                else:
+                    layout.append(position)
+                    position += 1
+            packed = struct.Struct(("<BBBBB" if self.arrays else "<BBBB") + "".join(codes))
+            cached = self._structs[lanes] = (packed, tuple(layout))
+        return cached
+
+    def pack(self, message):
+        values = [message[key] for key in self.keys]
+        if self.arrays:
+            lanes = len(values[self._first_array])
+            if any(len(values[index]) != lanes for index in self.arrays):
+                raise ValueError("lane arrays of different lengths")
+            flat = []
+            for index, value in enumerate(values):
+                if index in self.arrays:
+                    flat.extend(value)
+                else:
+                    flat.append(self._convert(index, value))
+            return self._struct_for(lanes)[0].pack(MAGIC, VERSION, MSG_SCHEMA, self.schema_id, lanes, *flat)
+
+        for index in self.converted:
+            values[index] = self._convert(index, values[index])
+        return self.struct.pack(MAGIC, VERSION, MSG_SCHEMA, self.schema_id, *values)
+
+    def _convert(self, index, value):
+        """Message value -> struct value for the converted kinds"""
+        kind = self.kinds[index]
+        if kind == "lane":
+            return NO_LANE if value is None else LANE_INDEX[value]
+        if kind == "group":
+            return NO_LANE if value is None else GROUP_INDEX[value]
+        if kind == "utc":
+            return _utc_to_seconds(value)
+        if kind == "id":
+            data = value.encode()
+            if len(data) > 15:
+                raise ValueError("id too long for the schema")
+            return data
+        if kind == "opt_f64":
+            return math.nan if value is None else value
+        return value
+
+    def unpack(self, payload):
+        if self.arrays:
+            packed, layout = self._struct_for(payload[4])
+            flat = packed.unpack_from(payload, 0)
+            values = [list(flat[at]) if type(at) is slice else flat[at] for at in layout]
+        else:
+            values = list(self.struct.unpack_from(payload, 0))[4:]
+        for index in self.converted:
+            kind = self.kinds[index]
+            value = values[index]
+            if kind == "lane":
+                values[index] = LANES[value] if value < len(LANES) else None
+            elif kind == "group":
+                values[index] = GROUPS[value] if value < len(GROUPS) else None
+            elif kind == "utc":
+                values[index] = _seconds_to_utc(value)
+            elif kind == "id":
+                values[index] = value.decode()
+            elif math.isnan(value):
+                values[index] = None
+        return dict(zip(self.keys, values))
+
+
+SCHEMAS = (
+    # 0: gateway summary
+    Schema(0, [("timestamp", "utc"), ("intersection", "id"),
+               ("lane1_ir", "u8"), ("lane2_ir", "u8"),
+               ("lane1_vehicles", "i16"), ("lane2_vehicles", "i16"),
+               ("lane1_confidence", "u8"), ("lane2_confidence", "u8"),
+               ("average_confidence", "f64"),
+               ("emergency", "u8"), ("emergency_lane", "lane"),
+               ("green_light", "lane"), ("sensor_ts", "opt_f64"),
+               ("messages_processed", "u32"), ("sensor_mismatches_detected", "u32")]),
+    # 1: cloud decision
+    Schema(1, [("intersection", "id"), ("emergency", "u8"), ("emergency_lane", "lane"),
+               ("green_light", "lane"), ("green_duration", "i16"), ("sensor_ts", "opt_f64"),
+               ("lane1_ir", "u8"), ("lane1_vehicles", "i16"), ("lane1_confidence", "u8"),
+               ("lane2_ir", "u8"), ("lane2_vehicles", "i16"), ("lane2_confidence", "u8")]),
+    # 2: cloud decision with signal phase
+    Schema(2, [("intersection", "id"), ("emergency", "u8"), ("emergency_lane", "lane"),
+               ("green_light", "lane"), ("green_duration", "i16"), ("sensor_ts", "opt_f64"),
+               ("lane1_ir", "u8"), ("lane1_vehicles", "i16"), ("lane1_confidence", "u8"),
+               ("lane2_ir", "u8"), ("lane2_vehicles", "i16"), ("lane2_confidence", "u8"),
+               ("phase", "id"), ("phase_remaining", "f64"), ("cycle", "u32")]),
+    # 3: gateway summary, lanes as arrays (intersection.py)
+    Schema(3, [("timestamp", "utc"), ("intersection", "id"),
+               ("ir", "u8[]"), ("vehicles", "i16[]"), ("confidence", "u8[]"),
+               ("average_confidence", "f64"),
+               ("emergency", "u8"), ("emergency_lane", "lane"),
+               ("green_light", "group"), ("sensor_ts", "opt_f64"),
+               ("messages_processed", "u32"), ("sensor_mismatches_detected", "u32")]),
+    # 4: cloud decision with signal phase, lanes as arrays
+    Schema(4, [("intersection", "id"), ("emergency", "u8"), ("emergency_lane", "lane"),
+               ("green_light", "group"), ("green_duration", "i16"), ("sensor_ts", "opt_f64"),
+               ("ir", "u8[]"), ("vehicles", "i16[]"), ("confidence", "u8[]"),
+               ("phase", "id"), ("phase_remaining", "f64"), ("cycle", "u32")]),
+)
+SCHEMA_BY_KEYS = {schema.keys: schema for schema in SCHEMAS}
+
+
+def format_for(topic):
+    """Encoding a publisher should use on `topic`"""
+    fmt = _format_cache.get(topic)
+    if fmt is None:
+        fmt = WIRE_FORMAT
+        for topic_filter, topic_format in WIRE_FORMAT_TOPICS.items():
+            if topic_matches(topic_filter, topic):
+                fmt = topic_format
+                break
+        _format_cache[topic] = fmt
+    return fmt
+
+
+# =====================================================================
+# ENCODING
+# =====================================================================
+
+def encode(message, fmt=FORMAT_JSON):
+    """dict -> payload in the given format"""
+    if fmt == FORMAT_BINARY:
+        try:
+            return encode_binary(message)
+        except (struct.error, TypeError, ValueError, OverflowError):
+            pass    # does not fit the binary layouts (long strings, odd types) -> JSON
+    return json.dumps(message, default=_json_value)
+
+
+def encode_for(topic, message):
+    """dict -> payload in the format configured for `topic`"""
+    return encode(message, format_for(topic))
+
+
+def encode_for_client(client, topic, message):
+    """
+    What to hand to client.publish(): encode_for(topic, message), except for
+    clients that carry messages as objects (bus.py), which get the dict itself
+    """
+    if getattr(client, "carries_objects", False):
+        return message
+    return encode_for(topic, message)
+
+
+def encode_binary(message):
+    if _is_sensor_message(message):
+        return _encode_sensor(message)
+
+    schema = SCHEMA_BY_KEYS.get(tuple(message))
+    if schema is not None:
+        try:
+            return schema.pack(message)
+        except (struct.error, KeyError, TypeError, AttributeError, ValueError):
+            pass    # values that do not fit the schema -> generic layout
+    return _encode_fields(message)
+
+
+def _is_sensor_message(message):
+    sensor = message.get("sensor")
+    if sensor not in SENSOR_INDEX:
+        return False
+    expected = {"lane", "sensor", "sent_at", SENSOR_VALUE_KEYS[SENSOR_INDEX[sensor]]}
+    if sensor == "RFID":
+        expected = {"sensor", "sent_at", "emergency", "emergency_lane"}
+    return set(message) <= expected
+
+
+def _encode_sensor(message):
+    sensor = SENSOR_INDEX[message["sensor"]]
+    if message["sensor"] == "RFID":
+        lane = message.get("emergency_lane")
+    else:
+        lane = message.get("lane")
+    sent_at = message.get("sent_at")
+    return _SENSOR.pack(MAGIC, VERSION, MSG_SENSOR, sensor,
+                        LANE_INDEX.get(lane, NO_LANE),
+                        message[SENSOR_VALUE_KEYS[sensor]],
+                        math.nan if sent_at is None else sent_at)
+
+
+def _plain(value):
+    """NumPy scalar / array -> Python value / list (anything else unchanged)"""
+    tolist = getattr(value, "tolist", None)
+    return tolist() if tolist is not None else value
+
+
+def _json_value(value):
+    """json.dumps default: NumPy values as Python ones"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode_value(key, value):
+    value = _plain(value)
+    if isinstance(value, (list, tuple)):
+        value = [_plain(item) for item in value]
+    if value is None:
+        return _U8.pack(T_NONE)
+    if value is True:
+        return _U8.pack(T_TRUE)
+    if value is False:
+        return _U8.pack(T_FALSE)
+    if isinstance(value, int):
+        for tag, low, high in ((T_INT8, -128, 127), (T_INT16, -32768, 32767),
+                               (T_INT32, -2 ** 31, 2 ** 31 - 1)):
+            if low <= value <= high:
+                return _U8.pack(tag) + _FIXED[tag].pack(value)
+        return _U8.pack(T_INT64) + _FIXED[T_INT64].pack(value)
+    if isinstance(value, float):
+        return _U8.pack(T_FLOAT64) + _FIXED[T_FLOAT64].pack(value)
+    if isinstance(value, (list, tuple)) and len(value) < 256 and all(type(item) is int for item in value):
+        low, high = min(value, default=0), max(value, default=0)
+        for tag, fits_low, fits_high in ((T_INT8, -128, 127), (T_INT16, -32768, 32767),
+                                         (T_INT32, -2 ** 31, 2 ** 31 - 1), (T_INT64, -2 ** 63, 2 ** 63 - 1)):
+            if fits_low <= low and high <= fits_high:
+                code = _FIXED[tag].format[1:]
+                return _U8.pack(T_ARRAY) + _ARRAY.pack(len(value), tag) + struct.pack(f"<{len(value)}{code}", *value)
+    if isinstance(value, str):
+        if value in LANE_INDEX:
+            return _U8.pack(T_LANE) + _FIXED[T_LANE].pack(LANE_INDEX[value])
+        if key == "timestamp":
+            try:
+                return _U8.pack(T_UTC) + _FIXED[T_UTC].pack(_utc_to_seconds(value))
+            except (ValueError, struct.error):
+                pass
+        data = value.encode()
+        if len(data) > 255:
+            raise ValueError(f"{key} is too long for the binary wire format ({len(data)} bytes)")
+        return _U8.pack(T_STR) + _U8.pack(len(data)) + data
+    raise TypeError(f"Cannot encode {key}={value!r} in the binary wire format")
+
+
+def _encode_fields(message):
+    parts = [_HEADER.pack(MAGIC, VERSION, MSG_FIELDS), _U8.pack(len(message))]
+    for key, value in message.items():
+        key_id = KEY_INDEX.get(key)
+        if key_id is None:
+            name = key.encode()
+            parts.append(_U8.pack(INLINE_KEY) + _U8.pack(len(name)) + name)
+        else:
+            parts.append(_U8.pack(key_id))
+        parts.append(_encode_value(key, value))
+    return b"".join(parts)
+
+
+# =====================================================================
+# DECODING
+# =====================================================================
+
+def is_binary(payload):
+    return isinstance(payload, (bytes, bytearray, memoryview)) and len(payload) > 0 and payload[0] == MAGIC
+
+
+def decode(payload):
+    """payload (binary or JSON, bytes or str) -> dict; dicts from the in-memory bus pass through"""
+    if isinstance(payload, dict):
+        return payload
+    if is_binary(payload):
+        return decode_binary(payload)
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        payload = bytes(payload).decode()
+    return json.loads(payload)
+
+
+def decode_binary(payload):
+    magic, version, msg_type = _HEADER.unpack_from(payload, 0)
+    if version != VERSION:
+        raise ValueError(f"Unsupported wire format version {version}")
+
+    if msg_type == MSG_SENSOR:
+        return _decode_sensor(payload)
+    if msg_type == MSG_SCHEMA:
+        return SCHEMAS[payload[3]].unpack(payload)
+    if msg_type == MSG_FIELDS:
+        return _decode_fields(payload)
+    raise ValueError(f"Unknown wire message type {msg_type}")
+
+
+def _decode_sensor(payload):
+    _, _, _, sensor, lane, value, sent_at = _SENSOR.unpack_from(payload, 0)
+    lane = LANES[lane] if lane < len(LANES) else None
+    name = SENSORS[sensor]
+
+    if name == "RFID":
+        message = {"sensor": name, "emergency": value, "emergency_lane": lane}
+    else:
+        message = {"lane": lane, "sensor": name, SENSOR_VALUE_KEYS[sensor]: value}
+    if not math.isnan(sent_at):
+        message["sent_at"] = sent_at
+    return message
+
+
+def _decode_fields(payload):
+    offset = _HEADER.size
+    (count,) = _U8.unpack_from(payload, offset)
+    offset += 1
+    message = {}
+
+    for _ in range(count):
+        key_id = payload[offset]
+        offset += 1
+        if key_id == INLINE_KEY:
+            length = payload[offset]
+            key = bytes(payload[offset + 1:offset + 1 + length]).decode()
+            offset += 1 + length
+        else:
+            key = KEYS[key_id]
+
+        tag = payload[offset]
+        offset += 1
+        if tag == T_NONE:
+            value = None
+        elif tag == T_TRUE or tag == T_FALSE:
+            value = tag == T_TRUE
+        elif tag == T_STR:
+            length = payload[offset]
+            value = bytes(payload[offset + 1:offset + 1 + length]).decode()
+            offset += 1 + length
+        elif tag == T_ARRAY:
+            length, item_tag = _ARRAY.unpack_from(payload, offset)
+            offset += _ARRAY.size
+            code = _FIXED[item_tag].format[1:]
+            value = list(struct.unpack_from(f"<{length}{code}", payload, offset))
+            offset += length * _FIXED[item_tag].size
+        else:
+            fixed = _FIXED[tag]
+            (value,) = fixed.unpack_from(payload, offset)
+            offset += fixed.size
+            if tag == T_LANE:
+                value = LANES[value]
+            elif tag == T_UTC:
+                value = _seconds_to_utc(value)
+        message[key] = value
+
+    return message